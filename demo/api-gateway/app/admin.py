@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from app.config import settings
+from app.load_balancer import load_balancer
+from app.resilience import resilience
+from app.retry import retry_policy
+from app.revocation import revocation_filter
+from app.response_cache import response_cache
+from app.token_cache import token_cache
+
+# Introspection endpoints của gateway (INTERNAL - cần X-API-Key)
+router = APIRouter(prefix="/gateway", tags=["Gateway"])
+
+def verify_api_key(x_api_key: str = Header(None, alias="X-API-Key")):
+    """Verify API Key for internal endpoints"""
+    if x_api_key != settings.internal_api_key:
+        raise HTTPException(
+            status_code=401,
+            detail="Unauthorized: Invalid API Key"
+        )
+    return True
+
+@router.get("/token-cache")
+async def token_cache_stats(_: bool = Depends(verify_api_key)):
+    """Hit/miss counters của cache validate token"""
+    return token_cache.stats()
+
+
+@router.get("/revocations")
+async def revocation_stats(_: bool = Depends(verify_api_key)):
+    """Snapshot revocation filter đang dùng khi verify token tại gateway"""
+    return revocation_filter.stats()
+
+
+@router.get("/backends")
+async def backend_replicas(_: bool = Depends(verify_api_key)):
+    """
+    Trạng thái từng backend: replicas (outstanding, health check, outlier ejection),
+    circuit breaker và adaptive concurrency limit
+    """
+    replicas = load_balancer.snapshot()
+    guards = resilience.snapshot()
+    return {
+        name: {**replicas[name], **guards.get(name, {})}
+        for name in replicas
+    }
+
+
+@router.get("/response-cache")
+async def response_cache_stats(_: bool = Depends(verify_api_key)):
+    """Singleflight/micro-cache counters của các GET được proxy"""
+    return response_cache.stats()
+
+
+@router.get("/retries")
+async def retry_stats(_: bool = Depends(verify_api_key)):
+    """Retry budget: số request, retry, hedge và số lần hết budget"""
+    return retry_policy.stats()
@@ -0,0 +1,68 @@
+import asyncio
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import JSONResponse
+from app.config import settings
+from app.resilience import PRIORITY_LOW, PRIORITY_NORMAL
+from app.routes import call_backend
+
+# Backend-for-frontend: mỗi trang UI lấy toàn bộ dữ liệu ban đầu trong một request.
+# Token đã được auth middleware validate một lần, các backend được gọi song song.
+router = APIRouter(prefix="/api/bff", tags=["BFF"])
+
+
+async def _fetch(request: Request, method: str, url: str, json_body=None, priority: str = PRIORITY_NORMAL, retry_safe: bool = False) -> dict:
+    """Gọi một backend, trả về JSON body hoặc raise HTTPException với status của backend"""
+    response = await call_backend(request, method, url, json_body=json_body, priority=priority, retry_safe=retry_safe)
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if response.status_code >= 400:
+        detail = body.get("detail", body) if isinstance(body, dict) else response.text
+        raise HTTPException(status_code=response.status_code, detail=detail)
+    return body
+
+
+async def compose(parts: dict) -> JSONResponse:
+    """
+    Chạy các phần song song (asyncio.gather) và ghép kết quả:
+    {"data": {name: body | None}, "errors": {name: {"status", "detail"}}}
+    Một phần lỗi không làm hỏng cả trang; chỉ trả lỗi khi tất cả các phần đều lỗi.
+    """
+    names = list(parts)
+    results = await asyncio.gather(*parts.values(), return_exceptions=True)
+
+    data, errors = {}, {}
+    for name, result in zip(names, results):
+        if isinstance(result, HTTPException):
+            data[name] = None
+            errors[name] = {"status": result.status_code, "detail": result.detail}
+        elif isinstance(result, BaseException):
+            data[name] = None
+            errors[name] = {"status": 502, "detail": f"Request failed: {str(result)}"}
+        else:
+            data[name] = result
+
+    status_code = 200
+    if errors and len(errors) == len(names):
+        # Tất cả đều lỗi: trả status của phần đầu tiên (thường là thông tin user)
+        status_code = errors[names[0]]["status"]
+    return JSONResponse(status_code=status_code, content={"data": data, "errors": errors})
+
+
+@router.get("/payment-page")
+async def payment_page(request: Request, student_code: str | None = None):
+    """
+    Dữ liệu ban đầu của payment.html: thông tin user (số dư) và,
+    nếu có student_code, thông tin học phí của sinh viên
+    """
+    parts = {
+        "me": _fetch(request, "GET", f"{settings.customer_service_url}/api/customers/me"),
+    }
+    if student_code:
+        parts["student"] = _fetch(
+            request, "POST", f"{settings.tuition_service_url}/search",
+            json_body={"student_id": student_code}, priority=PRIORITY_LOW, retry_safe=True
+        )
+    return await compose(parts)
+
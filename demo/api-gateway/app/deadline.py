@@ -0,0 +1,112 @@
+import time
+from contextvars import ContextVar
+
+import httpx
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+
+# Thời gian còn lại (ms) của request, gửi kèm mỗi outbound call; mỗi service
+# áp dụng cho các call của mình và gửi tiếp phần còn lại (budget giảm dần qua từng hop)
+DEADLINE_HEADER = "X-Deadline-Ms"
+DEADLINE_EXCEEDED_DETAIL = "Deadline exceeded"
+
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+# Budget bị client rút ngắn bằng X-Deadline-Ms (nhỏ hơn budget mặc định của gateway)
+_client_shortened: ContextVar[bool] = ContextVar("deadline_client_shortened", default=False)
+
+
+class DeadlineExceeded(HTTPException):
+    """Request đã quá deadline: không gọi backend nữa, trả 504 cho client"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=504,
+            detail=DEADLINE_EXCEEDED_DETAIL,
+            headers={"X-Deadline-Exceeded": "true"}
+        )
+
+
+def remaining() -> float | None:
+    """Số giây còn lại của request hiện tại (None nếu ngoài request)"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check():
+    """Raise DeadlineExceeded nếu request đã quá deadline"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def client_expired() -> bool:
+    """
+    Deadline do client tự rút ngắn đã hết: timeout / DeadlineExceeded lúc này không phản ánh
+    sức khoẻ backend nên không được tính vào circuit breaker, concurrency limit, outlier detection
+    """
+    left = remaining()
+    return _client_shortened.get() and left is not None and left <= 0
+
+
+def timeout() -> httpx.Timeout:
+    """Timeout của một upstream call: không vượt quá thời gian còn lại của request"""
+    left = remaining()
+    if left is None:
+        return httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout)
+    if left <= 0:
+        raise DeadlineExceeded()
+    return httpx.Timeout(min(settings.http_timeout, left), connect=min(settings.http_connect_timeout, left))
+
+
+def headers(extra: dict | None = None) -> dict:
+    """Headers của upstream call kèm X-Deadline-Ms = thời gian còn lại"""
+    result = dict(extra or {})
+    left = remaining()
+    if left is not None:
+        result[DEADLINE_HEADER] = str(max(0, int(left * 1000)))
+    return result
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware (phải bọc ngoài cùng để metrics/auth cũng thấy deadline):
+    mỗi request có budget request_deadline_seconds; client gửi X-Deadline-Ms
+    chỉ có thể rút ngắn budget, không kéo dài
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or settings.request_deadline_seconds <= 0:
+            return await self.app(scope, receive, send)
+
+        budget = settings.request_deadline_seconds
+        client_shortened = False
+        for name, value in scope["headers"]:
+            if name == b"x-deadline-ms":
+                try:
+                    client_budget = float(value) / 1000
+                except ValueError:
+                    break
+                client_shortened = client_budget < budget
+                budget = min(budget, client_budget)
+                break
+
+        if budget <= 0:
+            response = JSONResponse(
+                status_code=504,
+                content={"detail": DEADLINE_EXCEEDED_DETAIL},
+                headers={"X-Deadline-Exceeded": "true"}
+            )
+            return await response(scope, receive, send)
+
+        token = _deadline.set(time.monotonic() + budget)
+        shortened_token = _client_shortened.set(client_shortened)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _client_shortened.reset(shortened_token)
+            _deadline.reset(token)
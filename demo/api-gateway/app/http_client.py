@@ -0,0 +1,78 @@
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def url_origin(url: str) -> str:
+    """Return scheme://host:port of a URL (key của connection pool)"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class BackendClients:
+    """
+    Giữ một httpx.AsyncClient (connection pool + keep-alive) cho mỗi backend.
+
+    Clients được mở khi app startup và đóng khi shutdown (xem app/main.py),
+    nên các request proxy tái sử dụng kết nối TCP thay vì connect lại mỗi lần.
+    """
+
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    def _create_client(self, origin: str) -> httpx.AsyncClient:
+        http2 = settings.http2_enabled
+        if http2 and not _http2_available():
+            logger.warning("HTTP2_ENABLED=true nhưng chưa cài package 'h2', dùng HTTP/1.1")
+            http2 = False
+
+        return httpx.AsyncClient(
+            base_url=origin,
+            timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+            http2=http2,
+        )
+
+    async def startup(self, base_urls):
+        """Mở pool cho tất cả backend trong SERVICE_MAP"""
+        for url in base_urls:
+            origin = url_origin(url)
+            if origin not in self._clients:
+                self._clients[origin] = self._create_client(origin)
+
+    async def shutdown(self):
+        """Đóng tất cả pool (gọi khi app shutdown)"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """
+        Lấy pooled client cho URL đích.
+        Backend chưa đăng ký lúc startup sẽ được tạo pool lần đầu dùng.
+        """
+        origin = url_origin(url)
+        client = self._clients.get(origin)
+        if client is None:
+            client = self._clients[origin] = self._create_client(origin)
+        return client
+
+
+backend_clients = BackendClients()
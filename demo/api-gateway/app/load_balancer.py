@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+from app.config import settings
+from app.http_client import backend_clients, url_origin
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_replicas(base_url: str, replicas: str) -> list[str]:
+    """"http://a:8003,http://b:8003" -> list URL; để trống thì chỉ có base_url"""
+    urls = [url.strip().rstrip("/") for url in replicas.split(",") if url.strip()]
+    return urls or [base_url.rstrip("/")]
+
+
+class Replica:
+    """Một instance của backend service cùng trạng thái load/health"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.origin = url_origin(url)
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.healthy = True  # kết quả active health check
+        self.health_failures = 0
+        self.total_requests = 0
+        self.total_failures = 0
+
+    def available(self, now: float) -> bool:
+        return self.healthy and self.ejected_until <= now
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "healthy": self.healthy,
+            "ejected": self.ejected_until > now,
+            "ejected_for_seconds": round(max(0.0, self.ejected_until - now), 1),
+            "consecutive_failures": self.consecutive_failures,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+        }
+
+
+class ReplicaPool:
+    """
+    Các replica của một backend.
+    Chọn replica bằng power-of-two-choices theo số request đang xử lý (outstanding),
+    loại tạm thời (outlier ejection) replica lỗi connect/5xx liên tiếp.
+    """
+
+    def __init__(self, name: str, base_url: str, replica_urls: list[str]):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.base_origin = url_origin(base_url)
+        self.replicas = [Replica(url) for url in replica_urls]
+
+    def pick(self) -> Replica:
+        now = time.monotonic()
+        candidates = [replica for replica in self.replicas if replica.available(now)]
+        if not candidates:
+            # Panic mode: tất cả đều bị loại thì vẫn phân phối trên toàn bộ replica
+            candidates = self.replicas
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        return first if first.outstanding <= second.outstanding else second
+
+    def record(self, replica: Replica, failed: bool):
+        """Passive outlier detection từ kết quả của request thật"""
+        replica.total_requests += 1
+        if not failed:
+            replica.consecutive_failures = 0
+            return
+
+        replica.total_failures += 1
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures < settings.lb_eject_consecutive_failures:
+            return
+
+        now = time.monotonic()
+        still_available = [r for r in self.replicas if r is not replica and r.available(now)]
+        if not still_available:
+            # Không loại replica cuối cùng còn dùng được
+            return
+
+        replica.ejections += 1
+        duration = min(
+            settings.lb_base_ejection_seconds * replica.ejections,
+            settings.lb_max_ejection_seconds
+        )
+        replica.ejected_until = now + duration
+        replica.consecutive_failures = 0
+        logger.warning("Ejected %s replica %s for %.0fs", self.name, replica.url, duration)
+
+    async def check_health(self):
+        """Active health check: GET <replica>/health"""
+        async def check(replica: Replica):
+            url = f"{replica.url}/health"
+            try:
+                response = await backend_clients.get(url).get(url, timeout=settings.lb_health_check_timeout)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+
+            if ok:
+                replica.health_failures = 0
+                if not replica.healthy:
+                    logger.info("%s replica %s is healthy again", self.name, replica.url)
+                replica.healthy = True
+            else:
+                replica.health_failures += 1
+                if replica.health_failures >= settings.lb_unhealthy_threshold and replica.healthy:
+                    logger.warning("%s replica %s failed health checks", self.name, replica.url)
+                    replica.healthy = False
+
+        await asyncio.gather(*(check(replica) for replica in self.replicas))
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "base_url": self.base_url,
+            "replicas": [replica.snapshot(now) for replica in self.replicas],
+        }
+
+
+class Lease:
+    """Một request đang dùng replica; release() cập nhật outstanding và outlier detection"""
+
+    __slots__ = ("pool", "replica", "url", "_released")
+
+    def __init__(self, pool: ReplicaPool | None, replica: Replica | None, url: str):
+        self.pool = pool
+        self.replica = replica
+        self.url = url
+        self._released = False
+
+    @property
+    def backend(self) -> str:
+        return self.pool.name if self.pool else "unknown"
+
+    def cancel(self):
+        """Request bị huỷ (vd hedge thua): chỉ trả outstanding, không tính vào outlier detection"""
+        if self._released or self.replica is None:
+            return
+        self._released = True
+        self.replica.outstanding -= 1
+
+    def release(self, status_code: int | None = None, connect_error: bool = False):
+        if self._released or self.replica is None:
+            return
+        self._released = True
+        self.replica.outstanding -= 1
+        failed = connect_error or (status_code is not None and status_code >= 500)
+        self.pool.record(self.replica, failed)
+
+
+class LoadBalancer:
+    def __init__(self, backends: dict[str, tuple[str, str]]):
+        self.pools: dict[str, ReplicaPool] = {}
+        self._by_origin: dict[str, ReplicaPool] = {}
+        for name, (base_url, replicas) in backends.items():
+            pool = ReplicaPool(name, base_url, _parse_replicas(base_url, replicas))
+            self.pools[name] = pool
+            self._by_origin[pool.base_origin] = pool
+        self._task: asyncio.Task | None = None
+
+    def replica_urls(self) -> list[str]:
+        return [replica.url for pool in self.pools.values() for replica in pool.replicas]
+
+    def backend_for(self, target_url: str) -> str | None:
+        pool = self._by_origin.get(url_origin(target_url))
+        return pool.name if pool else None
+
+    def replica_count(self, name: str) -> int:
+        pool = self.pools.get(name)
+        return len(pool.replicas) if pool else 0
+
+    def acquire(self, target_url: str) -> Lease:
+        """
+        Chọn replica cho target_url (URL dựng từ *_service_url) và
+        đổi origin của URL sang replica được chọn.
+        """
+        pool = self._by_origin.get(url_origin(target_url))
+        if pool is None:
+            return Lease(None, None, target_url)
+
+        replica = pool.pick()
+        replica.outstanding += 1
+        url = replica.origin + target_url[len(pool.base_origin):]
+        return Lease(pool, replica, url)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(settings.lb_health_check_interval)
+            await asyncio.gather(
+                *(pool.check_health() for pool in self.pools.values()),
+                return_exceptions=True
+            )
+
+    def start(self):
+        if settings.lb_health_check_interval > 0:
+            self._task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {name: pool.snapshot() for name, pool in self.pools.items()}
+
+
+load_balancer = LoadBalancer({
+    "auth-service": (settings.auth_service_url, settings.auth_service_replicas),
+    "customer-service": (settings.customer_service_url, settings.customer_service_replicas),
+    "tuition-service": (settings.tuition_service_url, settings.tuition_service_replicas),
+    "payment-service": (settings.payment_service_url, settings.payment_service_replicas),
+    "otp-service": (settings.otp_service_url, settings.otp_service_replicas),
+})
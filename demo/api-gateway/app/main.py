@@ -1,78 +1,103 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from app.routes import router
-from app.middleware import auth_middleware
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from app import metrics
+from app.routes import router, SERVICE_MAP
+from app.admin import router as admin_router
+from app.bff import router as bff_router
+from app.middleware import auth_middleware, metrics_middleware
+from app.deadline import DeadlineMiddleware
+from app.http_client import backend_clients
+from app.load_balancer import load_balancer
+from app.token_verifier import local_verifier
+from app.revocation import revocation_filter
+from app.static_assets import StaticAssetCache
+from app.config import settings
 import os
 
+# UI folder được mount từ docker-compose tại /ui
+ui_dir = settings.ui_dir
+static_assets = StaticAssetCache(ui_dir)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mở connection pool cho từng backend khi startup, đóng khi shutdown
+    await backend_clients.startup([*SERVICE_MAP.values(), *load_balancer.replica_urls()])
+    load_balancer.start()
+    if settings.token_verification_mode == "local":
+        await local_verifier.start()
+        await revocation_filter.start()
+    # Nạp UI vào memory (precompress + ETag) một lần lúc startup
+    if os.path.exists(ui_dir):
+        await asyncio.to_thread(static_assets.load)
+        if settings.static_watch:
+            static_assets.start_watching(settings.static_watch_interval)
+    yield
+    await static_assets.stop_watching()
+    await revocation_filter.stop()
+    await local_verifier.stop()
+    await load_balancer.stop()
+    await backend_clients.shutdown()
+
 app = FastAPI(
     title="iBanking TDTU - API Gateway",
     version="2.0",
-    docs_url="/docs"
+    docs_url="/docs",
+    lifespan=lifespan
 )
 
 # Auth middleware để kiểm tra token
 app.middleware("http")(auth_middleware)
-
-# UI folder được mount từ docker-compose tại /ui
-ui_dir = "/ui"
+# Metrics middleware khai báo sau nên bọc ngoài cùng (đo cả thời gian auth)
+app.middleware("http")(metrics_middleware)
+# Deadline middleware bọc ngoài cùng: deadline bắt đầu tính từ khi request tới gateway
+app.add_middleware(DeadlineMiddleware)
 
 # Health check endpoint
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "service": "api-gateway"}
 
-# Serve HTML files (phải khai báo TRƯỚC api router)
+# Prometheus metrics
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+# Serve HTML files từ static asset cache (phải khai báo TRƯỚC api router)
 if os.path.exists(ui_dir):
-    @app.get("/")
-    async def read_index():
-        return FileResponse(f"{ui_dir}/index.html")
-    
-    @app.get("/payment.html")
-    async def read_payment():
-        return FileResponse(f"{ui_dir}/payment.html")
-    
-    @app.get("/profile.html")
-    async def read_profile():
-        return FileResponse(f"{ui_dir}/profile.html")
+    @app.api_route("/", methods=["GET", "HEAD"])
+    async def read_index(request: Request):
+        return static_assets.serve(request, "/index.html")
     
-    @app.get("/transactions.html")
-    async def read_transactions():
-        return FileResponse(f"{ui_dir}/transactions.html")
+    @app.api_route("/{page}.html", methods=["GET", "HEAD"])
+    async def read_page(request: Request, page: str):
+        return static_assets.serve(request, f"/{page}.html")
     
-    @app.get("/otp.html")
-    async def read_otp():
-        return FileResponse(f"{ui_dir}/otp.html")
-    
-    @app.get("/success.html")
-    async def read_success():
-        return FileResponse(f"{ui_dir}/success.html")
-    
-    @app.get("/header.html")
-    async def read_header():
-        return FileResponse(f"{ui_dir}/header.html")
-    
-    @app.get("/footer.html")
-    async def read_footer():
-        return FileResponse(f"{ui_dir}/footer.html")
-    
-    @app.get("/favicon.ico")
-    async def read_favicon():
+    @app.api_route("/favicon.ico", methods=["GET", "HEAD"])
+    async def read_favicon(request: Request):
         # Trả về logo làm favicon nếu chưa có file .ico riêng
-        logo_path = f"{ui_dir}/img/Logo-TDTU.png"
-        if os.path.exists(logo_path):
-            return FileResponse(logo_path, media_type="image/png")
-        from fastapi import HTTPException
-        raise HTTPException(status_code=404, detail="Favicon not found")
+        return static_assets.serve(request, "/img/Logo-TDTU.png")
+
+# Gateway introspection endpoints (/gateway/*)
+app.include_router(admin_router)
+
+# BFF aggregation endpoints (/api/bff/*) - phải đứng trước catch-all /api/{path}
+app.include_router(bff_router)
 
 # Include API router SAU (để catch-all pattern không ăn mất static routes)
 app.include_router(router)
 
-# Mount static assets CUỐI CÙNG
+# Static assets (css/js/img) CUỐI CÙNG
 if os.path.exists(ui_dir):
-    if os.path.exists(f"{ui_dir}/css"):
-        app.mount("/css", StaticFiles(directory=f"{ui_dir}/css"), name="css")
-    if os.path.exists(f"{ui_dir}/js"):
-        app.mount("/js", StaticFiles(directory=f"{ui_dir}/js"), name="js")
-    if os.path.exists(f"{ui_dir}/img"):
-        app.mount("/img", StaticFiles(directory=f"{ui_dir}/img"), name="img")
+    @app.api_route("/css/{path:path}", methods=["GET", "HEAD"])
+    async def read_css(request: Request, path: str):
+        return static_assets.serve(request, f"/css/{path}")
+    
+    @app.api_route("/js/{path:path}", methods=["GET", "HEAD"])
+    async def read_js(request: Request, path: str):
+        return static_assets.serve(request, f"/js/{path}")
+    
+    @app.api_route("/img/{path:path}", methods=["GET", "HEAD"])
+    async def read_img(request: Request, path: str):
+        return static_assets.serve(request, f"/img/{path}")
@@ -0,0 +1,139 @@
+from bisect import bisect_left
+
+# Latency buckets (giây) dùng chung cho mọi histogram
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Metric có labels, giá trị lưu trong dict theo tuple label values.
+    Gateway chạy trên một event loop nên cập nhật không cần lock.
+    """
+    type_name = ""
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        super().__init__(name, description, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for values, total in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(total)}")
+        return lines
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+        # label values -> [count theo từng bucket (không cộng dồn) + bucket +Inf, sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        entry = self._values.get(label_values)
+        if entry is None:
+            entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for values, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = _format_labels(self.labels, values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Request tới gateway (route = path template của FastAPI route, vd /api/transactions/{transaction_id})
+requests_total = registry.register(Counter(
+    "gateway_requests_total", "Requests handled by the gateway", ("route", "method", "status")
+))
+request_duration = registry.register(Histogram(
+    "gateway_request_duration_seconds", "Time until response headers are ready", ("route", "method")
+))
+overhead_duration = registry.register(Histogram(
+    "gateway_overhead_duration_seconds", "Gateway time excluding upstream calls (auth, routing, proxying)", ("route", "method")
+))
+requests_inflight = registry.register(Gauge(
+    "gateway_requests_inflight", "Requests currently being handled by the gateway"
+))
+
+# Request từ gateway tới backend services
+upstream_requests_total = registry.register(Counter(
+    "gateway_upstream_requests_total", "Requests proxied to backend services", ("backend", "status")
+))
+upstream_duration = registry.register(Histogram(
+    "gateway_upstream_duration_seconds", "Backend time until response headers", ("backend",)
+))
+upstream_inflight = registry.register(Gauge(
+    "gateway_upstream_inflight", "Requests currently waiting on a backend", ("backend",)
+))
+
+# Validate token trong auth middleware
+auth_duration = registry.register(Histogram(
+    "gateway_auth_duration_seconds", "Token validation time in the auth middleware", ("result",)
+))
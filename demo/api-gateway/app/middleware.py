@@ -1,25 +1,56 @@
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse, Response
 import httpx
+import time
+from app import deadline, metrics
 from app.config import settings
+from app.http_client import backend_clients
+from app.load_balancer import load_balancer
+from app.token_verifier import local_verifier
+from app.token_cache import token_cache
+from app.route_table import route_matcher
 
 async def get_token_from_cookie(request: Request) -> str | None:
     return request.cookies.get("access_token")
 
 async def validate_token(token: str) -> dict:
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{settings.auth_service_url}/api/auth/verify-token",
+    # Local mode: verify tại gateway, không cần round trip tới Auth Service
+    if settings.token_verification_mode == "local" and local_verifier.ready:
+        user = await local_verifier.verify(token)
+        if user is not None:
+            return user
+        # Token có thể đã bị revoke (revocation filter) -> hỏi Auth Service
+    return await validate_token_remote(token)
+
+async def validate_token_remote(token: str) -> dict:
+    # Tính timeout trước khi chọn replica: hết deadline thì raise mà không giữ lease
+    timeout = min(10.0, deadline.timeout().read)
+    lease = load_balancer.acquire(f"{settings.auth_service_url}/api/auth/verify-token")
+    try:
+        response = await backend_clients.get(lease.url).post(
+            lease.url,
             json={"token": token},
-            headers={"X-API-Key": settings.internal_api_key},
-            timeout=10.0
+            headers=deadline.headers({"X-API-Key": settings.internal_api_key}),
+            timeout=timeout
         )
-        if response.status_code != 200:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
-        result = response.json()
-        if not result.get("valid"):
-            raise HTTPException(status_code=401, detail=result.get("error", "Invalid or expired token"))
-        return result.get("user", {})
+    except httpx.HTTPError:
+        if deadline.client_expired():
+            lease.cancel()
+        else:
+            lease.release(connect_error=True)
+        # Timeout vì hết deadline -> DeadlineExceeded (504) thay vì lỗi httpx
+        deadline.check()
+        raise
+    except BaseException:
+        lease.cancel()
+        raise
+    lease.release(response.status_code)
+    if response.status_code != 200:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    result = response.json()
+    if not result.get("valid"):
+        raise HTTPException(status_code=401, detail=result.get("error", "Invalid or expired token"))
+    return result.get("user", {})
 
 async def auth_middleware(request: Request, call_next):
     path = request.url.path
@@ -30,78 +61,30 @@ async def auth_middleware(request: Request, call_next):
 
     token = await get_token_from_cookie(request)
     
-    # ============================================
-    # PUBLIC API ENDPOINTS (Không cần JWT auth)
-    # ============================================
-    public_api_endpoints = [
-        "/api/auth/login",           # Login endpoint
-        "/api/auth/logout",          # Logout endpoint (chỉ cần xóa cookie)
-        "/api/auth/verify-token",    # Internal endpoint - dùng API Key
-    ]
-    
-    # ============================================
-    # PUBLIC HTML PAGES (Không cần auth)
-    # ============================================
-    public_html_pages = [
-        "/",                         # Homepage/Login page
-        "/index.html",               # Login page
-        "/header.html",              # Shared header component
-        "/footer.html",              # Shared footer component
-    ]
-    
-    # ============================================
-    # PROTECTED HTML PAGES (Cho phép load, JS sẽ check auth)
-    # ============================================
-    # Các trang này cần auth nhưng phải cho phép load HTML
-    # để JavaScript (auth-check.js) có thể chạy và redirect nếu không có auth
-    protected_html_pages = [
-        "/otp.html",                 # OTP verification page
-        "/payment.html",             # Payment page
-        "/profile.html",             # User profile page
-        "/transactions.html",        # Transaction history page
-        "/success.html",             # Payment success page
-    ]
-    
-    # ============================================
-    # SYSTEM ENDPOINTS (Không cần auth)
-    # ============================================
-    system_endpoints = [
-        "/favicon.ico",              # Browser icon
-        "/docs",                     # API documentation (Swagger)
-        "/openapi.json",             # OpenAPI schema
-        "/health",                   # Health check endpoint
-    ]
-    
-    # ============================================
-    # STATIC RESOURCES (Không cần auth)
-    # ============================================
-    static_prefixes = [
-        "/css/",                     # Stylesheets
-        "/js/",                      # JavaScript files
-        "/img/",                     # Images
-        "/static/",                  # Other static assets
-    ]
-    
-    # ============================================
-    # CHECK PUBLIC ACCESS
-    # ============================================
-    all_public_paths = (
-        public_api_endpoints + 
-        public_html_pages + 
-        protected_html_pages +  # HTML pages cho phép load
-        system_endpoints
-    )
-    
-    if path in all_public_paths or any(path.startswith(prefix) for prefix in static_prefixes):
+    # Public paths (login, HTML pages, static, system endpoints) được khai báo
+    # trong route table (app/route_table.py) và compile sẵn lúc startup
+    route = route_matcher.match(path)
+    request.state.route = route
+
+    if route.public:
         return await call_next(request)
 
     if not token:
         return JSONResponse(status_code=401, content={"detail": "Missing access token"})
 
+    started = time.perf_counter()
     try:
-        user_info = await validate_token(token)
+        if settings.token_cache_enabled:
+            user_info = await token_cache.get_or_validate(token, validate_token)
+        else:
+            user_info = await validate_token(token)
+    except deadline.DeadlineExceeded as e:
+        metrics.auth_duration.observe(time.perf_counter() - started, "deadline")
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
     except HTTPException as e:
+        metrics.auth_duration.observe(time.perf_counter() - started, "invalid")
         return JSONResponse(status_code=401, content={"detail": str(e.detail)})
+    metrics.auth_duration.observe(time.perf_counter() - started, "valid")
 
     request.state.user = user_info
     request.state.token = token
@@ -109,3 +92,26 @@ async def auth_middleware(request: Request, call_next):
     response = await call_next(request)
     return response
 
+async def metrics_middleware(request: Request, call_next):
+    """
+    Đếm request theo route/method/status và đo latency tới khi response headers sẵn sàng,
+    tách thành upstream time (proxy_request ghi vào request.state) và gateway overhead
+    """
+    started = time.perf_counter()
+    request.state.upstream_seconds = 0.0
+    metrics.requests_inflight.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.requests_inflight.dec()
+        # Path template (vd /api/transactions/{transaction_id}) để label không bị bùng nổ
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        metrics.requests_total.inc(route_path, request.method, str(status))
+        metrics.request_duration.observe(elapsed, route_path, request.method)
+        overhead = max(0.0, elapsed - request.state.upstream_seconds)
+        metrics.overhead_duration.observe(overhead, route_path, request.method)
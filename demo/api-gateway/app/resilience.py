@@ -0,0 +1,219 @@
+import logging
+import math
+import time
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.load_balancer import load_balancer
+
+logger = logging.getLogger(__name__)
+
+# Priority class của route (khai báo trong route table)
+PRIORITY_CRITICAL = "critical"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho một backend:
+    - closed: cho qua tất cả, đếm lỗi liên tiếp (connect error, timeout, 5xx)
+    - open: từ chối ngay (503) trong cb_open_seconds
+    - half_open: cho một số request thử; thành công -> closed, lỗi -> open lại
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_inflight = 0
+        self.times_opened = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + settings.cb_open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                return False
+            self.state = HALF_OPEN
+            self.half_open_inflight = 0
+            logger.info("Circuit %s half-open", self.name)
+
+        if self.state == HALF_OPEN:
+            if self.half_open_inflight >= settings.cb_half_open_max_calls:
+                return False
+            self.half_open_inflight += 1
+        return True
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.warning("Circuit %s opened after %d failures", self.name, self.consecutive_failures)
+
+    def record(self, failed: bool, probe: bool):
+        if probe:
+            self.half_open_inflight = max(0, self.half_open_inflight - 1)
+
+        if not failed:
+            self.consecutive_failures = 0
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                logger.info("Circuit %s closed", self.name)
+            return
+
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= settings.cb_failure_threshold:
+            self._open()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_seconds": round(self.retry_after(), 1) if self.state == OPEN else 0,
+            "times_opened": self.times_opened,
+        }
+
+
+class AdaptiveLimiter:
+    """
+    Giới hạn số request đồng thời tới một backend theo AIMD:
+    - request thành công và nhanh (< limit_latency_threshold) khi đang dùng gần hết limit -> limit + 1
+    - lỗi/timeout hoặc chậm -> limit * limit_backoff_ratio
+    Route priority thấp chỉ được nhận khi còn nhiều headroom, để route critical
+    (vd /api/transactions/confirm) vẫn được admit khi backend quá tải.
+    """
+
+    def __init__(self):
+        self.limit = float(settings.limit_initial)
+        self.inflight = 0
+        self.rejected = 0
+
+    def _capacity(self, priority: str) -> float:
+        if priority == PRIORITY_LOW:
+            return self.limit * settings.limit_low_priority_ratio
+        if priority == PRIORITY_NORMAL:
+            return self.limit * settings.limit_normal_priority_ratio
+        return self.limit
+
+    def try_acquire(self, priority: str) -> bool:
+        if self.inflight >= max(1.0, self._capacity(priority)):
+            self.rejected += 1
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self, latency: float, failed: bool):
+        if failed or latency > settings.limit_latency_threshold:
+            self.limit = max(settings.limit_min, self.limit * settings.limit_backoff_ratio)
+        elif self.inflight * 2 >= self.limit:
+            self.limit = min(settings.limit_max, self.limit + 1)
+        self.inflight -= 1
+
+    def cancel(self):
+        """Request bị huỷ trước khi có kết quả: trả slot, không chỉnh limit"""
+        self.inflight -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 1),
+            "inflight": self.inflight,
+            "rejected": self.rejected,
+        }
+
+
+class Permit:
+    """Request đã được admit; release() cập nhật circuit breaker và concurrency limit"""
+
+    __slots__ = ("guard", "probe", "started_at", "latency", "_released")
+
+    def __init__(self, guard: "BackendGuard | None", probe: bool = False):
+        self.guard = guard
+        self.probe = probe
+        self.started_at = time.perf_counter()
+        self.latency: float | None = None
+        self._released = False
+
+    def mark_response(self):
+        """Ghi latency khi nhận được response headers (streaming body không tính vào)"""
+        self.latency = time.perf_counter() - self.started_at
+
+    def release(self, status_code: int | None = None, error: bool = False):
+        if self._released or self.guard is None:
+            return
+        self._released = True
+        if self.latency is None:
+            self.mark_response()
+        failed = error or (status_code is not None and status_code >= 500)
+        self.guard.breaker.record(failed, self.probe)
+        self.guard.limiter.release(self.latency, failed)
+
+    def cancel(self):
+        """
+        Client huỷ request (disconnect) trước khi backend trả lời: chỉ trả slot,
+        không tính là lỗi của backend (không mở circuit, không giảm limit)
+        """
+        if self._released or self.guard is None:
+            return
+        self._released = True
+        if self.probe:
+            self.guard.breaker.half_open_inflight = max(0, self.guard.breaker.half_open_inflight - 1)
+        self.guard.limiter.cancel()
+
+
+class BackendGuard:
+    def __init__(self, name: str):
+        self.breaker = CircuitBreaker(name)
+        self.limiter = AdaptiveLimiter()
+
+    def admit(self, priority: str) -> Permit:
+        """Raise 503 + Retry-After nếu circuit đang open hoặc backend hết concurrency"""
+        if not self.breaker.allow():
+            raise _unavailable("Backend service temporarily unavailable", self.breaker.retry_after())
+        probe = self.breaker.state == HALF_OPEN
+
+        if not self.limiter.try_acquire(priority):
+            if probe:
+                self.breaker.half_open_inflight -= 1
+            raise _unavailable("Backend service overloaded", settings.limit_retry_after)
+        return Permit(self, probe)
+
+    def snapshot(self) -> dict:
+        return {
+            "circuit_breaker": self.breaker.snapshot(),
+            "concurrency": self.limiter.snapshot(),
+        }
+
+
+def _unavailable(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class Resilience:
+    def __init__(self, names):
+        self.guards = {name: BackendGuard(name) for name in names}
+
+    def admit(self, target_url: str, priority: str = PRIORITY_NORMAL) -> Permit:
+        if not settings.resilience_enabled:
+            return Permit(None)
+        guard = self.guards.get(load_balancer.backend_for(target_url))
+        if guard is None:
+            return Permit(None)
+        return guard.admit(priority)
+
+    def snapshot(self) -> dict:
+        return {name: guard.snapshot() for name, guard in self.guards.items()}
+
+
+resilience = Resilience(load_balancer.pools.keys())
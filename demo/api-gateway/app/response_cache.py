@@ -0,0 +1,138 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+import httpx
+
+from app.config import settings
+
+
+def _response_size(response: httpx.Response) -> int:
+    return len(response.content) + sum(len(k) + len(v) for k, v in response.headers.raw)
+
+
+class ResponseCache:
+    """
+    Singleflight + micro-cache cho các GET idempotent, theo từng user.
+
+    - Các GET giống nhau (cùng user, cùng URL) đang chạy đồng thời dùng chung một lần gọi backend
+    - Response 200 (không set-cookie) được giữ ttl giây, tổng dung lượng bị giới hạn (LRU eviction)
+    - Request mutating của user xoá toàn bộ entries của user đó; GET đang chạy từ trước
+      khi invalidate sẽ không được ghi vào cache (generation counter)
+    """
+
+    def __init__(self, ttl: float, max_bytes: int, max_entry_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        # (user_id, url) -> (expires_at, size, response)
+        self._entries: OrderedDict[tuple, tuple[float, int, httpx.Response]] = OrderedDict()
+        self._by_user: dict[str, set[tuple]] = {}
+        self._generations: dict[str, int] = {}
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _get(self, key: tuple) -> httpx.Response | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, response = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        user_keys = self._by_user.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._by_user[key[0]]
+
+    def _put(self, key: tuple, response: httpx.Response):
+        if self.ttl <= 0 or response.status_code != 200 or "set-cookie" in response.headers:
+            return
+        size = _response_size(response)
+        if size > self.max_entry_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, response)
+        self._by_user.setdefault(key[0], set()).add(key)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def get_or_fetch(self, user_id: str, url: str, fetch: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        key = (user_id, url)
+        response = self._get(key)
+        if response is not None:
+            self.hits += 1
+            return response
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            generation = self._generations.get(user_id, 0)
+            task = asyncio.create_task(fetch())
+            self._inflight[key] = task
+
+            def _done(t: asyncio.Task):
+                if self._inflight.get(key) is t:
+                    del self._inflight[key]
+                if t.cancelled() or t.exception() is not None:
+                    return
+                if self._generations.get(user_id, 0) == generation:
+                    self._put(key, t.result())
+
+            task.add_done_callback(_done)
+
+        # shield: một request bị huỷ không huỷ lần gọi backend dùng chung
+        return await asyncio.shield(task)
+
+    def invalidate_user(self, user_id: str):
+        """Gọi sau request mutating (confirm, update-profile, logout...) của user"""
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        # GET đang chạy sẽ không được ghi vào cache; request mới không join vào nó nữa
+        for key in [key for key in self._inflight if key[0] == user_id]:
+            del self._inflight[key]
+        for key in list(self._by_user.get(user_id, ())):
+            self._remove(key)
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "inflight": len(self._inflight),
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(
+    ttl=settings.response_cache_ttl,
+    max_bytes=settings.response_cache_max_bytes,
+    max_entry_bytes=settings.response_cache_max_entry_bytes,
+)
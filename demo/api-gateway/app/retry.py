@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import random
+from collections import deque
+from typing import Awaitable, Callable, Protocol
+
+import httpx
+
+from app import deadline
+from app.config import settings
+from app.load_balancer import load_balancer
+
+logger = logging.getLogger(__name__)
+
+# Method idempotent theo HTTP semantics; route khác phải được đánh dấu retry_safe trong route table
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Status của backend đáng để thử lại (thường là replica đang restart/quá tải)
+RETRYABLE_STATUSES = {502, 503, 504}
+# Lỗi transport: request chưa tới được backend hoặc kết nối bị rớt
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.ReadError)
+
+
+class Attempt(Protocol):
+    response: httpx.Response
+
+    async def discard(self): ...
+
+
+class RetryBudget:
+    """
+    Retry budget toàn cục (token bucket): mỗi request nạp retry_budget_ratio token,
+    mỗi retry/hedge tiêu 1 token. Số retry vì vậy không vượt quá ~ratio * traffic
+    (cộng một lượng nhỏ retry_budget_max_tokens cho lúc traffic thấp) -> không gây retry storm.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        self.requests += 1
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            self.exhausted += 1
+            return False
+        self.tokens -= 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "ratio": self.ratio,
+            "tokens": round(self.tokens, 2),
+            "requests": self.requests,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "exhausted": self.exhausted,
+        }
+
+
+class LatencyTracker:
+    """Latency gần đây của từng backend (ring buffer) để tính hedge delay theo percentile"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._samples: dict[str, deque] = {}
+
+    def observe(self, backend: str, seconds: float):
+        samples = self._samples.get(backend)
+        if samples is None:
+            samples = self._samples[backend] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, backend: str, q: float) -> float | None:
+        samples = self._samples.get(backend)
+        if not samples or len(samples) < settings.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def backoff_delay(retry: int) -> float:
+    """Exponential backoff với full jitter: random(0, min(max, base * 2^retry))"""
+    return random.uniform(0, min(settings.retry_max_backoff, settings.retry_base_backoff * (2 ** retry)))
+
+
+class RetryPolicy:
+    def __init__(self):
+        self.budget = RetryBudget(settings.retry_budget_ratio, settings.retry_budget_max_tokens)
+        self.latencies = LatencyTracker(settings.hedge_latency_window)
+
+    def _hedge_delay(self, backend: str | None) -> float | None:
+        if not settings.hedge_enabled or backend is None:
+            return None
+        if load_balancer.replica_count(backend) < 2:
+            return None
+        p = self.latencies.percentile(backend, settings.hedge_percentile)
+        if p is None:
+            return None
+        return max(settings.hedge_min_delay, p)
+
+    async def execute(self, send: Callable[[], Awaitable[Attempt]], backend: str | None, retryable: bool) -> Attempt:
+        """
+        Gửi request qua send(); nếu retryable thì thử lại khi gặp lỗi transport hoặc 502/503/504
+        (tối đa retry_max_attempts lần, trong giới hạn retry budget) và hedge khi backend có
+        nhiều replica. Request không retryable chỉ được gửi một lần.
+        """
+        self.budget.deposit()
+        if not retryable:
+            return await send()
+
+        hedge_delay = self._hedge_delay(backend)
+        retries = 0
+        while True:
+            try:
+                if hedge_delay is not None:
+                    attempt = await self._hedged(send, hedge_delay)
+                else:
+                    attempt = await send()
+            except RETRYABLE_ERRORS:
+                if not self._can_retry(retries):
+                    raise
+            else:
+                if attempt.response.status_code not in RETRYABLE_STATUSES or not self._can_retry(retries):
+                    return attempt
+                await attempt.discard()
+
+            retries += 1
+            self.budget.retries += 1
+            delay = backoff_delay(retries - 1)
+            logger.info("Retrying %s request (retry %d) in %.3fs", backend, retries, delay)
+            await asyncio.sleep(delay)
+
+    def _can_retry(self, retries: int) -> bool:
+        # Không retry khi request đã hết deadline (client không còn chờ kết quả)
+        left = deadline.remaining()
+        if left is not None and left <= 0:
+            return False
+        return retries < settings.retry_max_attempts and self.budget.withdraw()
+
+    async def _hedged(self, send: Callable[[], Awaitable[Attempt]], delay: float) -> Attempt:
+        """
+        Gửi request; nếu sau delay (≈ p95 latency của backend) chưa có response thì gửi thêm
+        một request nữa (load balancer thường chọn replica khác). Lấy response tốt đầu tiên, huỷ request còn lại.
+        """
+        first = asyncio.ensure_future(send())
+        pending = {first}
+        result = fallback = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if pending and self.budget.withdraw():
+                self.budget.hedges += 1
+                pending.add(asyncio.ensure_future(send()))
+
+            while True:
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    attempt = task.result()
+                    if result is None and attempt.response.status_code not in RETRYABLE_STATUSES:
+                        result = attempt
+                    elif fallback is None:
+                        fallback = attempt
+                    else:
+                        await attempt.discard()
+                if result is not None or not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            if result is not None:
+                if fallback is not None:
+                    await fallback.discard()
+                return result
+            if fallback is not None:
+                return fallback
+            # Tất cả đều lỗi transport: raise lỗi của request đầu tiên
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in pending:
+                try:
+                    attempt = await task
+                except BaseException:
+                    continue
+                await attempt.discard()
+
+    def stats(self) -> dict:
+        return self.budget.stats()
+
+
+retry_policy = RetryPolicy()
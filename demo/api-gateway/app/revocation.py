@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import hashlib
+import logging
+
+import httpx
+
+from app.config import settings
+from app.http_client import backend_clients
+from app.load_balancer import load_balancer
+
+logger = logging.getLogger(__name__)
+
+
+class BloomSnapshot:
+    """Bloom filter do Auth Service phân phối (cùng cách hash với auth-service/app/revocation.py)"""
+
+    def __init__(self, bits: int, hashes: int, data: bytes):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = data
+
+    def __contains__(self, key: str) -> bool:
+        digest = hashlib.sha256(key.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.bits
+            if not self.data[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class RevocationFilter:
+    """
+    Snapshot revocation list của Auth Service (GET /api/auth/revocations, có ETag),
+    refresh định kỳ ở background. Dùng khi verify token tại gateway: jti có thể đã bị revoke
+    (có trong filter, kể cả false positive) thì phải hỏi lại Auth Service.
+    Chưa tải được snapshot thì coi mọi token có jti là "có thể đã revoke" (fail closed).
+    """
+
+    def __init__(self):
+        self._snapshot: BloomSnapshot | None = None
+        self._etag: str | None = None
+        self._refresh_interval = settings.revocation_refresh_interval
+        self._task: asyncio.Task | None = None
+        self.version: int | None = None
+        self.count = 0
+
+    def might_be_revoked(self, jti: str) -> bool:
+        return self._snapshot is None or jti in self._snapshot
+
+    async def refresh(self) -> bool:
+        lease = load_balancer.acquire(f"{settings.auth_service_url}/api/auth/revocations")
+        headers = {"X-API-Key": settings.internal_api_key}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        try:
+            response = await backend_clients.get(lease.url).get(lease.url, headers=headers, timeout=10.0)
+            lease.release(response.status_code)
+            if response.status_code == 304:
+                return True
+            response.raise_for_status()
+            data = response.json()
+            snapshot = BloomSnapshot(data["bits"], data["hashes"], base64.b64decode(data["filter"]))
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            lease.release(connect_error=True)
+            logger.warning("Không tải được revocation list từ Auth Service: %s", e)
+            return False
+
+        self._snapshot = snapshot
+        self._etag = response.headers.get("etag")
+        self.version = data.get("version")
+        self.count = data.get("count", 0)
+        self._refresh_interval = data.get("refresh_interval") or settings.revocation_refresh_interval
+        return True
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self._refresh_interval)
+            await self.refresh()
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self._snapshot is not None,
+            "version": self.version,
+            "revoked": self.count,
+            "bits": self._snapshot.bits if self._snapshot else None,
+            "refresh_interval": self._refresh_interval,
+        }
+
+
+revocation_filter = RevocationFilter()
@@ -0,0 +1,183 @@
+from dataclasses import dataclass
+from app.config import settings
+from app.resilience import PRIORITY_CRITICAL, PRIORITY_LOW, PRIORITY_NORMAL
+
+
+@dataclass(frozen=True)
+class RouteEntry:
+    """
+    Một dòng trong route table của gateway.
+
+    path: exact path (vd "/health") hoặc prefix (prefix=True, vd "/api/otp", "/css/")
+    public: không cần JWT auth
+    backend: base URL của backend service xử lý path này
+    strip_prefix: bỏ prefix trước khi forward (vd /api/students/search -> /search)
+    priority: priority class khi backend quá tải (critical/normal/low), mặc định lấy từ prefix cha
+    retry_safe: route không thay đổi dữ liệu dù method là POST, được retry như GET
+    """
+    path: str
+    prefix: bool = False
+    public: bool = False
+    backend: str | None = None
+    strip_prefix: bool = False
+    priority: str | None = None
+    retry_safe: bool = False
+
+
+@dataclass(frozen=True)
+class RouteMatch:
+    """Kết quả match: path có public không, backend nào, có strip prefix không, priority, retry"""
+    public: bool = False
+    backend: str | None = None
+    strip_prefix: bool = False
+    prefix: str | None = None
+    priority: str = PRIORITY_NORMAL
+    retry_safe: bool = False
+
+
+NO_MATCH = RouteMatch()
+
+ROUTE_TABLE = [
+    # ============================================
+    # BACKEND SERVICES (mặc định cần JWT auth)
+    # ============================================
+    # Các service có prefix trong router: giữ nguyên path
+    RouteEntry("/api/auth", prefix=True, backend=settings.auth_service_url),
+    RouteEntry("/api/customers", prefix=True, backend=settings.customer_service_url),
+    RouteEntry("/api/transactions", prefix=True, backend=settings.payment_service_url),
+    RouteEntry("/api/otp", prefix=True, backend=settings.otp_service_url),
+    # Tuition service: strip prefix, ví dụ /api/students/search -> /search
+    RouteEntry("/api/students", prefix=True, backend=settings.tuition_service_url, strip_prefix=True),
+    RouteEntry("/api/tuitions", prefix=True, backend=settings.tuition_service_url, strip_prefix=True),
+
+    # BFF aggregation endpoints: xử lý tại gateway, gọi nhiều backend song song
+    RouteEntry("/api/bff", prefix=True),
+
+    # ============================================
+    # PRIORITY (admission khi backend quá tải)
+    # ============================================
+    # Xác nhận thanh toán được ưu tiên hơn các route chỉ đọc
+    RouteEntry("/api/transactions/confirm", priority=PRIORITY_CRITICAL),
+    RouteEntry("/api/transactions/history", priority=PRIORITY_LOW),
+    # Search chỉ đọc dữ liệu (POST vì có body) nên được retry khi backend lỗi tạm thời
+    RouteEntry("/api/students/search", priority=PRIORITY_LOW, retry_safe=True),
+    RouteEntry("/api/tuitions/search", priority=PRIORITY_LOW, retry_safe=True),
+
+    # ============================================
+    # PUBLIC API ENDPOINTS (Không cần JWT auth)
+    # ============================================
+    RouteEntry("/api/auth/login", public=True),           # Login endpoint
+    RouteEntry("/api/auth/logout", public=True),          # Logout endpoint (chỉ cần xóa cookie)
+    RouteEntry("/api/auth/verify-token", public=True),    # Internal endpoint - dùng API Key
+
+    # ============================================
+    # PUBLIC HTML PAGES (Không cần auth)
+    # ============================================
+    RouteEntry("/", public=True),                         # Homepage/Login page
+    RouteEntry("/index.html", public=True),               # Login page
+    RouteEntry("/header.html", public=True),              # Shared header component
+    RouteEntry("/footer.html", public=True),              # Shared footer component
+
+    # ============================================
+    # PROTECTED HTML PAGES (Cho phép load, JS sẽ check auth)
+    # ============================================
+    # Các trang này cần auth nhưng phải cho phép load HTML
+    # để JavaScript (auth-check.js) có thể chạy và redirect nếu không có auth
+    RouteEntry("/otp.html", public=True),                 # OTP verification page
+    RouteEntry("/payment.html", public=True),             # Payment page
+    RouteEntry("/profile.html", public=True),             # User profile page
+    RouteEntry("/transactions.html", public=True),        # Transaction history page
+    RouteEntry("/success.html", public=True),             # Payment success page
+
+    # ============================================
+    # SYSTEM ENDPOINTS (Không cần auth)
+    # ============================================
+    RouteEntry("/favicon.ico", public=True),              # Browser icon
+    RouteEntry("/docs", public=True),                     # API documentation (Swagger)
+    RouteEntry("/openapi.json", public=True),             # OpenAPI schema
+    RouteEntry("/health", public=True),                   # Health check endpoint
+    RouteEntry("/metrics", public=True),                  # Prometheus metrics
+    RouteEntry("/gateway", prefix=True, public=True),     # Gateway introspection (dùng API Key)
+
+    # ============================================
+    # STATIC RESOURCES (Không cần auth)
+    # ============================================
+    RouteEntry("/css/", prefix=True, public=True),        # Stylesheets
+    RouteEntry("/js/", prefix=True, public=True),         # JavaScript files
+    RouteEntry("/img/", prefix=True, public=True),        # Images
+    RouteEntry("/static/", prefix=True, public=True),     # Other static assets
+]
+
+
+def _segments(path: str) -> list[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+class _TrieNode:
+    __slots__ = ("children", "match")
+
+    def __init__(self):
+        self.children: dict[str, "_TrieNode"] = {}
+        self.match: RouteMatch | None = None
+
+
+class RouteMatcher:
+    """
+    Route table được compile một lần:
+    - exact paths -> dict lookup O(1)
+    - prefixes -> trie theo path segment (longest prefix match)
+    Exact path nằm dưới một prefix (vd /api/auth/login) được gộp sẵn backend của prefix đó,
+    nên mỗi request chỉ cần một lần lookup.
+    """
+
+    def __init__(self, entries: list[RouteEntry]):
+        self._root = _TrieNode()
+        self._exact: dict[str, RouteMatch] = {}
+
+        for entry in entries:
+            if entry.prefix:
+                node = self._root
+                for segment in _segments(entry.path):
+                    node = node.children.setdefault(segment, _TrieNode())
+                node.match = RouteMatch(
+                    public=entry.public,
+                    backend=entry.backend,
+                    strip_prefix=entry.strip_prefix,
+                    prefix=entry.path.rstrip("/") or "/",
+                    priority=entry.priority or PRIORITY_NORMAL,
+                    retry_safe=entry.retry_safe
+                )
+
+        for entry in entries:
+            if not entry.prefix:
+                parent = self._match_prefix(entry.path)
+                self._exact[entry.path] = RouteMatch(
+                    public=entry.public or parent.public,
+                    backend=entry.backend or parent.backend,
+                    strip_prefix=entry.strip_prefix or parent.strip_prefix,
+                    prefix=parent.prefix,
+                    priority=entry.priority or parent.priority,
+                    retry_safe=entry.retry_safe or parent.retry_safe
+                )
+
+    def _match_prefix(self, path: str) -> RouteMatch:
+        node = self._root
+        best = NO_MATCH
+        for segment in path.split("/"):
+            if not segment:
+                continue
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.match is not None:
+                best = node.match
+        return best
+
+    def match(self, path: str) -> RouteMatch:
+        exact = self._exact.get(path)
+        if exact is not None:
+            return exact
+        return self._match_prefix(path)
+
+
+route_matcher = RouteMatcher(ROUTE_TABLE)
@@ -1,131 +1,435 @@
 from fastapi import APIRouter, Request, HTTPException, Response
 import httpx
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from app.config import settings
+from app.http_client import backend_clients
+from app import deadline, metrics
+from app.load_balancer import Lease, load_balancer
+from app.resilience import PRIORITY_CRITICAL, PRIORITY_NORMAL, Permit, resilience
+from app.response_cache import response_cache
+from app.retry import IDEMPOTENT_METHODS, retry_policy
+from app.token_cache import token_cache, token_user_id
+from app.route_table import ROUTE_TABLE, route_matcher
+import asyncio
 import json
+import time
+from urllib.parse import urlencode
 
 router = APIRouter()
 
+# prefix -> backend URL (khai báo trong route table)
 SERVICE_MAP = {
-    "/api/auth": settings.auth_service_url,
-    "/api/customers": settings.customer_service_url,
-    "/api/students": settings.tuition_service_url,
-    "/api/tuitions": settings.tuition_service_url,
-    "/api/transactions": settings.payment_service_url,
-    "/api/otp": settings.otp_service_url,
+    entry.path: entry.backend
+    for entry in ROUTE_TABLE
+    if entry.prefix and entry.backend
 }
 
-async def proxy_request(request: Request, target_url: str, add_api_key: bool = False, modify_body=None, skip_query_params: bool = False):
+# Hop-by-hop headers không được forward sang backend
+# (connection/keep-alive do connection pool của gateway tự quản lý)
+EXCLUDED_REQUEST_HEADERS = {
+    "host", "content-length", "transfer-encoding", "connection", "keep-alive",
+    "proxy-authenticate", "proxy-authorization", "te", "trailers", "upgrade",
+    # Gateway tự đặt deadline (client chỉ có thể rút ngắn, xem app/deadline.py)
+    "x-deadline-ms"
+}
+
+# Exclude hop-by-hop headers và CORS headers từ backend
+EXCLUDED_RESPONSE_HEADERS = {
+    "content-length", "transfer-encoding", "connection", "keep-alive", 
+    "proxy-authenticate", "proxy-authorization", "te", "trailers", "upgrade",
+    "access-control-allow-origin", "access-control-allow-credentials",
+    "access-control-allow-methods", "access-control-allow-headers",
+    "access-control-expose-headers", "access-control-max-age"
+}
+
+# Method không thay đổi dữ liệu; các method khác invalidate response cache của user
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Conditional headers của client không gửi theo các lần gọi mà gateway dùng kết quả
+# (response cache dùng chung giữa các request, BFF): gateway tự so ETag với If-None-Match
+CONDITIONAL_REQUEST_HEADERS = {"if-none-match", "if-modified-since"}
+
+def _user_id_of(user: dict | None) -> str | None:
+    if user:
+        user_id = user.get("id") or user.get("user_id")
+        if user_id:
+            return str(user_id)
+    return None
+
+def _user_id(request: Request) -> str | None:
+    return _user_id_of(getattr(request.state, "user", None))
+
+def build_upstream_headers(request: Request, add_api_key: bool = False) -> dict:
+    """Headers gửi sang backend: bỏ hop-by-hop headers, thêm API key và user info"""
+    headers = {
+        k: v for k, v in request.headers.items()
+        if k.lower() not in EXCLUDED_REQUEST_HEADERS
+    }
+
+    # Add API key for internal endpoints
+    if add_api_key:
+        headers["X-API-Key"] = settings.internal_api_key
+
+    if hasattr(request.state, "token"):
+        headers["Cookie"] = f"access_token={request.state.token}"
+
+    # IP của client được nối vào cuối X-Forwarded-For (Auth Service throttle login theo IP)
+    if request.client:
+        forwarded_for = headers.pop("x-forwarded-for", None)
+        headers["X-Forwarded-For"] = f"{forwarded_for}, {request.client.host}" if forwarded_for else request.client.host
+
+    user_id = _user_id(request)
+    if user_id:
+        headers["X-Customer-ID"] = user_id
+        headers["X-User-ID"] = user_id
+
+    return headers
+
+def build_response_headers(request: Request, response: httpx.Response, excluded: set) -> tuple[dict, list]:
+    """
+    Filter headers của backend response và thêm CORS headers của gateway.
+    Trả về (headers, set-cookie list) - set-cookie được append riêng để giữ nhiều cookie.
+    """
+    # Lưu cookies trước khi filter
+    cookies = response.headers.get_list("set-cookie") if "set-cookie" in response.headers else []
+    
+    # Filter headers
+    response_headers = {
+        k: v for k, v in response.headers.items() 
+        if k.lower() not in excluded and k.lower() != "set-cookie"
+    }
+    
+    # Gateway thêm CORS headers
+    origin = request.headers.get("origin", "*")
+    response_headers["Access-Control-Allow-Origin"] = origin
+    response_headers["Access-Control-Allow-Credentials"] = "true"
+    response_headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, PATCH, OPTIONS"
+    response_headers["Access-Control-Allow-Headers"] = "content-type, authorization, cookie, x-user-id, x-customer-id"
+    response_headers["Access-Control-Expose-Headers"] = "set-cookie"
+
+    return response_headers, cookies
+
+def _upstream_started(lease: Lease) -> float:
+    metrics.upstream_inflight.inc(lease.backend)
+    return time.perf_counter()
+
+def _upstream_finished(request: Request, lease: Lease, started: float, status):
+    """Ghi metrics của một lần gọi backend (tới khi có response headers)"""
+    elapsed = time.perf_counter() - started
+    metrics.upstream_inflight.dec(lease.backend)
+    metrics.upstream_requests_total.inc(lease.backend, str(status))
+    metrics.upstream_duration.observe(elapsed, lease.backend)
+    if isinstance(status, int) and status < 500:
+        # p95 latency của backend dùng làm hedge delay
+        retry_policy.latencies.observe(lease.backend, elapsed)
+    # metrics middleware tách upstream time khỏi gateway overhead
+    request.state.upstream_seconds = getattr(request.state, "upstream_seconds", 0.0) + elapsed
+
+async def proxy_request(request: Request, target_url: str, add_api_key: bool = False, modify_body=None, skip_query_params: bool = False, priority: str | None = None):
     """
     Proxy request to backend service
     
+    Routes không cần sửa body (modify_body=None) được proxy ở chế độ streaming:
+    body request/response được chuyển tiếp dạng stream, không parse/encode lại JSON.
+    
+    GET của user đã đăng nhập đi qua response cache: các GET giống nhau đang chạy
+    dùng chung một lần gọi backend, kết quả được cache vài giây. Request mutating
+    (POST/PUT/DELETE...) của user xoá cache của user đó.
+    
     Args:
         request: FastAPI request object
-        target_url: Target URL to proxy to (may include query string)
+        target_url: Target URL to proxy to (may include query string);
+            origin được load balancer đổi sang replica được chọn
         add_api_key: Whether to add internal API key
         modify_body: Optional function to modify request body before sending
         skip_query_params: If True, don't add request.query_params (useful when URL already has query string)
+        priority: Priority class khi backend quá tải (mặc định lấy từ route table)
+    
+    Method idempotent và route retry_safe (route table) được retry khi lỗi kết nối
+    hoặc 502/503/504, trong giới hạn retry budget (xem app/retry.py).
+    
+    Raises 503 + Retry-After ngay khi circuit breaker của backend đang open
+    hoặc backend đã hết concurrency limit cho priority này.
     """
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        body = await request.body()
-        
-        # Modify body if needed
-        if modify_body and body:
-            try:
-                body_data = json.loads(body)
-                body_data = modify_body(body_data)
-                body = json.dumps(body_data).encode()
-            except:
-                pass
-
-        headers = {
-            k: v for k, v in request.headers.items()
-            if k.lower() not in ["host", "content-length"]
-        }
-
-        # Add API key for internal endpoints
-        if add_api_key:
-            headers["X-API-Key"] = settings.internal_api_key
-
-        if hasattr(request.state, "token"):
-            headers["Cookie"] = f"access_token={request.state.token}"
-
-        if hasattr(request.state, "user"):
-            user_id = request.state.user.get("id") or request.state.user.get("user_id")
-            if user_id:
-                headers["X-Customer-ID"] = str(user_id)
-                headers["X-User-ID"] = str(user_id)
-
+    route = getattr(request.state, "route", None)
+    if priority is None:
+        priority = route.priority if route else PRIORITY_NORMAL
+    retryable = request.method in IDEMPOTENT_METHODS or (route is not None and route.retry_safe)
+
+    user_id = _user_id(request)
+    if settings.response_cache_enabled and user_id and request.method == "GET" and modify_body is None:
+        return await _proxy_cached(request, target_url, user_id, add_api_key, skip_query_params, priority)
+
+    try:
+        # Hết deadline thì trả 504 ngay, không chiếm slot / ghi kết quả vào circuit breaker
+        deadline.check()
+        permit = resilience.admit(target_url, priority)
         try:
-            # If URL already has query string and skip_query_params is True, don't add params
-            request_params = None if skip_query_params else request.query_params
-            response = await client.request(
-                method=request.method,
-                url=target_url,
-                params=request_params,
-                content=body if body else None,
-                headers=headers,
-                follow_redirects=True
+            return await _proxy_admitted(request, target_url, permit, add_api_key, modify_body, skip_query_params, retryable)
+        except BaseException as e:
+            _release_failed(permit, e)
+            raise
+    finally:
+        if user_id and request.method not in SAFE_METHODS:
+            response_cache.invalidate_user(user_id)
+
+async def _proxy_cached(request: Request, target_url: str, user_id: str, add_api_key: bool, skip_query_params: bool, priority: str):
+    """GET qua singleflight + micro-cache (response được buffer để dùng chung)"""
+    params = None if skip_query_params else request.query_params
+    cache_key = f"{target_url}?{params}" if params else target_url
+    response = await response_cache.get_or_fetch(
+        user_id, cache_key,
+        lambda: call_backend(request, "GET", target_url, priority=priority, add_api_key=add_api_key, params=params)
+    )
+    if _etag_matches(request, response):
+        return _not_modified(request, response)
+    return _client_response(request, response)
+
+def _etag_matches(request: Request, response: httpx.Response) -> bool:
+    """If-None-Match của client khớp ETag của response 200 (đã buffer) từ backend"""
+    etag = response.headers.get("etag")
+    if_none_match = request.headers.get("if-none-match")
+    if response.status_code != 200 or not etag or not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+def _not_modified(request: Request, response: httpx.Response) -> Response:
+    """304 không body, giữ ETag / Cache-Control của backend"""
+    response_headers, _ = build_response_headers(
+        request, response, EXCLUDED_RESPONSE_HEADERS | {"content-encoding", "content-type"}
+    )
+    return Response(status_code=304, headers=response_headers)
+
+async def _proxy_admitted(request: Request, target_url: str, permit: Permit, add_api_key: bool, modify_body, skip_query_params: bool, retryable: bool):
+    headers = build_upstream_headers(request, add_api_key)
+    # If URL already has query string and skip_query_params is True, don't add params
+    request_params = None if skip_query_params else request.query_params
+
+    # Body dạng stream chỉ gửi được một lần -> request cần retry thì buffer body
+    if settings.proxy_streaming and modify_body is None and not (retryable and _has_body(request)):
+        return await _proxy_streaming(request, target_url, headers, request_params, permit, retryable)
+
+    body = await request.body()
+    
+    # Modify body if needed
+    if modify_body and body:
+        try:
+            body_data = json.loads(body)
+            body_data = modify_body(body_data)
+            body = json.dumps(body_data).encode()
+        except:
+            pass
+
+    response = await _send_buffered(
+        request, target_url, permit, request.method, retryable,
+        params=request_params,
+        content=body if body else None,
+        headers=headers
+    )
+    return _client_response(request, response)
+
+def _client_response(request: Request, response: httpx.Response) -> Response:
+    """Dựng response trả về client từ response (đã đọc hết body) của backend"""
+    # response.content đã được httpx giải nén nên bỏ content-encoding của backend
+    response_headers, cookies = build_response_headers(
+        request, response, EXCLUDED_RESPONSE_HEADERS | {"content-encoding"}
+    )
+    
+    content_type = response.headers.get("content-type", "")
+    if content_type and content_type.startswith("application/json"):
+        try:
+            json_response = JSONResponse(
+                content=response.json(), 
+                status_code=response.status_code, 
+                headers=response_headers
             )
-        except httpx.ConnectError:
-            raise HTTPException(status_code=502, detail="Backend service unavailable")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
-
-        # Exclude hop-by-hop headers và CORS headers từ backend
-        excluded_headers = {
-            "content-length", "transfer-encoding", "connection", "keep-alive", 
-            "proxy-authenticate", "proxy-authorization", "te", "trailers", "upgrade",
-            "access-control-allow-origin", "access-control-allow-credentials",
-            "access-control-allow-methods", "access-control-allow-headers",
-            "access-control-expose-headers", "access-control-max-age"
-        }
-        
-        # Lưu cookies trước khi filter
-        cookies = response.headers.get_list("set-cookie") if "set-cookie" in response.headers else []
-        
-        # Filter headers
-        response_headers = {
-            k: v for k, v in response.headers.items() 
-            if k.lower() not in excluded_headers and k.lower() != "set-cookie"
-        }
-        
-        # Gateway thêm CORS headers
-        origin = request.headers.get("origin", "*")
-        response_headers["Access-Control-Allow-Origin"] = origin
-        response_headers["Access-Control-Allow-Credentials"] = "true"
-        response_headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, PATCH, OPTIONS"
-        response_headers["Access-Control-Allow-Headers"] = "content-type, authorization, cookie, x-user-id, x-customer-id"
-        response_headers["Access-Control-Expose-Headers"] = "set-cookie"
-        
-        content_type = response.headers.get("content-type", "")
-        if content_type and content_type.startswith("application/json"):
-            try:
-                json_response = JSONResponse(
-                    content=response.json(), 
-                    status_code=response.status_code, 
-                    headers=response_headers
-                )
-            except:
-                json_response = Response(
-                    content=response.content, 
-                    status_code=response.status_code, 
-                    headers=response_headers, 
-                    media_type=content_type
-                )
-        else:
+        except:
             json_response = Response(
                 content=response.content, 
                 status_code=response.status_code, 
                 headers=response_headers, 
                 media_type=content_type
             )
-        
-        # Forward set-cookie headers
-        for cookie in cookies:
-            json_response.headers.append("set-cookie", cookie)
-        
-        return json_response
+    else:
+        json_response = Response(
+            content=response.content, 
+            status_code=response.status_code, 
+            headers=response_headers, 
+            media_type=content_type
+        )
+    
+    # Forward set-cookie headers
+    for cookie in cookies:
+        json_response.headers.append("set-cookie", cookie)
+    
+    return json_response
+
+class Upstream:
+    """Response của một lần gửi tới backend (có thể đang stream) cùng lease của replica"""
+
+    __slots__ = ("response", "lease")
+
+    def __init__(self, response: httpx.Response, lease: Lease):
+        self.response = response
+        self.lease = lease
+
+    async def discard(self):
+        """Bỏ response (retry/hedge thua): đóng stream và trả replica"""
+        await self.response.aclose()
+        self.lease.release(self.response.status_code)
+
+async def _send_once(request: Request, target_url: str, method: str, stream: bool, **kwargs) -> Upstream:
+    """Gửi một lần tới replica do load balancer chọn (lỗi httpx được raise nguyên gốc)"""
+    # Mỗi attempt (retry/hedge) dùng phần deadline còn lại tại thời điểm gửi
+    timeout = deadline.timeout()
+    headers = deadline.headers(kwargs.pop("headers", None))
+    lease = load_balancer.acquire(target_url)
+    client = backend_clients.get(lease.url)
+    started, status = _upstream_started(lease), "error"
+    try:
+        upstream_request = client.build_request(method, lease.url, headers=headers, timeout=timeout, **kwargs)
+        response = await client.send(upstream_request, stream=stream, follow_redirects=True)
+        status = response.status_code
+    except asyncio.CancelledError:
+        lease.cancel()
+        status = "cancelled"
+        raise
+    except BaseException:
+        if deadline.client_expired():
+            lease.cancel()
+        else:
+            lease.release(connect_error=True)
+        raise
+    finally:
+        _upstream_finished(request, lease, started, status)
+    if not stream:
+        lease.release(response.status_code)
+    return Upstream(response, lease)
+
+async def _send_upstream(request: Request, target_url: str, method: str, retryable: bool, stream: bool = False, **kwargs) -> Upstream:
+    """Gửi request theo retry policy; lỗi transport cuối cùng được đổi thành 502/500"""
+    try:
+        return await retry_policy.execute(
+            lambda: _send_once(request, target_url, method, stream, **kwargs),
+            load_balancer.backend_for(target_url),
+            retryable
+        )
+    except HTTPException:
+        raise
+    except httpx.ConnectError:
+        raise HTTPException(status_code=502, detail="Backend service unavailable")
+    except Exception as e:
+        # Timeout vì hết deadline -> 504 Deadline exceeded
+        deadline.check()
+        raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
+
+async def _send_buffered(request: Request, target_url: str, permit: Permit, method: str, retryable: bool, **kwargs) -> httpx.Response:
+    """Gửi request tới backend và đọc toàn bộ response"""
+    upstream = await _send_upstream(request, target_url, method, retryable, **kwargs)
+    permit.release(upstream.response.status_code)
+    return upstream.response
+
+async def call_backend(request: Request, method: str, target_url: str, json_body=None, priority: str = PRIORITY_NORMAL, add_api_key: bool = False, params=None, retry_safe: bool = False) -> httpx.Response:
+    """
+    Gọi backend thay mặt user của request (không proxy response về client),
+    dùng chung load balancer, circuit breaker, retry policy và metrics với proxy_request.
+    Raise HTTPException 502/503 nếu backend không gọi được.
+    """
+    deadline.check()
+    permit = resilience.admit(target_url, priority)
+    try:
+        return await _send_buffered(
+            request, target_url, permit, method, method in IDEMPOTENT_METHODS or retry_safe,
+            params=params,
+            json=json_body,
+            headers={
+                k: v for k, v in build_upstream_headers(request, add_api_key).items()
+                if k.lower() not in CONDITIONAL_REQUEST_HEADERS
+            }
+        )
+    except BaseException as e:
+        _release_failed(permit, e)
+        raise
+
+def _release_failed(permit: Permit, error: BaseException):
+    """
+    Trả permit khi request không có response từ backend. Client huỷ request hoặc hết
+    deadline mà client tự rút ngắn (X-Deadline-Ms) không phải lỗi của backend.
+    """
+    if isinstance(error, asyncio.CancelledError) or deadline.client_expired():
+        permit.cancel()
+    else:
+        permit.release(error=True)
+
+def _has_body(request: Request) -> bool:
+    return "content-length" in request.headers or "transfer-encoding" in request.headers
+
+async def _proxy_streaming(request: Request, target_url: str, headers: dict, params, permit: Permit, retryable: bool):
+    """
+    Pass-through proxy: stream body request sang backend và relay raw bytes của response
+    (kể cả content-encoding) qua StreamingResponse, không decode/encode lại.
+    """
+    has_body = _has_body(request)
+    if "content-length" in request.headers:
+        # Giữ content-length để backend không phải nhận chunked body
+        headers["Content-Length"] = request.headers["content-length"]
+
+    upstream = await _send_upstream(
+        request, target_url, request.method, retryable and not has_body,
+        stream=True,
+        params=params,
+        content=request.stream() if has_body else None,
+        headers=headers
+    )
+    response, lease = upstream.response, upstream.lease
+    permit.mark_response()
+
+    # Body không bị biến đổi nên content-length của backend vẫn đúng
+    response_headers, cookies = build_response_headers(
+        request, response, EXCLUDED_RESPONSE_HEADERS - {"content-length"}
+    )
+
+    streaming_response = StreamingResponse(
+        _relay(response, lease, permit),
+        status_code=response.status_code,
+        headers=response_headers,
+        background=BackgroundTask(_close_upstream, response, lease, permit)
+    )
+
+    # Forward set-cookie headers
+    for cookie in cookies:
+        streaming_response.headers.append("set-cookie", cookie)
+
+    return streaming_response
+
+async def _relay(response: httpx.Response, lease: Lease, permit: Permit):
+    """Raw bytes của upstream response; lỗi giữa chừng vẫn đóng response và trả slot"""
+    try:
+        async for chunk in response.aiter_raw():
+            yield chunk
+    except asyncio.CancelledError:
+        # Client ngắt kết nối giữa chừng: không phải lỗi của backend
+        lease.cancel()
+        permit.cancel()
+        await response.aclose()
+        raise
+    except Exception as e:
+        if deadline.client_expired():
+            lease.cancel()
+        else:
+            lease.release(connect_error=True)
+        _release_failed(permit, e)
+        await response.aclose()
+        raise
+
+async def _close_upstream(response: httpx.Response, lease: Lease, permit: Permit):
+    """Đóng upstream response sau khi stream xong, trả replica và concurrency slot của backend"""
+    try:
+        await response.aclose()
+    finally:
+        lease.release(response.status_code)
+        permit.release(response.status_code)
 
 # ============================================
 # AUTH SERVICE ROUTES
@@ -145,9 +449,22 @@ async def auth_me(request: Request):
 
 @router.post("/api/auth/logout")
 async def auth_logout(request: Request):
-    """Logout endpoint"""
+    """
+    Logout endpoint (Auth Service revoke token; gateway bỏ token khỏi cache validate
+    và xoá response cache của user)
+    """
     url = f"{settings.auth_service_url}/api/auth/logout"
-    return await proxy_request(request, url)
+    token = request.cookies.get("access_token")
+    try:
+        return await proxy_request(request, url)
+    finally:
+        if token:
+            # Route public nên không có request.state.user: lấy user từ cache validate,
+            # hoặc claim user_id của token (kể cả token hết hạn / sai chữ ký) chỉ để làm key xoá cache
+            user_id = _user_id_of(token_cache.peek(token)) or token_user_id(token)
+            token_cache.invalidate(token)
+            if user_id:
+                response_cache.invalidate_user(user_id)
 
 @router.post("/api/auth/verify-token")
 async def auth_verify_token(request: Request):
@@ -198,6 +515,19 @@ async def student_search(request: Request):
     url = f"{settings.tuition_service_url}/search"
     return await proxy_request(request, url, modify_body=modify_body)
 
+@router.get("/api/students/search")
+async def student_search_get(request: Request):
+    """
+    Search student by student_code (GET /api/students/search?student_code=...)
+    Tuition service trả ETag: client gửi If-None-Match để nhận 304 khi học phí không đổi
+    """
+    student_id = request.query_params.get("student_code") or request.query_params.get("student_id")
+    if not student_id:
+        raise HTTPException(status_code=400, detail="student_code is required")
+    
+    url = f"{settings.tuition_service_url}/search?{urlencode({'student_id': student_id})}"
+    return await proxy_request(request, url, skip_query_params=True)
+
 @router.post("/api/tuitions/search")
 async def tuition_search(request: Request):
     """Search student by student_id (alias)"""
@@ -247,7 +577,7 @@ async def payment_confirm_with_id(request: Request, transaction_id: int):
     So we just proxy to /confirm
     """
     url = f"{settings.payment_service_url}/api/transactions/confirm"
-    return await proxy_request(request, url)
+    return await proxy_request(request, url, priority=PRIORITY_CRITICAL)
 
 @router.get("/api/transactions/history")
 async def payment_history(request: Request):
@@ -325,27 +655,20 @@ async def route_to_service_fallback(request: Request, path: str):
             }
         )
 
-    # Route đến service dựa trên prefix
-    for prefix, base_url in SERVICE_MAP.items():
-        if request_path.startswith(prefix):
-            # Các service có prefix trong router: giữ nguyên path
-            # - Auth service: prefix /api/auth
-            # - Customer service: prefix /api/customers
-            # - Payment service: prefix /api/transactions
-            # - OTP service: prefix /api/otp
-            services_with_prefix = ["/api/auth", "/api/customers", "/api/transactions", "/api/otp"]
-            
-            if prefix in services_with_prefix:
-                # Giữ nguyên toàn bộ path
-                url = base_url.rstrip('/') + request_path
-            else:
-                # Tuition service: strip prefix và chỉ giữ phần còn lại
-                # Ví dụ: /api/students/search -> /search
-                path_without_prefix = request_path[len(prefix):]
-                if not path_without_prefix:
-                    path_without_prefix = "/"
-                url = base_url.rstrip('/') + path_without_prefix
-            
-            return await proxy_request(request, url)
-    
-    raise HTTPException(status_code=404, detail=f"Route not found: {request_path}")
+    # Route đến service dựa trên prefix (middleware đã match sẵn route)
+    route = getattr(request.state, "route", None) or route_matcher.match(request_path)
+    if route.backend is None:
+        raise HTTPException(status_code=404, detail=f"Route not found: {request_path}")
+
+    if route.strip_prefix:
+        # Tuition service: strip prefix và chỉ giữ phần còn lại
+        # Ví dụ: /api/students/search -> /search
+        path_without_prefix = request_path[len(route.prefix):]
+        if not path_without_prefix:
+            path_without_prefix = "/"
+        url = route.backend.rstrip('/') + path_without_prefix
+    else:
+        # Các service có prefix trong router: giữ nguyên toàn bộ path
+        url = route.backend.rstrip('/') + request_path
+
+    return await proxy_request(request, url)
@@ -0,0 +1,238 @@
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from dataclasses import dataclass
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli là optional, chỉ phục vụ gzip/identity nếu chưa cài
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Chỉ nén các file text; ảnh PNG/JPG đã được nén sẵn
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Asset có fingerprint (?v=<hash>) được cache vĩnh viễn ở browser
+FINGERPRINTED_PREFIXES = ("/js/", "/css/")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# <script src="/js/x.js">, <link href="css/style.css"> trong HTML
+HTML_ASSET_REF = re.compile(r'(src|href)="(/?)((?:js|css)/[^"?#]+)"')
+# import ... from './api.js' trong JS modules
+JS_IMPORT_REF = re.compile(r"""(from\s+|import\s*\(?\s*)(['"])\./([^'"?#]+\.js)\2""")
+
+
+@dataclass
+class StaticAsset:
+    content: bytes
+    gzip: bytes | None
+    br: bytes | None
+    media_type: str
+    etag: str  # hash (không có dấu ngoặc kép)
+    fingerprint: str
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    """Kiểm tra Accept-Encoding có chấp nhận coding (bỏ qua các coding có q=0)"""
+    for part in accept_encoding.split(","):
+        name, *params = [item.strip() for item in part.split(";")]
+        if name.lower() != coding:
+            continue
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        # Chấp nhận ETag của mọi biến thể nén (cùng nội dung gốc)
+        if candidate.strip('"').split("-")[0] == etag:
+            return True
+    return False
+
+
+class StaticAssetCache:
+    """
+    Nạp toàn bộ UI tree vào memory lúc startup:
+    - precompute gzip/brotli + strong ETag cho từng file
+    - gắn fingerprint (?v=<hash>) vào các tham chiếu /js, /css trong HTML và JS imports,
+      các URL có fingerprint được trả về với Cache-Control immutable
+    - trả 304 cho conditional request (If-None-Match)
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._assets: dict[str, StaticAsset] = {}
+        self._snapshot: dict[str, tuple[float, int]] = {}
+        self._watch_task: asyncio.Task | None = None
+
+    def _scan(self) -> dict[str, tuple[float, int]]:
+        snapshot = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                stat = os.stat(full_path)
+                snapshot[full_path] = (stat.st_mtime, stat.st_size)
+        return snapshot
+
+    def _url_path(self, full_path: str) -> str:
+        return "/" + os.path.relpath(full_path, self.root).replace(os.sep, "/")
+
+    @staticmethod
+    def _hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def load(self):
+        """Đọc lại toàn bộ UI tree và dựng cache mới (thay thế cache cũ một lần)"""
+        snapshot = self._scan()
+        raw: dict[str, bytes] = {}
+        for full_path in snapshot:
+            with open(full_path, "rb") as f:
+                raw[self._url_path(full_path)] = f.read()
+
+        # Fingerprint JS phụ thuộc vào fingerprint của module nó import -> lặp tới khi ổn định
+        contents = dict(raw)
+        fingerprints = {path: self._hash(content)[:12] for path, content in raw.items()}
+        for _ in range(5):
+            changed = False
+            for path, content in raw.items():
+                if not path.endswith(".js"):
+                    continue
+                directory = path.rsplit("/", 1)[0]
+                rewritten = self._rewrite_js(content, directory, fingerprints)
+                fingerprint = self._hash(rewritten)[:12]
+                contents[path] = rewritten
+                if fingerprint != fingerprints[path]:
+                    fingerprints[path] = fingerprint
+                    changed = True
+            if not changed:
+                break
+
+        for path, content in raw.items():
+            if path.endswith(".html"):
+                contents[path] = self._rewrite_html(content, fingerprints)
+
+        assets = {}
+        for path, content in contents.items():
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            assets[path] = self._build_asset(content, media_type, fingerprints[path])
+
+        self._assets = assets
+        self._snapshot = snapshot
+        logger.info("Loaded %d static assets from %s", len(assets), self.root)
+
+    def _build_asset(self, content: bytes, media_type: str, fingerprint: str) -> StaticAsset:
+        gzip_content = br_content = None
+        if media_type.startswith(COMPRESSIBLE_TYPES):
+            gzip_content = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(gzip_content) >= len(content):
+                gzip_content = None
+            if brotli is not None:
+                br_content = brotli.compress(content, quality=11)
+                if len(br_content) >= len(content):
+                    br_content = None
+        return StaticAsset(
+            content=content,
+            gzip=gzip_content,
+            br=br_content,
+            media_type=media_type,
+            etag=self._hash(content)[:32],
+            fingerprint=fingerprint
+        )
+
+    @staticmethod
+    def _rewrite_html(content: bytes, fingerprints: dict[str, str]) -> bytes:
+        def replace(match: re.Match) -> str:
+            attr, slash, ref = match.groups()
+            fingerprint = fingerprints.get("/" + ref)
+            if fingerprint is None:
+                return match.group(0)
+            return f'{attr}="{slash}{ref}?v={fingerprint}"'
+
+        return HTML_ASSET_REF.sub(replace, content.decode("utf-8")).encode("utf-8")
+
+    @staticmethod
+    def _rewrite_js(content: bytes, directory: str, fingerprints: dict[str, str]) -> bytes:
+        def replace(match: re.Match) -> str:
+            prefix, quote, ref = match.groups()
+            fingerprint = fingerprints.get(f"{directory}/{ref}")
+            if fingerprint is None:
+                return match.group(0)
+            return f"{prefix}{quote}./{ref}?v={fingerprint}{quote}"
+
+        return JS_IMPORT_REF.sub(replace, content.decode("utf-8")).encode("utf-8")
+
+    def serve(self, request: Request, path: str) -> Response:
+        asset = self._assets.get(path)
+        if asset is None:
+            return Response(status_code=404, content="Not Found", media_type="text/plain")
+
+        if path.startswith(FINGERPRINTED_PREFIXES) and request.query_params.get("v") == asset.fingerprint:
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            cache_control = REVALIDATE_CACHE_CONTROL
+
+        accept_encoding = request.headers.get("accept-encoding", "")
+        content, encoding, etag = asset.content, None, asset.etag
+        if asset.br is not None and _accepts(accept_encoding, "br"):
+            content, encoding, etag = asset.br, "br", f"{asset.etag}-br"
+        elif asset.gzip is not None and _accepts(accept_encoding, "gzip"):
+            content, encoding, etag = asset.gzip, "gzip", f"{asset.etag}-gz"
+
+        headers = {
+            "ETag": f'"{etag}"',
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, asset.etag):
+            return Response(status_code=304, headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(content))
+            return Response(status_code=200, headers=headers, media_type=asset.media_type)
+        return Response(content=content, headers=headers, media_type=asset.media_type)
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                snapshot = await asyncio.to_thread(self._scan)
+                if snapshot != self._snapshot:
+                    await asyncio.to_thread(self.load)
+            except Exception as e:
+                logger.warning("Static asset reload failed: %s", e)
+
+    def start_watching(self, interval: float):
+        """Development: tự reload khi file trong UI tree thay đổi (polling mtime)"""
+        self._watch_task = asyncio.create_task(self._watch(interval))
+
+    async def stop_watching(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
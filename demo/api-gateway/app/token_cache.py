@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from jose import JWTError, jwt
+
+from app.config import settings
+
+
+def _unverified_claims(token: str) -> dict:
+    try:
+        claims = jwt.get_unverified_claims(token)
+    except JWTError:
+        return {}
+    return claims if isinstance(claims, dict) else {}
+
+
+def _token_exp(token: str) -> float | None:
+    """Đọc claim exp (không verify chữ ký) - chỉ dùng để giới hạn TTL của cache"""
+    exp = _unverified_claims(token).get("exp")
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+def token_user_id(token: str) -> str | None:
+    """
+    Đọc claim user_id (không verify chữ ký, kể cả token đã hết hạn / bị revoke) -
+    chỉ dùng làm key xoá cache của user, không dùng để xác thực
+    """
+    user_id = _unverified_claims(token).get("user_id")
+    return str(user_id) if isinstance(user_id, (int, str)) and user_id != "" else None
+
+
+class TokenValidationCache:
+    """
+    LRU/TTL cache kết quả validate token, key là SHA-256 của token.
+
+    - TTL của mỗi entry = min(token_cache_ttl, exp của token - now)
+    - Số entry bị giới hạn (LRU eviction)
+    - Các request đồng thời cùng token (cache miss) dùng chung một lần validate
+    - Chỉ cache kết quả hợp lệ; token invalid luôn được validate lại
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user
+
+    def _put(self, key: str, token: str, user: dict):
+        now = time.time()
+        expires_at = now + self.ttl
+        exp = _token_exp(token)
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        if expires_at <= now:
+            return
+
+        self._entries[key] = (expires_at, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_validate(self, token: str, validator: Callable[[str], Awaitable[dict]]) -> dict:
+        key = self._key(token)
+        user = self._get(key)
+        if user is not None:
+            self.hits += 1
+            return user
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(validator(token))
+            self._inflight[key] = task
+
+            def _done(t: asyncio.Task):
+                self._inflight.pop(key, None)
+                if not t.cancelled() and t.exception() is None:
+                    self._put(key, token, t.result())
+
+            task.add_done_callback(_done)
+
+        # shield: request bị huỷ (client ngắt kết nối) không huỷ lần validate dùng chung
+        return await asyncio.shield(task)
+
+    def peek(self, token: str) -> dict | None:
+        """User của token nếu đang có trong cache (không validate, không tính vào stats)"""
+        return self._get(self._key(token))
+
+    def invalidate(self, token: str):
+        self._entries.pop(self._key(token), None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+token_cache = TokenValidationCache(
+    max_entries=settings.token_cache_max_entries,
+    ttl=settings.token_cache_ttl,
+)
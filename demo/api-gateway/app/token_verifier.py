@@ -0,0 +1,231 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+from typing import Callable
+
+import httpx
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+from fastapi import HTTPException
+
+from app.config import settings
+from app.http_client import backend_clients
+from app.load_balancer import load_balancer
+from app.revocation import revocation_filter
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_CLAIMS = ("user_id", "username", "email")
+HMAC_ALGORITHMS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+# (signing input, signature) -> chữ ký có hợp lệ không
+Verifier = Callable[[bytes, bytes], bool]
+
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _hmac_verifier(digest, secret: bytes) -> Verifier:
+    def verify(data: bytes, signature: bytes) -> bool:
+        return hmac.compare_digest(hmac.new(secret, data, digest).digest(), signature)
+    return verify
+
+
+def _es256_verifier(x: bytes, y: bytes) -> Verifier:
+    public = ec.EllipticCurvePublicNumbers(
+        int.from_bytes(x, "big"), int.from_bytes(y, "big"), ec.SECP256R1()
+    ).public_key()
+
+    def verify(data: bytes, signature: bytes) -> bool:
+        if len(signature) != 64:
+            return False
+        der = encode_dss_signature(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+        try:
+            public.verify(der, data, ec.ECDSA(hashes.SHA256()))
+            return True
+        except InvalidSignature:
+            return False
+    return verify
+
+
+def _eddsa_verifier(x: bytes) -> Verifier:
+    public = ed25519.Ed25519PublicKey.from_public_bytes(x)
+
+    def verify(data: bytes, signature: bytes) -> bool:
+        try:
+            public.verify(signature, data)
+            return True
+        except InvalidSignature:
+            return False
+    return verify
+
+
+def _load_jwk(key: dict) -> Verifier | None:
+    """Key object dựng sẵn từ JWK của Auth Service ("oct", "EC" P-256, "OKP" Ed25519)"""
+    alg, kty = key.get("alg"), key.get("kty")
+    if kty == "oct" and alg in HMAC_ALGORITHMS:
+        return _hmac_verifier(HMAC_ALGORITHMS[alg], _b64url_decode(key["k"]))
+    if kty == "EC" and alg == "ES256" and key.get("crv") == "P-256":
+        return _es256_verifier(_b64url_decode(key["x"]), _b64url_decode(key["y"]))
+    if kty == "OKP" and alg == "EdDSA" and key.get("crv") == "Ed25519":
+        return _eddsa_verifier(_b64url_decode(key["x"]))
+    return None
+
+
+def _decode_segment(segment: str) -> dict:
+    value = json.loads(_b64url_decode(segment))
+    if not isinstance(value, dict):
+        raise ValueError("JWT segment is not a JSON object")
+    return value
+
+
+class LocalTokenVerifier:
+    """
+    Verify JWT ngay trong gateway bằng keys do Auth Service phân phối.
+
+    Keys được lấy từ GET /api/auth/keys lúc startup và refresh định kỳ ở background.
+    Token có "kid" chưa biết sẽ kích hoạt refresh sớm (giới hạn tần suất) để theo kịp
+    key rotation mà không phải chờ tới chu kỳ refresh tiếp theo.
+    """
+
+    def __init__(self):
+        self._keys: dict[str, tuple[str, Verifier]] = {}  # kid -> (algorithm, verifier)
+        self._active_kid: str | None = None
+        self._refresh_interval = settings.jwt_keys_refresh_interval
+        self._last_refresh = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._keys)
+
+    async def refresh(self, min_interval: float = 0) -> bool:
+        """
+        Tải lại keys từ Auth Service. Trả về False nếu không lấy được.
+        Bỏ qua nếu lần refresh gần nhất cách chưa tới min_interval giây
+        (tránh nhiều request cùng kid lạ gọi Auth Service liên tục).
+        """
+        async with self._refresh_lock:
+            if time.monotonic() - self._last_refresh < min_interval:
+                return self.ready
+            self._last_refresh = time.monotonic()
+            lease = load_balancer.acquire(f"{settings.auth_service_url}/api/auth/keys")
+            try:
+                response = await backend_clients.get(lease.url).get(
+                    lease.url,
+                    headers={"X-API-Key": settings.internal_api_key},
+                    timeout=10.0
+                )
+                lease.release(response.status_code)
+                response.raise_for_status()
+                data = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                lease.release(connect_error=True)
+                logger.warning("Không tải được JWT keys từ Auth Service: %s", e)
+                return False
+
+            keys = {}
+            for key in data.get("keys", []):
+                try:
+                    verifier = _load_jwk(key)
+                except (KeyError, ValueError) as e:
+                    logger.warning("Bỏ qua JWT key %s không hợp lệ: %s", key.get("kid"), e)
+                    continue
+                if verifier is not None:
+                    keys[key["kid"]] = (key["alg"], verifier)
+
+            if keys:
+                self._keys = keys
+                self._active_kid = data.get("active_kid")
+                self._refresh_interval = data.get("refresh_interval") or settings.jwt_keys_refresh_interval
+            return bool(keys)
+
+    async def _refresh_loop(self):
+        while True:
+            # Chưa có keys thì thử lại nhanh hơn
+            delay = self._refresh_interval if self.ready else settings.jwt_keys_min_refresh_interval
+            await asyncio.sleep(delay)
+            await self.refresh()
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _get_key(self, kid: str | None) -> tuple[str, Verifier] | None:
+        kid = kid or self._active_kid
+        entry = self._keys.get(kid)
+        if entry is None:
+            # kid lạ: có thể Auth Service vừa rotate key
+            await self.refresh(min_interval=settings.jwt_keys_min_refresh_interval)
+            entry = self._keys.get(kid or self._active_kid)
+        return entry
+
+    async def verify(self, token: str) -> dict | None:
+        """
+        Kiểm tra chữ ký, exp, các claims bắt buộc và revocation filter.
+        Trả về user info cùng format với /api/auth/verify-token, raise 401 nếu invalid,
+        None nếu token có thể đã bị revoke (caller phải hỏi lại Auth Service).
+        """
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = _decode_segment(header_segment)
+            signature = _b64url_decode(signature_segment)
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        entry = await self._get_key(header.get("kid"))
+        if entry is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        algorithm, verify = entry
+
+        # alg của token phải khớp với key (chặn "none" / nhầm thuật toán)
+        signing_input = f"{header_segment}.{payload_segment}".encode()
+        if header.get("alg") != algorithm or not verify(signing_input, signature):
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        try:
+            payload = _decode_segment(payload_segment)
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        now = time.time()
+        exp, nbf = payload.get("exp"), payload.get("nbf")
+        if not isinstance(exp, (int, float)) or exp <= now:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        if nbf is not None and (not isinstance(nbf, (int, float)) or nbf > now):
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        if any(claim not in payload for claim in REQUIRED_CLAIMS):
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        # jti có trong filter (đã logout hoặc false positive) -> Auth Service quyết định
+        jti = payload.get("jti")
+        if isinstance(jti, str) and revocation_filter.might_be_revoked(jti):
+            return None
+
+        return {
+            "id": payload["user_id"],
+            "username": payload["username"],
+            "email": payload["email"],
+            "balance": 0
+        }
+
+
+local_verifier = LocalTokenVerifier()
@@ -0,0 +1,71 @@
+"""
+Microbenchmark: chi phí match route/public path cho mỗi request.
+
+So sánh cách cũ (dựng lại các list public paths trong auth_middleware + scan SERVICE_MAP
+tuyến tính trong route_to_service_fallback) với RouteMatcher compile sẵn.
+
+Chạy từ thư mục api-gateway:
+    python benchmarks/bench_route_matching.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.route_table import route_matcher  # noqa: E402
+from app.routes import SERVICE_MAP  # noqa: E402
+
+SAMPLE_PATHS = [
+    "/api/transactions/history",
+    "/api/students/search",
+    "/api/customers/me",
+    "/api/auth/login",
+    "/api/otp/issue",
+    "/js/api.js",
+    "/payment.html",
+    "/health",
+    "/api/unknown/path",
+]
+
+
+def legacy_match(path: str):
+    """Logic cũ: auth_middleware + route_to_service_fallback"""
+    public_api_endpoints = ["/api/auth/login", "/api/auth/logout", "/api/auth/verify-token"]
+    public_html_pages = ["/", "/index.html", "/header.html", "/footer.html"]
+    protected_html_pages = ["/otp.html", "/payment.html", "/profile.html", "/transactions.html", "/success.html"]
+    system_endpoints = ["/favicon.ico", "/docs", "/openapi.json", "/health"]
+    static_prefixes = ["/css/", "/js/", "/img/", "/static/"]
+    all_public_paths = public_api_endpoints + public_html_pages + protected_html_pages + system_endpoints
+    public = path in all_public_paths or any(path.startswith(prefix) for prefix in static_prefixes)
+
+    for prefix, base_url in SERVICE_MAP.items():
+        if path.startswith(prefix):
+            services_with_prefix = ["/api/auth", "/api/customers", "/api/transactions", "/api/otp"]
+            return public, base_url, prefix not in services_with_prefix
+    return public, None, False
+
+
+def compiled_match(path: str):
+    route = route_matcher.match(path)
+    return route.public, route.backend, route.strip_prefix
+
+
+def bench(fn, number: int) -> float:
+    def run():
+        for path in SAMPLE_PATHS:
+            fn(path)
+    seconds = min(timeit.repeat(run, number=number, repeat=5))
+    return seconds / (number * len(SAMPLE_PATHS)) * 1e9
+
+
+if __name__ == "__main__":
+    for path in SAMPLE_PATHS:
+        assert legacy_match(path) == compiled_match(path), path
+
+    number = int(os.getenv("BENCH_ITERATIONS", "20000"))
+    legacy_ns = bench(legacy_match, number)
+    compiled_ns = bench(compiled_match, number)
+    print(f"legacy   : {legacy_ns:8.1f} ns/request")
+    print(f"compiled : {compiled_ns:8.1f} ns/request")
+    print(f"speedup  : {legacy_ns / compiled_ns:8.2f}x")
@@ -0,0 +1,100 @@
+"""
+Regression: X-Deadline-Ms rất nhỏ của client không được làm mở circuit breaker,
+giảm concurrency limit hay giữ lease của replica (client ẩn danh không thể
+đánh sập backend chỉ bằng header deadline).
+
+Chạy từ thư mục api-gateway:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings  # noqa: E402
+from app.http_client import backend_clients, url_origin  # noqa: E402
+from app.load_balancer import load_balancer  # noqa: E402
+from app.main import app  # noqa: E402
+from app.resilience import resilience  # noqa: E402
+
+ATTEMPTS = settings.cb_failure_threshold * 2
+
+
+def _use_backend(monkeypatch, url: str, handler):
+    # setitem: client giả được gỡ khỏi singleton backend_clients sau mỗi test
+    monkeypatch.setitem(
+        backend_clients._clients, url_origin(url), httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+
+def _assert_untouched(backend: str, limit_before: float):
+    snapshot = resilience.guards[backend].snapshot()
+    assert snapshot["circuit_breaker"]["state"] == "closed"
+    assert snapshot["circuit_breaker"]["consecutive_failures"] == 0
+    assert snapshot["concurrency"]["inflight"] == 0
+    assert snapshot["concurrency"]["limit"] == limit_before
+    for replica in load_balancer.pools[backend].replicas:
+        assert replica.outstanding == 0
+        assert replica.consecutive_failures == 0
+
+
+async def _send(method: str, path: str, deadline_ms: str, **kwargs) -> list[int]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        return [
+            (await client.request(method, path, headers={"X-Deadline-Ms": deadline_ms}, **kwargs)).status_code
+            for _ in range(ATTEMPTS)
+        ]
+
+
+def test_expired_client_deadline_does_not_open_breaker(monkeypatch):
+    def backend(request):
+        return httpx.Response(200, json={"ok": True})
+
+    _use_backend(monkeypatch, settings.auth_service_url, backend)
+    limit_before = resilience.guards["auth-service"].limiter.limit
+
+    statuses = asyncio.run(_send("POST", "/api/auth/login", "0.0001", json={"username": "u", "password": "p"}))
+
+    assert statuses == [504] * ATTEMPTS
+    _assert_untouched("auth-service", limit_before)
+
+
+def test_backend_timeout_under_client_deadline_is_not_a_failure(monkeypatch):
+    async def slow_backend(request):
+        # MockTransport không tự áp timeout: backend treo tới khi hết read timeout của request
+        await asyncio.sleep(request.extensions["timeout"]["read"])
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    _use_backend(monkeypatch, settings.auth_service_url, slow_backend)
+    limit_before = resilience.guards["auth-service"].limiter.limit
+
+    statuses = asyncio.run(_send("POST", "/api/auth/login", "20", json={"username": "u", "password": "p"}))
+
+    assert statuses == [504] * ATTEMPTS
+    _assert_untouched("auth-service", limit_before)
+
+
+def test_remote_token_validation_releases_lease_on_expired_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "token_verification_mode", "remote")
+    monkeypatch.setattr(settings, "token_cache_enabled", False)
+
+    def backend(request):
+        return httpx.Response(200, json={"valid": True, "user": {"id": 1}})
+
+    _use_backend(monkeypatch, settings.auth_service_url, backend)
+    limit_before = resilience.guards["auth-service"].limiter.limit
+
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway", cookies={"access_token": "t"}) as client:
+            return [
+                (await client.get("/api/customers/me", headers={"X-Deadline-Ms": "0.0001"})).status_code
+                for _ in range(ATTEMPTS)
+            ]
+
+    assert asyncio.run(send()) == [504] * ATTEMPTS
+    _assert_untouched("auth-service", limit_before)
@@ -1,7 +1,19 @@
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from jose import JWTError, jwt
+import json
+import secrets
+import time
+from typing import Optional, Dict, Any, List
 from .config import settings
+from .keys import SigningKey, b64url_encode, b64url_decode, decode_segment, load_signing_keys, select_active_key
+from .revocation import revocation_store
+
+# Keys được nạp một lần lúc startup (secret bytes / key object của cryptography)
+SIGNING_KEYS: Dict[str, SigningKey] = load_signing_keys()
+ACTIVE_KEY = select_active_key(SIGNING_KEYS)
+ACTIVE_KID = ACTIVE_KEY.kid
+ACCESS_TOKEN_EXPIRE_SECONDS = settings.ACCESS_TOKEN_EXPIRE_HOURS * 3600
+
+# Header đã encode của các token do service này ký -> key, để verify không phải parse JSON header
+_KEYS_BY_HEADER: Dict[str, SigningKey] = {key.header_segment: key for key in SIGNING_KEYS.values()}
 
 def create_access_token(data: Dict[str, Any]) -> str:
     """
@@ -11,18 +23,32 @@ def create_access_token(data: Dict[str, Any]) -> str:
         data: Dictionary chứa user info (user_id, username, email)
     
     Returns:
-        JWT token string
+        JWT token string (header có "kid" của key đang active, payload có "jti" để revoke)
     """
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(hours=settings.ACCESS_TOKEN_EXPIRE_HOURS)
-    to_encode.update({"exp": expire})
-    
-    encoded_jwt = jwt.encode(
-        to_encode, 
-        settings.JWT_SECRET_KEY, 
-        algorithm=settings.JWT_ALGORITHM
-    )
-    return encoded_jwt
+    to_encode["exp"] = int(time.time()) + ACCESS_TOKEN_EXPIRE_SECONDS
+    to_encode["jti"] = secrets.token_urlsafe(12)
+
+    payload_segment = b64url_encode(json.dumps(to_encode, separators=(",", ":")).encode())
+    signing_input = f"{ACTIVE_KEY.header_segment}.{payload_segment}"
+    signature = ACTIVE_KEY.sign(signing_input.encode())
+    return f"{signing_input}.{b64url_encode(signature)}"
+
+def _resolve_key(header_segment: str) -> Optional[SigningKey]:
+    """Key để verify token theo header; header lạ (token cũ, thứ tự field khác) mới phải parse"""
+    key = _KEYS_BY_HEADER.get(header_segment)
+    if key is not None:
+        return key
+
+    header = decode_segment(header_segment)
+    if header is None:
+        return None
+    # Token cũ (trước khi có key rotation) không có kid -> dùng key active
+    key = SIGNING_KEYS.get(header.get("kid") or ACTIVE_KID)
+    # alg phải khớp với key (chặn "none" / nhầm thuật toán)
+    if key is None or header.get("alg") != key.algorithm:
+        return None
+    return key
 
 def verify_token(token: str) -> Optional[Dict[str, Any]]:
     """
@@ -35,11 +61,51 @@ def verify_token(token: str) -> Optional[Dict[str, Any]]:
         Decoded payload nếu valid, None nếu invalid
     """
     try:
-        payload = jwt.decode(
-            token, 
-            settings.JWT_SECRET_KEY, 
-            algorithms=[settings.JWT_ALGORITHM]
-        )
+        header_segment, payload_segment, signature_segment = token.split(".")
+        key = _resolve_key(header_segment)
+        if key is None:
+            return None
+
+        signing_input = token[:len(header_segment) + len(payload_segment) + 1].encode()
+        if not key.verify(signing_input, b64url_decode(signature_segment)):
+            return None
+
+        payload = decode_segment(payload_segment)
+        if payload is None:
+            return None
+
+        now = time.time()
+        exp = payload.get("exp")
+        if not isinstance(exp, (int, float)) or exp <= now:
+            return None
+        nbf = payload.get("nbf")
+        if nbf is not None and (not isinstance(nbf, (int, float)) or nbf > now):
+            return None
         return payload
-    except JWTError:
+    except (ValueError, TypeError):
         return None
+
+def is_revoked(payload: Dict[str, Any]) -> bool:
+    """Token đã bị revoke (logout)? Token cũ không có jti thì không revoke được"""
+    jti = payload.get("jti")
+    return isinstance(jti, str) and revocation_store.is_revoked(jti)
+
+def revoke_token(token: str) -> bool:
+    """
+    Revoke token (khi logout) tới hết exp của nó
+    
+    Returns:
+        True nếu token hợp lệ và đã được đưa vào revocation list
+    """
+    payload = verify_token(token)
+    if payload is None or not isinstance(payload.get("jti"), str):
+        return False
+    revocation_store.revoke(payload["jti"], payload["exp"])
+    return True
+
+def get_verification_keys() -> List[Dict[str, str]]:
+    """
+    Danh sách keys (JWK) để API Gateway và các service khác verify token tại chỗ:
+    "oct" cho HMAC keys, "EC"/"OKP" (chỉ public key) cho ES256/EdDSA
+    """
+    return [key.jwk for key in SIGNING_KEYS.values()]
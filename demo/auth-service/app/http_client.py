@@ -0,0 +1,29 @@
+from typing import Optional
+
+import httpx
+
+from .config import settings
+
+# Connection pool dùng chung tới Customer Service (keep-alive), thay vì mở client mới mỗi lần login
+_customer_client: Optional[httpx.AsyncClient] = None
+
+
+def customer_client() -> httpx.AsyncClient:
+    global _customer_client
+    if _customer_client is None:
+        _customer_client = httpx.AsyncClient(
+            base_url=settings.CUSTOMER_SERVICE_URL,
+            timeout=10.0,
+            limits=httpx.Limits(
+                max_connections=settings.CUSTOMER_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CUSTOMER_MAX_KEEPALIVE_CONNECTIONS
+            )
+        )
+    return _customer_client
+
+
+async def close_clients():
+    global _customer_client
+    if _customer_client is not None:
+        await _customer_client.aclose()
+        _customer_client = None
@@ -0,0 +1,159 @@
+import base64
+import hashlib
+import hmac
+import json
+from typing import Any, Callable, Dict, Optional
+
+from .config import settings
+
+HMAC_ALGORITHMS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+ASYMMETRIC_ALGORITHMS = ("ES256", "EdDSA")
+
+
+def b64url_encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SigningKey:
+    """
+    Key đã nạp sẵn (secret/key object của cryptography) cùng các phần không đổi của token:
+    header đã encode (alg, typ, kid) và JWK public để phân phối cho các service khác
+    """
+
+    def __init__(
+        self,
+        kid: str,
+        algorithm: str,
+        sign: Callable[[bytes], bytes],
+        verify: Callable[[bytes, bytes], bool],
+        jwk: Dict[str, str]
+    ):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.sign = sign
+        self.verify = verify
+        self.jwk = {"kid": kid, "alg": algorithm, **jwk}
+        self.header_segment = b64url_encode(
+            json.dumps({"alg": algorithm, "typ": "JWT", "kid": kid}, separators=(",", ":")).encode()
+        )
+
+
+def hmac_key(kid: str, algorithm: str, secret: str) -> SigningKey:
+    digest = HMAC_ALGORITHMS[algorithm]
+    secret_bytes = secret.encode()
+
+    def sign(data: bytes) -> bytes:
+        return hmac.new(secret_bytes, data, digest).digest()
+
+    def verify(data: bytes, signature: bytes) -> bool:
+        return hmac.compare_digest(sign(data), signature)
+
+    return SigningKey(kid, algorithm, sign, verify, {"kty": "oct", "k": b64url_encode(secret_bytes)})
+
+
+def private_key(kid: str, path: str) -> SigningKey:
+    """
+    Nạp private key PEM (EC P-256 -> ES256, Ed25519 -> EdDSA).
+    cryptography chỉ được import khi có cấu hình key bất đối xứng.
+    """
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+    from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+
+    with open(path, "rb") as f:
+        key = serialization.load_pem_private_key(f.read(), password=None)
+    public = key.public_key()
+
+    if isinstance(key, ec.EllipticCurvePrivateKey) and isinstance(key.curve, ec.SECP256R1):
+        def sign(data: bytes) -> bytes:
+            # JWS dùng chữ ký dạng r || s (32 bytes mỗi phần) thay vì DER
+            r, s = decode_dss_signature(key.sign(data, ec.ECDSA(hashes.SHA256())))
+            return r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+        def verify(data: bytes, signature: bytes) -> bool:
+            if len(signature) != 64:
+                return False
+            der = encode_dss_signature(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+            try:
+                public.verify(der, data, ec.ECDSA(hashes.SHA256()))
+                return True
+            except InvalidSignature:
+                return False
+
+        numbers = public.public_numbers()
+        jwk = {
+            "kty": "EC",
+            "crv": "P-256",
+            "x": b64url_encode(numbers.x.to_bytes(32, "big")),
+            "y": b64url_encode(numbers.y.to_bytes(32, "big")),
+        }
+        return SigningKey(kid, "ES256", sign, verify, jwk)
+
+    if isinstance(key, ed25519.Ed25519PrivateKey):
+        def verify(data: bytes, signature: bytes) -> bool:
+            try:
+                public.verify(signature, data)
+                return True
+            except InvalidSignature:
+                return False
+
+        raw = public.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        return SigningKey(kid, "EdDSA", key.sign, verify, {"kty": "OKP", "crv": "Ed25519", "x": b64url_encode(raw)})
+
+    raise ValueError(f"Unsupported private key type for kid {kid}: only EC P-256 and Ed25519 are supported")
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    """Parse "kid1:value1,kid2:value2" """
+    pairs: Dict[str, str] = {}
+    for item in value.split(","):
+        if ":" not in item:
+            continue
+        kid, secret = item.split(":", 1)
+        if kid.strip() and secret.strip():
+            pairs[kid.strip()] = secret.strip()
+    return pairs
+
+
+def load_signing_keys() -> Dict[str, SigningKey]:
+    """
+    Nạp toàn bộ keys một lần lúc startup:
+    - HMAC keys từ JWT_KEYS ("kid:secret,..."); nếu không cấu hình và JWT_ALGORITHM là HMAC
+      thì dùng JWT_SECRET_KEY với kid suy ra từ hash của secret
+    - Private keys (ES256/EdDSA) từ JWT_PRIVATE_KEYS ("kid:/path/to/key.pem,...")
+    HMAC keys cũ có thể giữ lại để verify token cũ trong lúc chuyển sang ES256/EdDSA.
+    """
+    hmac_algorithm = settings.JWT_ALGORITHM if settings.JWT_ALGORITHM in HMAC_ALGORITHMS else "HS256"
+    keys: Dict[str, SigningKey] = {
+        kid: hmac_key(kid, hmac_algorithm, secret)
+        for kid, secret in _parse_pairs(settings.JWT_KEYS).items()
+    }
+    if not keys and settings.JWT_ALGORITHM in HMAC_ALGORITHMS:
+        kid = "k-" + hashlib.sha256(settings.JWT_SECRET_KEY.encode()).hexdigest()[:8]
+        keys[kid] = hmac_key(kid, settings.JWT_ALGORITHM, settings.JWT_SECRET_KEY)
+
+    for kid, path in _parse_pairs(settings.JWT_PRIVATE_KEYS).items():
+        keys[kid] = private_key(kid, path)
+
+    if not any(key.algorithm == settings.JWT_ALGORITHM for key in keys.values()):
+        raise RuntimeError(f"No signing key configured for JWT_ALGORITHM={settings.JWT_ALGORITHM}")
+    return keys
+
+
+def select_active_key(keys: Dict[str, SigningKey]) -> SigningKey:
+    """Key ký token mới: JWT_ACTIVE_KID nếu hợp lệ, nếu không thì key đầu tiên của JWT_ALGORITHM"""
+    key = keys.get(settings.JWT_ACTIVE_KID)
+    if key is not None and key.algorithm == settings.JWT_ALGORITHM:
+        return key
+    return next(key for key in keys.values() if key.algorithm == settings.JWT_ALGORITHM)
+
+
+def decode_segment(segment: str) -> Optional[Dict[str, Any]]:
+    """Decode một phần (header/payload) của JWT thành dict, None nếu không hợp lệ"""
+    value = json.loads(b64url_decode(segment))
+    return value if isinstance(value, dict) else None
@@ -0,0 +1,187 @@
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional
+
+from .config import settings
+
+
+class NegativeCache:
+    """
+    Username không tồn tại (theo Customer Service), giữ ttl giây, tối đa max_entries (LRU).
+    Login với username đã biết là không tồn tại không gọi Customer Service / MySQL; lỗi được
+    trả sau khoảng thời gian bằng latency trung bình của một lần verify thật (LoginGuard.verify_latency)
+    để thời gian phản hồi không tiết lộ username nào tồn tại.
+    TTL ngắn để username mới tạo hoặc vừa đổi tên sớm đăng nhập được.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self.hits = 0
+
+    def __contains__(self, username: str) -> bool:
+        expires_at = self._entries.get(username)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._entries[username]
+            return False
+        self.hits += 1
+        return True
+
+    def add(self, username: str):
+        self._entries[username] = time.monotonic() + self.ttl
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, username: str):
+        self._entries.pop(username, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SlidingWindowThrottle:
+    """
+    Sliding window log: mỗi key giữ timestamps của các lần login thất bại trong window giây.
+    Key có từ limit lần trở lên trong window bị chặn tới khi lần cũ nhất ra khỏi window.
+    Số key được theo dõi bị giới hạn (LRU) để burst nhiều IP/username không làm tràn memory.
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._failures: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self.throttled = 0
+
+    def _recent(self, key: str, now: float) -> Optional[Deque[float]]:
+        failures = self._failures.get(key)
+        if failures is None:
+            return None
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if not failures:
+            del self._failures[key]
+            return None
+        return failures
+
+    def retry_after(self, key: str) -> Optional[float]:
+        """Số giây phải chờ nếu key đang bị chặn, None nếu được phép thử"""
+        now = time.monotonic()
+        failures = self._recent(key, now)
+        if failures is None or len(failures) < self.limit:
+            return None
+        self.throttled += 1
+        return failures[-self.limit] + self.window - now
+
+    def record_failure(self, key: str):
+        now = time.monotonic()
+        failures = self._recent(key, now)
+        if failures is None:
+            failures = self._failures[key] = deque(maxlen=self.limit)
+        failures.append(now)
+        self._failures.move_to_end(key)
+        while len(self._failures) > self.max_keys:
+            self._failures.popitem(last=False)
+
+    def reset(self, key: str):
+        self._failures.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._failures)
+
+
+class LoginGuard:
+    """
+    Chặn login trước khi gọi Customer Service:
+    - throttle theo IP và theo username (sliding window các lần thất bại)
+    - negative cache cho username không tồn tại
+    Chỉ các lần thử "hợp lý" mới đi tới đường tốn kém (HTTP + MySQL).
+    """
+
+    def __init__(self):
+        self.unknown_users = NegativeCache(settings.LOGIN_NEGATIVE_CACHE_SIZE, settings.LOGIN_NEGATIVE_CACHE_TTL)
+        self.by_ip = SlidingWindowThrottle(
+            settings.LOGIN_IP_MAX_FAILURES, settings.LOGIN_THROTTLE_WINDOW, settings.LOGIN_THROTTLE_MAX_KEYS
+        )
+        self.by_username = SlidingWindowThrottle(
+            settings.LOGIN_USERNAME_MAX_FAILURES, settings.LOGIN_THROTTLE_WINDOW, settings.LOGIN_THROTTLE_MAX_KEYS
+        )
+        self.attempts = 0
+        self.upstream_calls = 0
+        self.successes = 0
+        # EWMA (giây) latency của các lần verify qua Customer Service (argon2id)
+        self.verify_latency = 0.0
+
+    @staticmethod
+    def normalize(username: str) -> str:
+        # Username so sánh không phân biệt hoa thường (collation mặc định của MySQL)
+        return username.strip().lower()
+
+    def retry_after(self, username: str, ip: Optional[str]) -> Optional[float]:
+        """Số giây phải chờ nếu IP hoặc username đang bị throttle"""
+        self.attempts += 1
+        waits = [self.by_username.retry_after(username)]
+        if ip:
+            waits.append(self.by_ip.retry_after(ip))
+        waits = [wait for wait in waits if wait is not None]
+        return max(waits) if waits else None
+
+    def observe_verify(self, seconds: float):
+        """Latency của một lần Customer Service verify credentials (username có hay không)"""
+        if self.verify_latency == 0.0:
+            self.verify_latency = seconds
+        else:
+            self.verify_latency += 0.1 * (seconds - self.verify_latency)
+
+    def record_failure(self, username: str, ip: Optional[str], unknown_user: bool = False):
+        self.by_username.record_failure(username)
+        if ip:
+            self.by_ip.record_failure(ip)
+        if unknown_user:
+            self.unknown_users.add(username)
+
+    def record_success(self, username: str):
+        self.successes += 1
+        self.by_username.reset(username)
+        self.unknown_users.discard(username)
+
+    def stats(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "upstream_calls": self.upstream_calls,
+            "negative_cache": {
+                "size": len(self.unknown_users),
+                "hits": self.unknown_users.hits,
+                "ttl_seconds": self.unknown_users.ttl,
+                "delay_ms": round(self.verify_latency * 1000, 1),
+            },
+            "throttle": {
+                "window_seconds": self.by_ip.window,
+                "ip_limit": self.by_ip.limit,
+                "username_limit": self.by_username.limit,
+                "tracked_ips": len(self.by_ip),
+                "tracked_usernames": len(self.by_username),
+                "throttled_ip": self.by_ip.throttled,
+                "throttled_username": self.by_username.throttled,
+            },
+        }
+
+
+def client_ip(forwarded_for: Optional[str], peer: Optional[str]) -> Optional[str]:
+    """
+    IP của client: entry cuối của X-Forwarded-For do API Gateway thêm vào
+    (các entry trước đó do client tự gửi nên không tin được), nếu không có thì IP kết nối
+    """
+    if forwarded_for:
+        entries = [entry.strip() for entry in forwarded_for.split(",") if entry.strip()]
+        if entries:
+            return entries[-1]
+    return peer
+
+
+login_guard = LoginGuard()
@@ -1,12 +1,22 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import router
+from .deadline import DeadlineMiddleware
 from .config import settings
+from .http_client import close_clients
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Đóng connection pool tới Customer Service
+    await close_clients()
 
 app = FastAPI(
     title=settings.SERVICE_NAME,
     description="Stateless JWT Authentication Service - No Database",
-    version="2.0"
+    version="2.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -18,6 +28,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Deadline propagation: X-Deadline-Ms do API Gateway đặt
+app.add_middleware(DeadlineMiddleware)
+
 # Include routes
 app.include_router(router)
 
@@ -31,7 +44,11 @@ async def root():
         "endpoints": [
             "POST /api/auth/login",
             "POST /api/auth/logout",
-            "POST /api/auth/verify-token (INTERNAL)"
+            "POST /api/auth/verify-token (INTERNAL)",
+            "POST /api/auth/verify-tokens (INTERNAL)",
+            "GET /api/auth/keys (INTERNAL)",
+            "GET /api/auth/revocations (INTERNAL)",
+            "GET /api/auth/login-stats (INTERNAL)"
         ]
     }
 
@@ -0,0 +1,132 @@
+import base64
+import hashlib
+import math
+import secrets
+import time
+from typing import Dict, Iterable, Optional
+
+from .config import settings
+
+
+class BloomFilter:
+    """
+    Bloom filter (bit array + k vị trí theo double hashing trên SHA-256).
+    Không có false negative: "không có trong filter" chắc chắn là chưa bị revoke.
+    API Gateway dùng cùng cách hash để kiểm tra snapshot của filter.
+    """
+
+    def __init__(self, bits: int, hashes: int, data: Optional[bytes] = None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data is not None else bytearray((bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, items: int, false_positive_rate: float) -> "BloomFilter":
+        """Kích thước tối ưu: m = -n ln p / (ln 2)^2, k = m / n * ln 2"""
+        items = max(1, items)
+        bits = max(64, int(-items * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        hashes = max(1, round(bits / items * math.log(2)))
+        return cls(bits, hashes)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.sha256(key.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.data[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationStore:
+    """
+    Danh sách token đã bị revoke (theo jti), tự hết hạn tại exp của token.
+
+    Đứng trước là một Bloom filter: phần lớn token chưa bị revoke nên verify chỉ tốn
+    vài lần probe bit, không phải tra dict. Entry hết hạn được dọn định kỳ và filter được
+    dựng lại (Bloom filter không xoá được phần tử), kích thước theo số entry còn lại.
+    Mỗi lần filter thay đổi thì version tăng để API Gateway biết khi nào cần tải lại snapshot.
+    """
+
+    def __init__(self, expected_items: int, false_positive_rate: float, purge_interval: float):
+        self.expected_items = expected_items
+        self.false_positive_rate = false_positive_rate
+        self.purge_interval = purge_interval
+        self._entries: Dict[str, float] = {}  # jti -> exp
+        # Số entry filter hiện tại được dựng cho (false positive rate chỉ đúng tới mức này)
+        self._capacity = expected_items
+        self._filter = BloomFilter.for_capacity(expected_items, false_positive_rate)
+        self._next_purge = time.time() + purge_interval
+        # instance + version làm ETag: version bắt đầu lại từ 0 khi service restart
+        self.instance = secrets.token_hex(4)
+        self.version = 0
+        self.filter_hits = 0
+        self.false_positives = 0
+
+    def revoke(self, jti: str, exp: float):
+        self.purge_expired()
+        if exp <= time.time() or jti in self._entries:
+            return
+        self._entries[jti] = exp
+        if len(self._entries) > self._capacity:
+            # Filter đã đầy -> false positive tăng, dựng lại filter gấp đôi số entry
+            self._rebuild()
+        else:
+            self._filter.add(jti)
+            self.version += 1
+
+    def is_revoked(self, jti: str) -> bool:
+        if jti not in self._filter:
+            return False
+        self.filter_hits += 1
+        exp = self._entries.get(jti)
+        if exp is None:
+            self.false_positives += 1
+            return False
+        return exp > time.time()
+
+    def purge_expired(self):
+        """Dọn entry đã hết hạn (tối đa mỗi purge_interval giây một lần) và dựng lại filter"""
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_interval
+        expired = [jti for jti, exp in self._entries.items() if exp <= now]
+        if expired:
+            for jti in expired:
+                del self._entries[jti]
+            self._rebuild()
+
+    def _rebuild(self):
+        capacity = max(self.expected_items, 2 * len(self._entries))
+        bloom = BloomFilter.for_capacity(capacity, self.false_positive_rate)
+        for jti in self._entries:
+            bloom.add(jti)
+        self._filter = bloom
+        self._capacity = capacity
+        self.version += 1
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.instance}-{self.version}"'
+
+    def snapshot(self) -> dict:
+        """Snapshot của filter để API Gateway kiểm tra revocation khi verify token tại chỗ"""
+        return {
+            "version": self.version,
+            "bits": self._filter.bits,
+            "hashes": self._filter.hashes,
+            "filter": base64.b64encode(bytes(self._filter.data)).decode(),
+            "count": len(self._entries),
+        }
+
+
+revocation_store = RevocationStore(
+    expected_items=settings.REVOCATION_EXPECTED_ITEMS,
+    false_positive_rate=settings.REVOCATION_FALSE_POSITIVE_RATE,
+    purge_interval=settings.REVOCATION_PURGE_INTERVAL
+)
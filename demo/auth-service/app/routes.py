@@ -1,102 +1,160 @@
-from fastapi import APIRouter, HTTPException, Response, Header
+import asyncio
+import math
+import time
+from fastapi import APIRouter, HTTPException, Request, Response, Header
 from fastapi.responses import JSONResponse
 import httpx
 from .schemas import (
     LoginRequest, LoginResponse, LogoutResponse,
-    VerifyTokenRequest, VerifyTokenResponse, UserInfo
+    VerifyTokenRequest, VerifyTokenResponse, UserInfo,
+    VerifyTokensRequest, VerifyTokensResponse,
+    KeysResponse, VerificationKey, RevocationSnapshotResponse
 )
-from .auth import create_access_token, verify_token
+from .auth import create_access_token, verify_token, is_revoked, revoke_token, get_verification_keys, ACTIVE_KID
+from .revocation import revocation_store
+from .login_guard import login_guard, client_ip
+from .http_client import customer_client
 from .config import settings
+from . import deadline
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
 @router.post("/login", response_model=LoginResponse)
-async def login(request: LoginRequest, response: Response):
+async def login(request: LoginRequest, response: Response, http_request: Request):
     """
     Đăng nhập vào hệ thống
     
     Flow:
     1. Nhận username/password từ request
-    2. Gọi Customer Service POST /search để verify credentials
-    3. Nếu valid: Generate JWT, set cookie, return user info
-    4. Nếu invalid: Return 401 Unauthorized
+    2. Chặn sớm (không gọi Customer Service): IP/username đang bị throttle -> 429,
+       username đã biết là không tồn tại (negative cache) -> 401
+    3. Gọi Customer Service POST /search để verify credentials
+    4. Nếu valid: Generate JWT, set cookie, return user info
+    5. Nếu invalid: ghi nhận lần thất bại, return 401 Unauthorized
     """
-    # Gọi Customer Service để verify credentials
-    async with httpx.AsyncClient() as client:
-        try:
-            customer_response = await client.post(
-                f"{settings.CUSTOMER_SERVICE_URL}/api/customers/search",
-                json={
-                    "username": request.username,
-                    "password": request.password
-                },
-                headers={
-                    "X-API-Key": settings.INTERNAL_API_KEY
-                },
-                timeout=10.0
-            )
-            
-            if customer_response.status_code != 200:
-                raise HTTPException(
-                    status_code=401,
-                    detail="Invalid username or password"
-                )
-            
-            customer_data = customer_response.json()
-            
-            if not customer_data.get("success"):
-                raise HTTPException(
-                    status_code=401,
-                    detail=customer_data.get("error", "Invalid credentials")
-                )
-            
-            user_data = customer_data.get("user")
-            
-            # Generate JWT token
-            token_data = {
-                "user_id": user_data["id"],
-                "username": user_data["username"],
-                "email": user_data["email"]
-            }
-            access_token = create_access_token(token_data)
-            
-            # Set JWT token in HttpOnly cookie
-            response.set_cookie(
-                key=settings.COOKIE_NAME,
-                value=access_token,
-                httponly=settings.COOKIE_HTTPONLY,
-                secure=settings.COOKIE_SECURE,
-                samesite=settings.COOKIE_SAMESITE,
-                max_age=settings.COOKIE_MAX_AGE,
-                path="/"
-            )
-            
-            # Return user info (NOT token - already in cookie)
-            return LoginResponse(
-                user=UserInfo(
-                    id=user_data["id"],
-                    username=user_data["username"],
-                    email=user_data["email"],
-                    balance=user_data["balance"]
-                )
-            )
-            
-        except httpx.RequestError as e:
-            raise HTTPException(
-                status_code=503,
-                detail=f"Customer Service unavailable: {str(e)}"
-            )
+    username = login_guard.normalize(request.username)
+    ip = client_ip(
+        http_request.headers.get("x-forwarded-for"),
+        http_request.client.host if http_request.client else None
+    )
+    
+    retry_after = login_guard.retry_after(username, ip)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts, please try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+    
+    if username in login_guard.unknown_users:
+        login_guard.record_failure(username, ip)
+        # Chờ bằng thời gian một lần verify thật: không gọi Customer Service nhưng
+        # thời gian phản hồi vẫn như username có thật (không dò được username)
+        await asyncio.sleep(login_guard.verify_latency)
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid username or password"
+        )
+    
+    # Gọi Customer Service để verify credentials (connection pool dùng chung)
+    try:
+        login_guard.upstream_calls += 1
+        started = time.perf_counter()
+        customer_response = await customer_client().post(
+            "/api/customers/search",
+            json={
+                "username": request.username,
+                "password": request.password
+            },
+            headers=deadline.headers({
+                "X-API-Key": settings.INTERNAL_API_KEY
+            }),
+            timeout=deadline.timeout(10.0)
+        )
+    except httpx.RequestError as e:
+        # Timeout do hết deadline -> 504 Deadline exceeded
+        deadline.check()
+        raise HTTPException(
+            status_code=503,
+            detail=f"Customer Service unavailable: {str(e)}"
+        )
+    
+    if customer_response.status_code >= 500:
+        # Customer Service quá tải (hàng đợi hash password đầy) / lỗi: không phải sai mật khẩu,
+        # không ghi nhận là lần thử thất bại
+        raise HTTPException(
+            status_code=503,
+            detail="Login is temporarily unavailable, please retry",
+            headers={"Retry-After": customer_response.headers.get("retry-after", "1")}
+        )
+    
+    if customer_response.status_code == 200:
+        login_guard.observe_verify(time.perf_counter() - started)
+    else:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid username or password"
+        )
+    
+    customer_data = customer_response.json()
+    
+    if not customer_data.get("success"):
+        login_guard.record_failure(
+            username, ip,
+            unknown_user=customer_data.get("error_code") == "unknown_user"
+        )
+        raise HTTPException(
+            status_code=401,
+            detail=customer_data.get("error", "Invalid credentials")
+        )
+    
+    login_guard.record_success(username)
+    user_data = customer_data.get("user")
+    
+    # Generate JWT token
+    token_data = {
+        "user_id": user_data["id"],
+        "username": user_data["username"],
+        "email": user_data["email"]
+    }
+    access_token = create_access_token(token_data)
+    
+    # Set JWT token in HttpOnly cookie
+    response.set_cookie(
+        key=settings.COOKIE_NAME,
+        value=access_token,
+        httponly=settings.COOKIE_HTTPONLY,
+        secure=settings.COOKIE_SECURE,
+        samesite=settings.COOKIE_SAMESITE,
+        max_age=settings.COOKIE_MAX_AGE,
+        path="/"
+    )
+    
+    # Return user info (NOT token - already in cookie)
+    return LoginResponse(
+        user=UserInfo(
+            id=user_data["id"],
+            username=user_data["username"],
+            email=user_data["email"],
+            balance=user_data["balance"]
+        )
+    )
 
 @router.post("/logout", response_model=LogoutResponse)
-async def logout(response: Response, access_token: str = Header(None, alias="Cookie")):
+async def logout(request: Request, response: Response, access_token: str = Header(None, alias="Cookie")):
     """
     Đăng xuất khỏi hệ thống
     
     Flow:
     1. Nhận JWT token từ cookie header
-    2. Xóa cookie bằng cách set Max-Age=0
-    3. Return success message
+    2. Revoke token (theo jti) tới khi hết hạn
+    3. Xóa cookie bằng cách set Max-Age=0
+    4. Return success message
     """
+    token = request.cookies.get(settings.COOKIE_NAME)
+    if token:
+        revoke_token(token)
+    
     # Xóa cookie
     response.set_cookie(
         key=settings.COOKIE_NAME,
@@ -134,8 +192,39 @@ async def verify_jwt_token(
             error="Unauthorized: Invalid API Key"
         )
     
-    # Verify JWT token
-    payload = verify_token(request.token)
+    return _verification_result(request.token)
+
+@router.post("/verify-tokens", response_model=VerifyTokensResponse)
+async def verify_jwt_tokens(
+    request: VerifyTokensRequest,
+    x_api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Verify nhiều JWT token trong một request (INTERNAL ONLY)
+    
+    Dùng khi cần validate nhiều token cùng lúc (gateway warm cache sau khi restart,
+    audit job...). Mỗi token được verify như /verify-token, kết quả trả về cùng thứ tự.
+    Tối đa VERIFY_TOKENS_MAX_BATCH token mỗi request (mặc định 100), vượt quá trả 413.
+    """
+    if x_api_key != settings.INTERNAL_API_KEY:
+        raise HTTPException(
+            status_code=401,
+            detail="Unauthorized: Invalid API Key"
+        )
+    
+    if len(request.tokens) > settings.VERIFY_TOKENS_MAX_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many tokens: maximum {settings.VERIFY_TOKENS_MAX_BATCH} per request"
+        )
+    
+    return VerifyTokensResponse(
+        results=[_verification_result(token) for token in request.tokens]
+    )
+
+def _verification_result(token: str) -> VerifyTokenResponse:
+    """Verify một token, trả về kết quả theo format của /verify-token"""
+    payload = verify_token(token)
     
     if payload is None:
         return VerifyTokenResponse(
@@ -144,6 +233,13 @@ async def verify_jwt_token(
             message="Token signature verification failed"
         )
     
+    if is_revoked(payload):
+        return VerifyTokenResponse(
+            valid=False,
+            error="Invalid token",
+            message="Token has been revoked"
+        )
+    
     # Check if token has required fields
     if "user_id" not in payload or "username" not in payload or "email" not in payload:
         return VerifyTokenResponse(
@@ -162,3 +258,69 @@ async def verify_jwt_token(
             balance=0  # Balance không được lưu trong JWT, phải fetch từ Customer Service
         )
     )
+
+@router.get("/keys", response_model=KeysResponse, response_model_exclude_none=True)
+async def get_keys(
+    x_api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Lấy danh sách verification keys (INTERNAL ONLY - API Gateway sử dụng)
+    
+    Gateway dùng các keys này để verify JWT tại chỗ (không cần gọi /verify-token),
+    chọn key theo "kid" trong header của token và refresh định kỳ để theo kịp key rotation.
+    """
+    if x_api_key != settings.INTERNAL_API_KEY:
+        raise HTTPException(
+            status_code=401,
+            detail="Unauthorized: Invalid API Key"
+        )
+    
+    return KeysResponse(
+        active_kid=ACTIVE_KID,
+        keys=[VerificationKey(**key) for key in get_verification_keys()],
+        refresh_interval=settings.JWT_KEYS_REFRESH_SECONDS
+    )
+
+@router.get("/revocations", response_model=RevocationSnapshotResponse)
+async def get_revocations(
+    response: Response,
+    x_api_key: str = Header(None, alias="X-API-Key"),
+    if_none_match: str = Header(None, alias="If-None-Match")
+):
+    """
+    Snapshot Bloom filter của revocation list (INTERNAL ONLY - API Gateway sử dụng)
+    
+    Gateway verify token tại chỗ kiểm tra jti với filter này; jti có trong filter
+    (đã revoke hoặc false positive) thì hỏi lại /verify-token. Trả 304 nếu ETag không đổi.
+    """
+    if x_api_key != settings.INTERNAL_API_KEY:
+        raise HTTPException(
+            status_code=401,
+            detail="Unauthorized: Invalid API Key"
+        )
+    
+    revocation_store.purge_expired()
+    if if_none_match == revocation_store.etag:
+        return Response(status_code=304, headers={"ETag": revocation_store.etag})
+    
+    response.headers["ETag"] = revocation_store.etag
+    return RevocationSnapshotResponse(
+        **revocation_store.snapshot(),
+        refresh_interval=settings.REVOCATION_REFRESH_SECONDS
+    )
+
+@router.get("/login-stats")
+async def get_login_stats(
+    x_api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Thống kê login guard (INTERNAL ONLY): số lần thử, số lần gọi Customer Service,
+    negative cache và throttle theo IP/username
+    """
+    if x_api_key != settings.INTERNAL_API_KEY:
+        raise HTTPException(
+            status_code=401,
+            detail="Unauthorized: Invalid API Key"
+        )
+    
+    return login_guard.stats()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Optional, List
 
 # Request Schemas
 class LoginRequest(BaseModel):
@@ -9,6 +9,9 @@ class LoginRequest(BaseModel):
 class VerifyTokenRequest(BaseModel):
     token: str
 
+class VerifyTokensRequest(BaseModel):
+    tokens: List[str]
+
 # Response Schemas
 class UserInfo(BaseModel):
     id: int
@@ -28,3 +31,32 @@ class VerifyTokenResponse(BaseModel):
     user: Optional[UserInfo] = None
     error: Optional[str] = None
     message: Optional[str] = None
+
+class VerifyTokensResponse(BaseModel):
+    # Cùng thứ tự với tokens trong request
+    results: List[VerifyTokenResponse]
+
+class VerificationKey(BaseModel):
+    kty: str
+    kid: str
+    alg: str
+    # "oct" (HMAC): secret
+    k: Optional[str] = None
+    # "EC" / "OKP" (ES256 / EdDSA): public key
+    crv: Optional[str] = None
+    x: Optional[str] = None
+    y: Optional[str] = None
+
+class RevocationSnapshotResponse(BaseModel):
+    version: int
+    # Bloom filter: số bit, số hàm hash và bit array (base64)
+    bits: int
+    hashes: int
+    filter: str
+    count: int
+    refresh_interval: int
+
+class KeysResponse(BaseModel):
+    active_kid: str
+    keys: List[VerificationKey]
+    refresh_interval: int
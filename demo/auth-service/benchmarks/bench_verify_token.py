@@ -0,0 +1,76 @@
+"""
+Microbenchmark: throughput của verify_token / create_access_token trong Auth Service.
+
+So sánh cách cũ (python-jose: jwt.get_unverified_header + jwt.decode, jwt.encode cho mỗi
+token) với fast path dùng key nạp sẵn (hmac / cryptography trực tiếp).
+Thuật toán theo JWT_ALGORITHM; với ES256/EdDSA cần JWT_PRIVATE_KEYS (python-jose không
+hỗ trợ EdDSA nên cách cũ chỉ được đo với HS256).
+
+Chạy từ thư mục auth-service:
+    python benchmarks/bench_verify_token.py
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jose import JWTError, jwt  # noqa: E402
+
+from app.auth import ACTIVE_KEY, SIGNING_KEYS, create_access_token, verify_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.keys import b64url_decode  # noqa: E402
+
+CLAIMS = {"user_id": 1, "username": "523H0017", "email": "523H0017@student.tdtu.edu.vn"}
+
+
+def _secret(kid: str) -> str:
+    return b64url_decode(SIGNING_KEYS[kid].jwk["k"]).decode()
+
+
+def legacy_create(data: dict) -> str:
+    """Logic cũ của create_access_token"""
+    to_encode = data.copy()
+    to_encode.update({"exp": datetime.utcnow() + timedelta(hours=settings.ACCESS_TOKEN_EXPIRE_HOURS)})
+    return jwt.encode(to_encode, _secret(ACTIVE_KEY.kid), algorithm=ACTIVE_KEY.algorithm, headers={"kid": ACTIVE_KEY.kid})
+
+
+def legacy_verify(token: str):
+    """Logic cũ của verify_token"""
+    try:
+        kid = jwt.get_unverified_header(token).get("kid") or ACTIVE_KEY.kid
+        return jwt.decode(token, _secret(kid), algorithms=[ACTIVE_KEY.algorithm])
+    except JWTError:
+        return None
+
+
+def bench(fn, arg, number: int) -> float:
+    seconds = min(timeit.repeat(lambda: fn(arg), number=number, repeat=5))
+    return number / seconds
+
+
+if __name__ == "__main__":
+    number = int(os.getenv("BENCH_ITERATIONS", "20000"))
+    token = create_access_token(CLAIMS)
+    assert verify_token(token)["username"] == CLAIMS["username"]
+    assert verify_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB")) is None
+
+    print(f"algorithm: {ACTIVE_KEY.algorithm}")
+    if ACTIVE_KEY.jwk["kty"] == "oct":
+        # Token do hai cách tạo phải verify được lẫn nhau
+        assert legacy_verify(token)["username"] == CLAIMS["username"]
+        assert verify_token(legacy_create(CLAIMS))["username"] == CLAIMS["username"]
+
+        legacy_ops = bench(legacy_verify, token, number)
+        fast_ops = bench(verify_token, token, number)
+        print(f"verify legacy : {legacy_ops:10.0f} ops/s")
+        print(f"verify fast   : {fast_ops:10.0f} ops/s ({fast_ops / legacy_ops:.2f}x)")
+
+        legacy_ops = bench(legacy_create, CLAIMS, number)
+        fast_ops = bench(create_access_token, CLAIMS, number)
+        print(f"create legacy : {legacy_ops:10.0f} ops/s")
+        print(f"create fast   : {fast_ops:10.0f} ops/s ({fast_ops / legacy_ops:.2f}x)")
+    else:
+        print(f"verify        : {bench(verify_token, token, number):10.0f} ops/s")
+        print(f"create        : {bench(create_access_token, CLAIMS, number):10.0f} ops/s")
@@ -0,0 +1,216 @@
+import asyncio
+import csv
+import json
+import random
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .database import is_lock_conflict
+from .models import BalanceLedger, Customer
+
+CENT = Decimal("0.01")
+# Giới hạn của cột DECIMAL(15, 2) (balance, amount trong ledger)
+MAX_AMOUNT = Decimal("9999999999999.99")
+COLUMNS = ("customer_id", "amount", "reference")
+
+
+@dataclass
+class AdjustRow:
+    line: int
+    customer_id: int
+    amount: Decimal
+    reference: str
+
+
+def _row(line: int, customer_id, amount, reference) -> AdjustRow:
+    # Chỉ nhận số nguyên hoặc chuỗi chữ số: int() sẽ cắt 1.9 / true thành customer 1
+    if isinstance(customer_id, str) and customer_id.strip().isascii() and customer_id.strip().isdigit():
+        customer_id = int(customer_id)
+    if isinstance(customer_id, bool) or not isinstance(customer_id, int) or customer_id <= 0:
+        raise ValueError("customer_id must be a positive integer")
+    if isinstance(amount, bool):
+        raise ValueError("amount must be a number")
+    try:
+        amount = Decimal(str(amount).strip()).quantize(CENT)
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValueError("amount must be a number")
+    if abs(amount) > MAX_AMOUNT:
+        raise ValueError("amount is out of range")
+    reference = str(reference or "").strip()
+    if not reference or len(reference) > 64:
+        raise ValueError("reference is required (max 64 characters)")
+    if not amount:
+        raise ValueError("amount must not be zero")
+    return AdjustRow(line, customer_id, amount, reference)
+
+
+class NdjsonParser:
+    """Mỗi dòng một object {"customer_id": ..., "amount": ..., "reference": ...}"""
+
+    def parse(self, line: int, text: str) -> AdjustRow:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            raise ValueError("invalid JSON")
+        if not isinstance(data, dict):
+            raise ValueError("each line must be a JSON object")
+        return _row(line, data.get("customer_id"), data.get("amount"), data.get("reference"))
+
+
+class CsvParser:
+    """
+    customer_id,amount,reference - dòng header (nếu có) quyết định thứ tự cột.
+    Không hỗ trợ field chứa xuống dòng (file được đọc theo từng dòng).
+    """
+
+    def __init__(self):
+        self._positions: Optional[Tuple[int, int, int]] = None
+
+    def parse(self, line: int, text: str) -> Optional[AdjustRow]:
+        fields = [field.strip() for field in next(csv.reader([text]))]
+        if self._positions is None:
+            header = [field.lower() for field in fields]
+            if all(column in header for column in COLUMNS):
+                self._positions = tuple(header.index(column) for column in COLUMNS)
+                return None
+            self._positions = (0, 1, 2)
+        if len(fields) <= max(self._positions):
+            raise ValueError("expected columns customer_id, amount, reference")
+        return _row(line, *(fields[position] for position in self._positions))
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """Đọc body theo từng chunk, trả (số dòng, bytes) của các dòng không rỗng (decode bằng decode_line)"""
+    buffer = b""
+    line = 0
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line += 1
+            raw = raw.strip()
+            if raw:
+                yield line, raw
+    buffer = buffer.strip()
+    if buffer:
+        yield line + 1, buffer
+
+
+def decode_line(line: int, raw: bytes) -> str:
+    """UTF-8 (dòng đầu có thể có BOM); ValueError nếu dòng không phải UTF-8 hợp lệ"""
+    try:
+        return raw.decode("utf-8-sig" if line == 1 else "utf-8").strip()
+    except UnicodeDecodeError:
+        raise ValueError("line is not valid UTF-8")
+
+
+async def _apply_once(db: AsyncSession, rows: List[AdjustRow]) -> Tuple[List[dict], List[int]]:
+    results: Dict[int, dict] = {}
+
+    # 1. Reference đã có trong ledger (file nạp lại) -> không áp dụng lần hai
+    result = await db.execute(
+        select(
+            BalanceLedger.transaction_code, BalanceLedger.kind,
+            BalanceLedger.customer_id, BalanceLedger.amount, BalanceLedger.new_balance
+        ).where(BalanceLedger.transaction_code.in_([row.reference for row in rows]))
+    )
+    existing = {entry.transaction_code: entry for entry in result}
+    pending = []
+    for row in rows:
+        entry = existing.get(row.reference)
+        if entry is None:
+            pending.append(row)
+        elif entry.kind == "adjust" and entry.customer_id == row.customer_id and entry.amount == row.amount:
+            results[row.line] = {"status": "already_applied", "new_balance": float(entry.new_balance)}
+        else:
+            results[row.line] = {"status": "reference_conflict", "error": "Reference already used for a different entry"}
+
+    # 2. Lock các customer liên quan theo thứ tự id (tránh deadlock giữa các chunk/request)
+    customer_ids = sorted({row.customer_id for row in pending})
+    balances = {}
+    if customer_ids:
+        result = await db.execute(
+            select(Customer.id, Customer.balance).where(
+                Customer.id.in_(customer_ids)
+            ).order_by(Customer.id).with_for_update()
+        )
+        balances = dict(result.all())
+
+    # 3. Tính balance theo thứ tự dòng; dòng làm balance âm bị từ chối
+    deltas: Dict[int, Decimal] = {}
+    ledger = []
+    for row in pending:
+        old_balance = balances.get(row.customer_id)
+        if old_balance is None:
+            results[row.line] = {"status": "customer_not_found", "error": "Customer not found"}
+            continue
+        new_balance = old_balance + row.amount
+        if new_balance > MAX_AMOUNT:
+            results[row.line] = {"status": "invalid", "error": "Resulting balance is out of range"}
+            continue
+        if new_balance < 0:
+            results[row.line] = {
+                "status": "insufficient_balance",
+                "error": "Insufficient balance",
+                "current_balance": float(old_balance)
+            }
+            continue
+        balances[row.customer_id] = new_balance
+        deltas[row.customer_id] = deltas.get(row.customer_id, Decimal(0)) + row.amount
+        ledger.append({
+            "transaction_code": row.reference,
+            "customer_id": row.customer_id,
+            "kind": "adjust",
+            "amount": row.amount,
+            "old_balance": old_balance,
+            "new_balance": new_balance
+        })
+        results[row.line] = {"status": "applied", "new_balance": float(new_balance)}
+
+    # 4. Một câu UPDATE ... CASE id cho cả chunk + một INSERT nhiều dòng vào ledger
+    if deltas:
+        await db.execute(
+            update(Customer).where(
+                Customer.id.in_(list(deltas))
+            ).values(
+                balance=Customer.balance + case(deltas, value=Customer.id)
+            ).execution_options(synchronize_session=False)
+        )
+        await db.execute(insert(BalanceLedger), ledger)
+    await db.commit()
+
+    return [
+        {"line": row.line, "reference": row.reference, "customer_id": row.customer_id, **results[row.line]}
+        for row in rows
+    ], list(deltas)
+
+
+async def apply_chunk(db: AsyncSession, rows: List[AdjustRow]) -> Tuple[List[dict], List[int]]:
+    """
+    Áp dụng một chunk trong một transaction ngắn.
+    Returns: (kết quả từng dòng, các customer_id đã thay đổi balance)
+
+    Reference trùng với request chạy song song (UNIQUE) hoặc deadlock / lock wait timeout
+    -> rollback cả chunk và thử lại; lần sau các reference đã commit được báo already_applied.
+    Lỗi DB khác (vd DataError) -> rollback, cả chunk được báo failed thay vì làm hỏng request.
+    """
+    for attempt in range(1, settings.DEDUCT_MAX_ATTEMPTS + 1):
+        try:
+            return await _apply_once(db, rows)
+        except (DataError, IntegrityError, OperationalError) as e:
+            await db.rollback()
+            retryable = isinstance(e, IntegrityError) or is_lock_conflict(e)
+            if not retryable or attempt == settings.DEDUCT_MAX_ATTEMPTS:
+                error = "Account is busy, please retry" if retryable else f"Database error: {e.__class__.__name__}"
+                return [
+                    {"line": row.line, "reference": row.reference, "customer_id": row.customer_id,
+                     "status": "failed", "error": error}
+                    for row in rows
+                ], []
+            await asyncio.sleep(settings.DEDUCT_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
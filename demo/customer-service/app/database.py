@@ -1,28 +1,49 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 from .config import settings
 
+def async_database_url(url: str) -> str:
+    """
+    URL với driver async: mysql+pymysql -> mysql+aiomysql, sqlite -> sqlite+aiosqlite (test).
+    URL đã chỉ định driver async thì giữ nguyên.
+    """
+    scheme, sep, rest = url.partition("://")
+    if scheme in ("mysql", "mysql+pymysql", "mysql+mysqldb"):
+        scheme = "mysql+aiomysql"
+    elif scheme == "sqlite":
+        scheme = "sqlite+aiosqlite"
+    return f"{scheme}{sep}{rest}"
+
 # Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
+engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
     pool_pre_ping=True,
     pool_recycle=3600,
     echo=False
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: đọc attribute sau commit không phát sinh lazy load (không hỗ trợ trong async)
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
 
-def get_db():
+async def get_db():
     """
     Dependency to get database session
     """
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def init_models():
+    """Tạo bảng nếu chưa có (gọi lúc startup)"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+# MySQL: 1213 deadlock, 1205 lock wait timeout - transaction đã bị rollback, thử lại được
+RETRYABLE_LOCK_ERRORS = (1213, 1205)
+
+def is_lock_conflict(error: OperationalError) -> bool:
+    args = getattr(error.orig, "args", ())
+    return bool(args) and args[0] in RETRYABLE_LOCK_ERRORS
@@ -1,16 +1,25 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import router
+from .deadline import DeadlineMiddleware
 from .config import settings
-from .database import engine, Base
+from .database import engine, init_models
+from .profile_cache import profile_cache
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create database tables
+    await init_models()
+    yield
+    await profile_cache.close()
+    await engine.dispose()
 
 app = FastAPI(
     title=settings.SERVICE_NAME,
     description="Customer Management Service with Database",
-    version="2.0"
+    version="2.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -22,6 +31,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Deadline propagation: X-Deadline-Ms do API Gateway đặt
+app.add_middleware(DeadlineMiddleware)
+
 # Include routes
 app.include_router(router)
 
@@ -34,8 +46,12 @@ async def root():
         "description": "Customer management with MySQL database",
         "endpoints": [
             "GET /api/customers/me",
+            "POST /api/customers/batch (INTERNAL)",
             "POST /api/customers/search (INTERNAL)",
-            "POST /api/customers/deduct-balance (INTERNAL)"
+            "POST /api/customers/deduct-balance (INTERNAL)",
+            "POST /api/customers/bulk-adjust (INTERNAL)",
+            "GET /api/customers/cache-stats (INTERNAL)",
+            "GET /api/customers/password-stats (INTERNAL)"
         ]
     }
 
@@ -1,13 +1,15 @@
-from sqlalchemy import Column, BigInteger, String, DECIMAL, Index
+from sqlalchemy import Column, BigInteger, Integer, String, DECIMAL, TIMESTAMP, Index
+from sqlalchemy.sql import func
 from .database import Base
 
 class Customer(Base):
     __tablename__ = "customers"
     
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # SQLite chỉ tự tăng với INTEGER PRIMARY KEY (fallback aiosqlite khi test)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     username = Column(String(50), unique=True, nullable=False)
     email = Column(String(100), unique=True, nullable=False)
-    password = Column(String(255), nullable=False)  # Plain text password
+    password = Column(String(255), nullable=False)  # argon2id hash (plain text cũ được hash lại khi login)
     full_name = Column(String(100), nullable=False)  # Full name of customer
     phone_number = Column(String(20), nullable=False)  # Phone number
     balance = Column(DECIMAL(15, 2), nullable=False, default=0)
@@ -17,3 +19,25 @@ class Customer(Base):
         Index('idx_username', 'username'),
         Index('idx_email', 'email'),
     )
+
+class BalanceLedger(Base):
+    """
+    Mỗi lần thay đổi balance thành công ghi một dòng, transaction_code là khoá idempotency (UNIQUE):
+    Payment Service / API Gateway gọi lại với cùng transaction_code nhận lại kết quả cũ,
+    không bị trừ tiền lần hai; file bulk-adjust nạp lại không cộng tiền lần hai.
+    kind = "deduct" (amount là số tiền bị trừ) hoặc "adjust" (amount có dấu, dương là cộng).
+    """
+    __tablename__ = "balance_ledger"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    transaction_code = Column(String(64), unique=True, nullable=False)
+    customer_id = Column(BigInteger, nullable=False)
+    kind = Column(String(10), nullable=False, default="deduct", server_default="deduct")
+    amount = Column(DECIMAL(15, 2), nullable=False)
+    old_balance = Column(DECIMAL(15, 2), nullable=False)
+    new_balance = Column(DECIMAL(15, 2), nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.current_timestamp(), nullable=False)
+    
+    __table_args__ = (
+        Index('idx_ledger_customer', 'customer_id'),
+    )
@@ -0,0 +1,125 @@
+import asyncio
+import hmac
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+from .config import settings
+
+ARGON2_PREFIX = "$argon2"
+
+
+class PasswordHashBusy(Exception):
+    """Hàng đợi hash password đã đầy (quá PASSWORD_HASH_MAX_QUEUE) - caller trả 503"""
+
+
+class PasswordService:
+    """
+    Hash/verify password bằng argon2id trên thread pool riêng có giới hạn
+    (argon2-cffi nhả GIL nên các thread chạy song song), event loop không bị block.
+
+    - Cost (time_cost, memory_cost, parallelism) cấu hình qua env, chọn bằng
+      benchmarks/bench_password_hash.py theo SLO p99 của login
+    - Password plain text cũ và hash với cost cũ được hash lại khi login thành công
+    - Số job đang chờ + đang chạy (queue depth) bị giới hạn; vượt quá thì raise PasswordHashBusy
+    """
+
+    def __init__(self, time_cost: int, memory_cost: int, parallelism: int, workers: int, max_queue: int):
+        self.hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.queue_depth = 0
+        self.max_queue_depth_seen = 0
+        self.jobs = 0
+        self.rejected = 0
+        self.upgrades = 0
+        self._busy_seconds = 0.0
+        # Hash của password ngẫu nhiên với cost hiện tại, dùng cho verify_dummy
+        self._dummy_hash = self.hasher.hash(secrets.token_urlsafe(16))
+
+    async def _run(self, fn, *args):
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHashBusy()
+        self.queue_depth += 1
+        self.max_queue_depth_seen = max(self.max_queue_depth_seen, self.queue_depth)
+        try:
+            result, elapsed = await asyncio.get_running_loop().run_in_executor(self._executor, self._timed, fn, *args)
+        finally:
+            self.queue_depth -= 1
+        # Cập nhật counters trên event loop (không tranh chấp với worker threads)
+        self.jobs += 1
+        self._busy_seconds += elapsed
+        return result
+
+    @staticmethod
+    def _timed(fn, *args):
+        started = time.perf_counter()
+        return fn(*args), time.perf_counter() - started
+
+    def _verify(self, stored: str, password: str) -> Tuple[bool, Optional[str]]:
+        try:
+            self.hasher.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False, None
+        if self.hasher.check_needs_rehash(stored):
+            return True, self.hasher.hash(password)
+        return True, None
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.hasher.hash, password)
+
+    async def verify(self, stored: str, password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Kiểm tra password với giá trị lưu trong DB.
+
+        Returns:
+            (hợp lệ, hash mới cần lưu lại hoặc None) - hash mới có khi giá trị cũ là
+            plain text hoặc hash với cost khác cấu hình hiện tại
+        """
+        if stored.startswith(ARGON2_PREFIX):
+            ok, new_hash = await self._run(self._verify, stored, password)
+        else:
+            # Plain text (trước khi có hashing): so sánh constant-time rồi hash lại
+            ok = hmac.compare_digest(stored.encode(), password.encode())
+            new_hash = await self.hash(password) if ok else None
+        if new_hash is not None:
+            self.upgrades += 1
+        return ok, new_hash
+
+    async def verify_dummy(self, password: str):
+        """
+        Verify với hash giả khi username không tồn tại: tốn cùng chi phí argon2id như
+        username có thật, thời gian phản hồi không tiết lộ username nào tồn tại
+        """
+        await self._run(self._verify, self._dummy_hash, password)
+
+    def stats(self) -> dict:
+        return {
+            "algorithm": "argon2id",
+            "time_cost": self.hasher.time_cost,
+            "memory_cost_kib": self.hasher.memory_cost,
+            "parallelism": self.hasher.parallelism,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "max_queue_depth_seen": self.max_queue_depth_seen,
+            "jobs": self.jobs,
+            "rejected": self.rejected,
+            "upgrades": self.upgrades,
+            "avg_job_ms": round(self._busy_seconds / self.jobs * 1000, 2) if self.jobs else 0.0,
+        }
+
+
+password_service = PasswordService(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
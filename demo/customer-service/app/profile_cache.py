@@ -0,0 +1,255 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import settings
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # redis là optional, chỉ cần khi PROFILE_CACHE_BACKEND=redis
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+
+def _pack(cached_at: float, payload: bytes) -> bytes:
+    # Thời điểm cache (wall clock) đi kèm payload để instance khác tính được tuổi của entry
+    return b"%.3f " % cached_at + payload
+
+
+def _unpack(value: bytes) -> Tuple[float, bytes]:
+    cached_at, _, payload = value.partition(b" ")
+    return float(cached_at), payload
+
+
+class MemoryBackend:
+    """LRU trong process: tối đa max_entries entry, mỗi entry hết hạn sau ttl giây"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def close(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Chỉ ghi entry khi generation trong Redis chưa đổi kể từ lúc bắt đầu load
+SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class RedisBackend:
+    """
+    Backend dùng chung giữa các instance Customer Service (redis.asyncio, key hết hạn theo ttl).
+
+    Generation của mỗi customer cũng nằm trong Redis (INCR khi invalidate) để instance
+    đang load từ trước khi instance khác invalidate không ghi đè profile cũ vào tầng dùng chung.
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = "customer:profile:"):
+        if redis_asyncio is None:
+            raise RuntimeError("PROFILE_CACHE_BACKEND=redis cần cài package redis")
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(url)
+        self._set_if_generation = self._client.register_script(SET_IF_GENERATION)
+
+    def _generation_key(self, key: str) -> str:
+        return self.prefix + "gen:" + key
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(self.prefix + key)
+
+    async def generation(self, key: str) -> bytes:
+        return await self._client.get(self._generation_key(key)) or b"0"
+
+    async def set(self, key: str, value: bytes, generation: bytes) -> bool:
+        """Ghi entry nếu generation chưa đổi; False nếu đã bị invalidate trong lúc load"""
+        return bool(await self._set_if_generation(
+            keys=[self.prefix + key, self._generation_key(key)],
+            args=[value, generation, int(self.ttl * 1000)]
+        ))
+
+    async def delete(self, key: str):
+        # Generation sống lâu hơn entry để load đang chạy luôn thấy nó đã đổi
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.incr(self._generation_key(key))
+            pipe.pexpire(self._generation_key(key), int(self.ttl * 2000))
+            pipe.delete(self.prefix + key)
+            await pipe.execute()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class ProfileCache:
+    """
+    Read-through cache cho payload CustomerInfo đã serialize (JSON bytes) của GET /me.
+
+    - Tầng 1: LRU trong process (giới hạn số entry); tầng 2 (tuỳ chọn): backend dùng chung (Redis)
+    - update_profile / deduct_balance gọi invalidate() sau khi commit. Load đang chạy từ trước
+      khi invalidate sẽ không được ghi vào cache (generation counter; với Redis, generation
+      nằm trong Redis nên áp dụng cả với invalidate từ instance khác)
+    - Với backend dùng chung, invalidate của instance khác không xoá được LRU local nên
+      LRU local chỉ giữ local_ttl giây
+    - balance có thể đọc lại từ DB tuỳ độ cũ caller chấp nhận (xem with_balance)
+    Backend dùng chung lỗi thì coi như miss (đọc DB), không làm hỏng request.
+    """
+
+    def __init__(self, local: MemoryBackend, shared=None):
+        self.local = local
+        self.shared = shared
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.shared_errors = 0
+        self.balance_refreshes = 0
+        self.stale_balances = 0
+        self.max_balance_staleness = 0.0
+        self._served_age_total = 0.0
+
+    async def _shared_call(self, method: str, *args):
+        try:
+            return await getattr(self.shared, method)(*args)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning("Profile cache backend %s lỗi: %s", method, e)
+            return None
+
+    async def get_or_load(
+        self, customer_id: int, load: Callable[[], Awaitable[Optional[bytes]]]
+    ) -> Optional[Tuple[bytes, float]]:
+        """
+        Payload của customer và tuổi (giây) của nó; None nếu customer không tồn tại.
+        Miss thì gọi load() (query DB + serialize) và ghi vào cache.
+        """
+        key = str(customer_id)
+        value = await self.local.get(key)
+        if value is None and self.shared is not None:
+            value = await self._shared_call("get", key)
+            if value is not None:
+                self.shared_hits += 1
+                await self.local.set(key, value)
+
+        if value is not None:
+            self.hits += 1
+            cached_at, payload = _unpack(value)
+            age = max(0.0, time.time() - cached_at)
+            self._served_age_total += age
+            return payload, age
+
+        self.misses += 1
+        generation = self._generations.get(key, 0)
+        shared_generation = None
+        if self.shared is not None:
+            shared_generation = await self._shared_call("generation", key)
+        payload = await load()
+        if payload is None:
+            return None
+        if self._generations.get(key, 0) == generation:
+            value = _pack(time.time(), payload)
+            stored = None
+            if shared_generation is not None:
+                stored = await self._shared_call("set", key, value, shared_generation)
+            # False: instance khác đã invalidate trong lúc load -> không cache ở tầng nào
+            # None: không có / lỗi backend dùng chung -> chỉ cache local (local_ttl)
+            if stored is not False:
+                await self.local.set(key, value)
+        return payload, 0.0
+
+    def with_balance(self, payload: bytes, balance: float, age: float) -> bytes:
+        """Thay balance trong payload đã cache bằng giá trị vừa đọc từ DB"""
+        self.balance_refreshes += 1
+        marker = b'"balance":'
+        start = payload.index(marker) + len(marker)
+        end = payload.find(b",", start)
+        if end == -1:
+            end = payload.index(b"}", start)
+        if float(payload[start:end]) != balance:
+            self.stale_balances += 1
+            self.max_balance_staleness = max(self.max_balance_staleness, age)
+        return payload[:start] + repr(balance).encode() + payload[end:]
+
+    async def invalidate(self, customer_id: int):
+        key = str(customer_id)
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self.invalidations += 1
+        await self.local.delete(key)
+        if self.shared is not None:
+            await self._shared_call("delete", key)
+
+    async def close(self):
+        await self.local.close()
+        if self.shared is not None:
+            await self.shared.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis" if self.shared is not None else "memory",
+            "size": len(self.local),
+            "max_entries": self.local.max_entries,
+            "ttl_seconds": settings.PROFILE_CACHE_TTL,
+            "local_ttl_seconds": self.local.ttl,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.local.evictions,
+            "invalidations": self.invalidations,
+            "shared_errors": self.shared_errors,
+            "avg_served_age_seconds": round(self._served_age_total / self.hits, 3) if self.hits else 0.0,
+            "balance": {
+                "default_max_age_seconds": settings.PROFILE_CACHE_BALANCE_MAX_AGE,
+                "refreshes": self.balance_refreshes,
+                "stale": self.stale_balances,
+                "max_staleness_seconds": round(self.max_balance_staleness, 3),
+            },
+        }
+
+
+def _create_profile_cache() -> ProfileCache:
+    if settings.PROFILE_CACHE_BACKEND == "redis":
+        local_ttl = min(settings.PROFILE_CACHE_TTL, settings.PROFILE_CACHE_LOCAL_TTL)
+        shared = RedisBackend(settings.PROFILE_CACHE_REDIS_URL, settings.PROFILE_CACHE_TTL)
+    else:
+        local_ttl = settings.PROFILE_CACHE_TTL
+        shared = None
+    return ProfileCache(MemoryBackend(settings.PROFILE_CACHE_MAX_ENTRIES, local_ttl), shared)
+
+
+profile_cache = _create_profile_cache()
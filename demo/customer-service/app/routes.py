@@ -1,14 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+import asyncio
+import json
+import random
+import time
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from decimal import Decimal
-from .database import get_db
-from .models import Customer
+from typing import Dict, List, Optional, Tuple
+from .database import get_db, SessionLocal, is_lock_conflict
+from .models import Customer, BalanceLedger
 from .schemas import (
     CustomerInfo, SearchRequest, SearchResponse,
+    BatchCustomerRequest, BatchCustomerResponse,
     DeductBalanceRequest, DeductBalanceResponse,
     UpdateProfileRequest, UpdateProfileResponse
 )
 from .config import settings
+from .passwords import password_service, PasswordHashBusy
+from .profile_cache import profile_cache
+from .bulk_adjust import CsvParser, NdjsonParser, apply_chunk, decode_line, iter_lines
 
 router = APIRouter(prefix="/api/customers", tags=["Customers"])
 
@@ -23,40 +35,146 @@ def verify_api_key(x_api_key: str = Header(None, alias="X-API-Key")):
         )
     return True
 
+def _customer_info(customer: Customer) -> CustomerInfo:
+    return CustomerInfo(
+        id=customer.id,
+        username=customer.username,
+        email=customer.email,
+        full_name=customer.full_name,
+        phone_number=customer.phone_number,
+        balance=float(customer.balance)
+    )
+
 @router.get("/me", response_model=CustomerInfo)
 async def get_current_customer(
     x_customer_id: int = Header(..., alias="X-Customer-ID"),
-    db: Session = Depends(get_db)
+    x_balance_max_age: Optional[float] = Header(None, alias="X-Balance-Max-Age"),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Lấy thông tin customer hiện tại đang đăng nhập
     
     Flow:
     1. API Gateway đã verify JWT và inject X-Customer-ID vào header
-    2. Query database để lấy customer info mới nhất
-    3. Return customer info (bao gồm balance)
+    2. Lấy payload CustomerInfo từ profile cache, miss thì query database
+    3. Entry cũ hơn X-Balance-Max-Age giây (mặc định PROFILE_CACHE_BALANCE_MAX_AGE = 0,
+       tức balance luôn mới) thì đọc lại balance từ database
+    4. Return customer info (bao gồm balance)
     """
-    customer = db.query(Customer).filter(Customer.id == x_customer_id).first()
+    async def load() -> Optional[bytes]:
+        result = await db.execute(select(Customer).where(Customer.id == x_customer_id))
+        customer = result.scalars().first()
+        return _customer_info(customer).model_dump_json().encode() if customer else None
+    
+    cached = await profile_cache.get_or_load(x_customer_id, load)
     
-    if not customer:
+    if cached is None:
         raise HTTPException(
             status_code=404,
             detail="Customer not found"
         )
     
-    return CustomerInfo(
-        id=customer.id,
-        username=customer.username,
-        email=customer.email,
-        full_name=customer.full_name,
-        phone_number=customer.phone_number,
-        balance=float(customer.balance)
+    payload, age = cached
+    balance_max_age = settings.PROFILE_CACHE_BALANCE_MAX_AGE if x_balance_max_age is None else x_balance_max_age
+    if age > balance_max_age:
+        result = await db.execute(select(Customer.balance).where(Customer.id == x_customer_id))
+        balance = result.scalar()
+        if balance is None:
+            await profile_cache.invalidate(x_customer_id)
+            raise HTTPException(
+                status_code=404,
+                detail="Customer not found"
+            )
+        payload = profile_cache.with_balance(payload, float(balance), age)
+    
+    return Response(content=payload, media_type="application/json")
+
+# Các cột được phép lấy qua POST /batch (không bao giờ có password)
+BATCH_FIELDS = tuple(CustomerInfo.model_fields)
+
+async def _fetch_customers(db: AsyncSession, ids: List[int], fields: Tuple[str, ...]) -> Dict[int, dict]:
+    """Một câu SELECT <fields> ... WHERE id IN (...) cho cả nhóm id"""
+    columns = [getattr(Customer, field) for field in fields]
+    result = await db.execute(select(*columns).where(Customer.id.in_(ids)))
+    rows = {}
+    for row in result:
+        customer = dict(zip(fields, row))
+        if "balance" in customer:
+            customer["balance"] = float(customer["balance"])
+        rows[customer["id"]] = customer
+    return rows
+
+async def _stream_customers(ids: List[int], fields: Tuple[str, ...]):
+    """
+    NDJSON: mỗi dòng một customer (theo thứ tự ids), dòng cuối {"missing_ids": [...]}.
+    Query theo từng nhóm CUSTOMER_BATCH_CHUNK_SIZE id với session riêng của stream.
+    """
+    missing = []
+    chunk_size = settings.CUSTOMER_BATCH_CHUNK_SIZE
+    async with SessionLocal() as db:
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            rows = await _fetch_customers(db, chunk, fields)
+            await db.rollback()
+            lines = []
+            for customer_id in chunk:
+                customer = rows.get(customer_id)
+                if customer is None:
+                    missing.append(customer_id)
+                else:
+                    lines.append(json.dumps(customer, ensure_ascii=False))
+            if lines:
+                yield ("\n".join(lines) + "\n").encode()
+    yield (json.dumps({"missing_ids": missing}) + "\n").encode()
+
+@router.post("/batch", response_model=BatchCustomerResponse)
+async def batch_customers(
+    request: BatchCustomerRequest,
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(verify_api_key)
+):
+    """
+    Lấy thông tin nhiều customer trong một request (INTERNAL ONLY)
+    
+    Dùng cho job báo cáo / đối soát / hoá đơn thay vì gọi /me cho từng id.
+    Chỉ các cột trong fields được SELECT, tất cả id trong một câu IN.
+    Tối đa CUSTOMER_BATCH_MAX_IDS id mỗi request (mặc định 10000), vượt quá trả 413.
+    
+    Response:
+    - JSON {"customers": [...], "missing_ids": [...]}
+    - Accept: application/x-ndjson -> stream NDJSON theo từng nhóm id (batch lớn),
+      dòng cuối là {"missing_ids": [...]}
+    """
+    if len(request.ids) > settings.CUSTOMER_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many ids: maximum {settings.CUSTOMER_BATCH_MAX_IDS} per request"
+        )
+    
+    requested = request.fields or BATCH_FIELDS
+    unknown = [field for field in requested if field not in BATCH_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    fields = ("id",) + tuple(field for field in BATCH_FIELDS if field in requested and field != "id")
+    ids = list(dict.fromkeys(request.ids))
+    
+    if accept and "application/x-ndjson" in accept:
+        return StreamingResponse(_stream_customers(ids, fields), media_type="application/x-ndjson")
+    
+    rows = await _fetch_customers(db, ids, fields) if ids else {}
+    return BatchCustomerResponse(
+        customers=[rows[customer_id] for customer_id in ids if customer_id in rows],
+        missing_ids=[customer_id for customer_id in ids if customer_id not in rows]
     )
 
 @router.post("/search", response_model=SearchResponse)
 async def search_customer(
     request: SearchRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: bool = Depends(verify_api_key)
 ):
     """
@@ -65,43 +183,54 @@ async def search_customer(
     Flow:
     1. Verify API Key
     2. Query database để tìm customer theo username
-    3. Verify password (plain text comparison)
+    3. Verify password (argon2id trên thread pool; password plain text cũ được hash lại)
     4. Return user info nếu hợp lệ
     """
     # Find customer by username
-    customer = db.query(Customer).filter(Customer.username == request.username).first()
+    result = await db.execute(select(Customer).where(Customer.username == request.username))
+    customer = result.scalars().first()
     
-    if not customer:
-        return SearchResponse(
-            success=False,
-            error="Invalid username or password"
+    # Verify password (không block event loop); username không tồn tại vẫn verify
+    # với hash giả để thời gian phản hồi như nhau
+    try:
+        if not customer:
+            await password_service.verify_dummy(request.password)
+            return SearchResponse(
+                success=False,
+                error="Invalid username or password",
+                error_code="unknown_user"
+            )
+        valid, new_hash = await password_service.verify(customer.password, request.password)
+    except PasswordHashBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Password verification is busy, please retry",
+            headers={"Retry-After": "1"}
         )
     
-    # Verify password (plain text comparison)
-    if customer.password != request.password:
+    if not valid:
         return SearchResponse(
             success=False,
-            error="Invalid username or password"
+            error="Invalid username or password",
+            error_code="invalid_password"
         )
     
+    # Nâng cấp hash (plain text hoặc cost cũ) sau khi login thành công
+    if new_hash is not None:
+        customer.password = new_hash
+        await db.commit()
+    
     # Return customer info
     return SearchResponse(
         success=True,
-        user=CustomerInfo(
-            id=customer.id,
-            username=customer.username,
-            email=customer.email,
-            full_name=customer.full_name,
-            phone_number=customer.phone_number,
-            balance=float(customer.balance)
-        )
+        user=_customer_info(customer)
     )
 
 @router.put("/update-profile", response_model=UpdateProfileResponse)
 async def update_profile(
     request: UpdateProfileRequest,
     x_customer_id: int = Header(..., alias="X-Customer-ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Cập nhật thông tin profile của customer
@@ -114,9 +243,10 @@ async def update_profile(
     5. Return updated user info
     """
     try:
-        customer = db.query(Customer).filter(
-            Customer.id == x_customer_id
-        ).first()
+        result = await db.execute(
+            select(Customer).where(Customer.id == x_customer_id)
+        )
+        customer = result.scalars().first()
         
         if not customer:
             return UpdateProfileResponse(
@@ -134,22 +264,26 @@ async def update_profile(
                     error="Current password is required"
                 )
             
-            if customer.password != request.current_password:
+            valid, _ = await password_service.verify(customer.password, request.current_password)
+            if not valid:
                 return UpdateProfileResponse(
                     success=False,
                     message="Current password is incorrect",
                     error="Invalid current password"
                 )
             
-            # Update password
-            customer.password = request.new_password
+            # Update password (lưu hash argon2id)
+            customer.password = await password_service.hash(request.new_password)
         
         # Check username uniqueness if changing
         if request.username and request.username != customer.username:
-            existing = db.query(Customer).filter(
-                Customer.username == request.username,
-                Customer.id != x_customer_id
-            ).first()
+            result = await db.execute(
+                select(Customer).where(
+                    Customer.username == request.username,
+                    Customer.id != x_customer_id
+                )
+            )
+            existing = result.scalars().first()
             
             if existing:
                 return UpdateProfileResponse(
@@ -162,10 +296,13 @@ async def update_profile(
         
         # Check email uniqueness if changing
         if request.email and request.email != customer.email:
-            existing = db.query(Customer).filter(
-                Customer.email == request.email,
-                Customer.id != x_customer_id
-            ).first()
+            result = await db.execute(
+                select(Customer).where(
+                    Customer.email == request.email,
+                    Customer.id != x_customer_id
+                )
+            )
+            existing = result.scalars().first()
             
             if existing:
                 return UpdateProfileResponse(
@@ -184,89 +321,267 @@ async def update_profile(
             customer.phone_number = request.phone_number
         
         # Commit changes
-        db.commit()
-        db.refresh(customer)
+        await db.commit()
+        await db.refresh(customer)
+        await profile_cache.invalidate(customer.id)
         
         return UpdateProfileResponse(
             success=True,
             message="Profile updated successfully",
-            user=CustomerInfo(
-                id=customer.id,
-                username=customer.username,
-                email=customer.email,
-                full_name=customer.full_name,
-                phone_number=customer.phone_number,
-                balance=float(customer.balance)
-            )
+            user=_customer_info(customer)
         )
         
+    except PasswordHashBusy:
+        await db.rollback()
+        raise HTTPException(
+            status_code=503,
+            detail="Password verification is busy, please retry",
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to update profile: {str(e)}"
         )
 
+async def _find_ledger_entry(db: AsyncSession, transaction_code: str) -> Optional[BalanceLedger]:
+    result = await db.execute(
+        select(BalanceLedger).where(BalanceLedger.transaction_code == transaction_code)
+    )
+    return result.scalars().first()
+
+def _replay_response(entry: BalanceLedger, customer_id: int, amount: Decimal) -> DeductBalanceResponse:
+    """Kết quả của lần trừ tiền đã ghi trong ledger cho cùng transaction_code"""
+    if entry.kind != "deduct" or entry.customer_id != customer_id or entry.amount != amount:
+        return DeductBalanceResponse(
+            success=False,
+            error="Transaction code already used for a different deduction"
+        )
+    return DeductBalanceResponse(
+        success=True,
+        new_balance=float(entry.new_balance),
+        old_balance=float(entry.old_balance),
+        replayed=True
+    )
+
+async def _deduct_once(db: AsyncSession, request: DeductBalanceRequest, amount: Decimal) -> DeductBalanceResponse:
+    # transaction_code đã xử lý rồi -> trả lại kết quả cũ, không trừ lần hai
+    entry = await _find_ledger_entry(db, request.transaction_code)
+    if entry:
+        response = _replay_response(entry, request.customer_id, amount)
+        await db.rollback()
+        return response
+    
+    # Một câu UPDATE có điều kiện: kiểm tra số dư và trừ tiền trong cùng statement
+    result = await db.execute(
+        update(Customer).where(
+            Customer.id == request.customer_id,
+            Customer.balance >= amount
+        ).values(
+            balance=Customer.balance - amount
+        ).execution_options(synchronize_session=False)
+    )
+    
+    if result.rowcount == 0:
+        await db.rollback()
+        # Không có dòng nào bị trừ: customer không tồn tại hoặc không đủ tiền (đọc không lock)
+        result = await db.execute(
+            select(Customer.balance).where(Customer.id == request.customer_id)
+        )
+        balance = result.scalar()
+        await db.rollback()
+        if balance is None:
+            return DeductBalanceResponse(
+                success=False,
+                error="Customer not found"
+            )
+        return DeductBalanceResponse(
+            success=False,
+            error="Insufficient balance",
+            current_balance=float(balance),
+            required_amount=request.amount
+        )
+    
+    # Dòng customer đang bị lock bởi UPDATE ở trên, đọc lại số dư mới
+    result = await db.execute(
+        select(Customer.balance).where(Customer.id == request.customer_id)
+    )
+    new_balance = result.scalar_one()
+    old_balance = new_balance + amount
+    
+    db.add(BalanceLedger(
+        transaction_code=request.transaction_code,
+        customer_id=request.customer_id,
+        amount=amount,
+        old_balance=old_balance,
+        new_balance=new_balance
+    ))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Request khác cùng transaction_code đã commit trước (UNIQUE) -> huỷ lần trừ này
+        await db.rollback()
+        entry = await _find_ledger_entry(db, request.transaction_code)
+        if entry is None:
+            raise
+        response = _replay_response(entry, request.customer_id, amount)
+        await db.rollback()
+        return response
+    
+    await profile_cache.invalidate(request.customer_id)
+    
+    return DeductBalanceResponse(
+        success=True,
+        new_balance=float(new_balance),
+        old_balance=float(old_balance)
+    )
+
 @router.post("/deduct-balance", response_model=DeductBalanceResponse, response_model_exclude_none=True)
 async def deduct_balance(
     request: DeductBalanceRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: bool = Depends(verify_api_key)
 ):
     """
     Trừ tiền từ tài khoản customer (INTERNAL ONLY - Payment Service gọi)
     
+    Idempotent theo transaction_code: gọi lại (retry của Payment Service / API Gateway)
+    nhận lại kết quả lần đầu với replayed=true, không bị trừ tiền lần hai.
+    
     Flow:
     1. Verify API Key
-    2. BEGIN TRANSACTION
-    3. SELECT FOR UPDATE (row lock)
-    4. Kiểm tra balance >= amount
-    5. UPDATE balance nếu đủ tiền
-    6. COMMIT hoặc ROLLBACK
+    2. Tìm transaction_code trong balance_ledger -> có rồi thì trả kết quả cũ
+    3. UPDATE customers SET balance = balance - :amount WHERE id = :id AND balance >= :amount
+    4. Không có dòng nào được cập nhật -> Customer not found / Insufficient balance
+    5. INSERT balance_ledger (transaction_code UNIQUE) rồi COMMIT
+    6. Deadlock / lock wait timeout -> thử lại với backoff, hết lượt thì 503
     """
-    try:
-        # Begin transaction
-        customer = db.query(Customer).filter(
-            Customer.id == request.customer_id
-        ).with_for_update().first()
-        
-        if not customer:
-            db.rollback()
-            return DeductBalanceResponse(
-                success=False,
-                error="Customer not found"
-            )
-        
-        old_balance = float(customer.balance)
-        
-        # Check if balance is sufficient
-        if customer.balance < Decimal(str(request.amount)):
-            db.rollback()
-            return DeductBalanceResponse(
-                success=False,
-                error="Insufficient balance",
-                current_balance=float(customer.balance),
-                required_amount=request.amount
+    amount = Decimal(str(request.amount)).quantize(Decimal("0.01"))
+    
+    for attempt in range(1, settings.DEDUCT_MAX_ATTEMPTS + 1):
+        try:
+            return await _deduct_once(db, request, amount)
+        except OperationalError as e:
+            await db.rollback()
+            if not is_lock_conflict(e):
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Failed to deduct balance: {str(e)}"
+                )
+            if attempt == settings.DEDUCT_MAX_ATTEMPTS:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Account is busy, please retry",
+                    headers={"Retry-After": "1"}
+                )
+            # Tài khoản đang bị tranh chấp: chờ ngắn có jitter rồi thử lại
+            await asyncio.sleep(settings.DEDUCT_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to deduct balance: {str(e)}"
             )
-        
-        # Deduct balance (convert float to Decimal for proper arithmetic)
-        customer.balance = customer.balance - Decimal(str(request.amount))
-        
-        # Commit transaction
-        db.commit()
-        db.refresh(customer)
-        
-        new_balance = float(customer.balance)
-        
-        return DeductBalanceResponse(
-            success=True,
-            new_balance=new_balance,
-            old_balance=old_balance
-        )
-        
-    except Exception as e:
-        db.rollback()
+
+@router.post("/bulk-adjust")
+async def bulk_adjust_balances(
+    request: Request,
+    content_type: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(verify_api_key)
+):
+    """
+    Cộng / điều chỉnh balance hàng loạt từ file (INTERNAL ONLY)
+    
+    Dùng đầu học kỳ để nạp học bổng, tiền nạp từ ngân hàng cho hàng chục nghìn tài khoản.
+    Body được đọc dạng stream, mỗi dòng (customer_id, amount, reference):
+    - Content-Type: application/x-ndjson - {"customer_id": 1, "amount": 500000, "reference": "SCH-2025-0001"}
+    - Content-Type: text/csv - customer_id,amount,reference (header tuỳ chọn)
+    amount dương là cộng tiền, âm là trừ (không cho balance âm).
+    
+    Flow (mỗi chunk BULK_ADJUST_CHUNK_SIZE dòng, một transaction ngắn):
+    1. Bỏ qua reference đã có trong balance_ledger (nạp lại file không cộng tiền lần hai)
+    2. SELECT ... FOR UPDATE các customer của chunk theo thứ tự id
+    3. Một câu UPDATE ... CASE id cho cả chunk + INSERT ledger nhiều dòng, COMMIT
+    
+    Response: {"summary": {...}, "results": [kết quả từng dòng theo thứ tự]}
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type == "text/csv":
+        parser = CsvParser()
+    elif media_type in ("application/x-ndjson", "application/jsonl", "application/json"):
+        parser = NdjsonParser()
+    else:
         raise HTTPException(
-            status_code=500,
-            detail=f"Failed to deduct balance: {str(e)}"
+            status_code=415,
+            detail="Content-Type must be application/x-ndjson or text/csv"
         )
+    
+    started = time.perf_counter()
+    results = []
+    seen_references = set()
+    chunk = []
+    chunks = 0
+    
+    async def flush():
+        nonlocal chunks
+        chunk_results, changed = await apply_chunk(db, chunk)
+        chunks += 1
+        for customer_id in changed:
+            await profile_cache.invalidate(customer_id)
+        results.extend(chunk_results)
+        chunk.clear()
+    
+    async for line, raw in iter_lines(request.stream()):
+        try:
+            row = parser.parse(line, decode_line(line, raw))
+        except ValueError as e:
+            results.append({"line": line, "status": "invalid", "error": str(e)})
+            continue
+        if row is None:
+            continue
+        if row.reference in seen_references:
+            results.append({
+                "line": line, "reference": row.reference, "customer_id": row.customer_id,
+                "status": "duplicate_reference", "error": "Reference appears earlier in this file"
+            })
+            continue
+        seen_references.add(row.reference)
+        chunk.append(row)
+        if len(chunk) >= settings.BULK_ADJUST_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+    
+    results.sort(key=lambda result: result["line"])
+    elapsed = time.perf_counter() - started
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return {
+        "summary": {
+            "rows": len(results),
+            "chunks": chunks,
+            "counts": counts,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(len(results) / elapsed) if elapsed > 0 else None
+        },
+        "results": results
+    }
+
+@router.get("/cache-stats")
+async def cache_stats(_: bool = Depends(verify_api_key)):
+    """
+    Thống kê profile cache của GET /me (INTERNAL ONLY): hit ratio, invalidation,
+    số lần đọc lại balance và số lần balance trong cache đã cũ
+    """
+    return profile_cache.stats()
+
+@router.get("/password-stats")
+async def password_stats(_: bool = Depends(verify_api_key)):
+    """
+    Thống kê password hashing (INTERNAL ONLY): cost đang dùng, queue depth của thread pool,
+    số job, số lần bị từ chối vì hàng đợi đầy, số hash đã được nâng cấp
+    """
+    return password_service.stats()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from decimal import Decimal
 
 # Customer Schemas
@@ -14,6 +14,17 @@ class CustomerInfo(BaseModel):
     class Config:
         from_attributes = True
 
+# Batch Lookup (Internal)
+class BatchCustomerRequest(BaseModel):
+    ids: List[int]
+    # Các field của CustomerInfo cần lấy (id luôn có); mặc định lấy tất cả
+    fields: Optional[List[str]] = None
+
+class BatchCustomerResponse(BaseModel):
+    # Cùng thứ tự với ids trong request (id trùng chỉ trả một lần)
+    customers: List[Dict[str, Any]]
+    missing_ids: List[int]
+
 # Search Request (Internal)
 class SearchRequest(BaseModel):
     username: str
@@ -23,6 +34,9 @@ class SearchResponse(BaseModel):
     success: bool
     user: Optional[CustomerInfo] = None
     error: Optional[str] = None
+    # "unknown_user" | "invalid_password" - chỉ dành cho Auth Service (negative cache),
+    # error trả cho người dùng vẫn giữ chung một thông báo
+    error_code: Optional[str] = None
 
 # Deduct Balance Request (Internal)
 class DeductBalanceRequest(BaseModel):
@@ -37,6 +51,8 @@ class DeductBalanceResponse(BaseModel):
     error: Optional[str] = None
     current_balance: Optional[float] = None
     required_amount: Optional[float] = None
+    # True khi transaction_code đã được xử lý trước đó (kết quả lấy lại từ ledger)
+    replayed: Optional[bool] = None
 
 # Update Profile Request
 class UpdateProfileRequest(BaseModel):
@@ -0,0 +1,83 @@
+"""
+Benchmark chọn cost argon2id cho password hashing của login.
+
+Với mỗi cấu hình (time_cost, memory_cost) chạy CONCURRENCY lần verify đồng thời qua
+PasswordService (thread pool PASSWORD_HASH_WORKERS), đo latency p50/p99 của một lần verify
+(gồm thời gian chờ trong hàng đợi) và throughput. Cấu hình có cost cao nhất mà p99 vẫn dưới
+LOGIN_P99_SLO_MS được đề xuất cho ARGON2_TIME_COST / ARGON2_MEMORY_COST.
+
+Chạy từ thư mục customer-service:
+    python benchmarks/bench_password_hash.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings  # noqa: E402
+from app.passwords import PasswordService  # noqa: E402
+
+SLO_MS = float(os.getenv("LOGIN_P99_SLO_MS", "250"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "16"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "5"))
+# (time_cost, memory_cost KiB), từ rẻ tới đắt
+COSTS = [(1, 12288), (2, 19456), (3, 12288), (2, 47104), (3, 65536), (4, 131072)]
+
+
+def percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def measure(time_cost: int, memory_cost: int) -> dict:
+    service = PasswordService(
+        time_cost=time_cost,
+        memory_cost=memory_cost,
+        parallelism=settings.ARGON2_PARALLELISM,
+        workers=settings.PASSWORD_HASH_WORKERS,
+        max_queue=CONCURRENCY * 2
+    )
+    stored = await service.hash("password123")
+
+    async def one() -> float:
+        started = time.perf_counter()
+        valid, _ = await service.verify(stored, "password123")
+        assert valid
+        return (time.perf_counter() - started) * 1000
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        latencies.extend(await asyncio.gather(*(one() for _ in range(CONCURRENCY))))
+    elapsed = time.perf_counter() - started
+    return {
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "throughput": len(latencies) / elapsed,
+    }
+
+
+async def main():
+    print(f"workers={settings.PASSWORD_HASH_WORKERS} concurrency={CONCURRENCY} slo_p99={SLO_MS:.0f}ms")
+    print(f"{'time_cost':>9} {'memory_kib':>10} {'p50_ms':>8} {'p99_ms':>8} {'logins/s':>9}")
+    best = None
+    for time_cost, memory_cost in COSTS:
+        result = await measure(time_cost, memory_cost)
+        within_slo = result["p99"] <= SLO_MS
+        if within_slo:
+            best = (time_cost, memory_cost)
+        print(
+            f"{time_cost:>9} {memory_cost:>10} {result['p50']:>8.1f} {result['p99']:>8.1f} "
+            f"{result['throughput']:>9.0f}{'' if within_slo else '  > SLO'}"
+        )
+
+    if best is None:
+        print("Không có cấu hình nào đạt SLO: tăng PASSWORD_HASH_WORKERS hoặc giảm cost")
+    else:
+        print(f"Đề xuất: ARGON2_TIME_COST={best[0]} ARGON2_MEMORY_COST={best[1]}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -15,6 +15,19 @@ CREATE TABLE IF NOT EXISTS customers (
     INDEX idx_email (email)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- Ledger các lần trừ tiền / điều chỉnh balance: transaction_code là khoá idempotency
+CREATE TABLE IF NOT EXISTS balance_ledger (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    transaction_code VARCHAR(64) UNIQUE NOT NULL,
+    customer_id BIGINT NOT NULL,
+    kind VARCHAR(10) NOT NULL DEFAULT 'deduct',
+    amount DECIMAL(15,2) NOT NULL,
+    old_balance DECIMAL(15,2) NOT NULL,
+    new_balance DECIMAL(15,2) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    INDEX idx_ledger_customer (customer_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- Insert sample data (Admin created accounts with plain text passwords)
 INSERT INTO customers (username, email, password, full_name, phone_number, balance) VALUES
 ('user123', 'tranduchuy2k5ne@gmail.com', 'password123', 'Nguyen Van User', '0901234567', 10000000),
@@ -1,26 +1,39 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 from .config import DATABASE_URL
 
+def async_database_url(url: str) -> str:
+    """
+    URL với driver async: mysql+pymysql -> mysql+aiomysql, sqlite -> sqlite+aiosqlite (test).
+    URL đã chỉ định driver async thì giữ nguyên.
+    """
+    scheme, sep, rest = url.partition("://")
+    if scheme in ("mysql", "mysql+pymysql", "mysql+mysqldb"):
+        scheme = "mysql+aiomysql"
+    elif scheme == "sqlite":
+        scheme = "sqlite+aiosqlite"
+    return f"{scheme}{sep}{rest}"
+
 # Create database engine
-engine = create_engine(
-    DATABASE_URL,
+engine = create_async_engine(
+    async_database_url(DATABASE_URL),
     pool_pre_ping=True,
     pool_recycle=3600,
     echo=True  # Set to False in production
 )
 
-# Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: đọc attribute sau commit không phát sinh lazy load (không hỗ trợ trong async)
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Create Base class for models
 Base = declarative_base()
 
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def init_models():
+    """Tạo bảng nếu chưa có (gọi lúc startup)"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
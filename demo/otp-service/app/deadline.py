@@ -0,0 +1,95 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# Thời gian còn lại (ms) của request: gateway đặt, mỗi service gửi tiếp phần còn lại
+DEADLINE_HEADER = "X-Deadline-Ms"
+DEADLINE_EXCEEDED_DETAIL = "Deadline exceeded"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    """Request đã quá deadline: caller không còn chờ kết quả nên dừng xử lý (504)"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=504,
+            detail=DEADLINE_EXCEEDED_DETAIL,
+            headers={"X-Deadline-Exceeded": "true"}
+        )
+
+
+def remaining() -> Optional[float]:
+    """Số giây còn lại của request hiện tại (None nếu request không có deadline)"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check():
+    """Raise DeadlineExceeded nếu đã quá deadline - gọi trước các bước tốn kém"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def timeout(default: float) -> float:
+    """Timeout cho outbound call: không vượt quá thời gian còn lại của request"""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(default, left)
+
+
+def headers(extra: Optional[dict] = None) -> dict:
+    """Headers cho outbound call kèm deadline còn lại để service tiếp theo tiếp tục áp dụng"""
+    result = dict(extra or {})
+    left = remaining()
+    if left is not None:
+        result[DEADLINE_HEADER] = str(max(0, int(left * 1000)))
+    return result
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware: đọc X-Deadline-Ms của request, lưu deadline vào context
+    và trả 504 ngay nếu request tới nơi khi đã hết hạn
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        budget_ms = None
+        for name, value in scope["headers"]:
+            if name == b"x-deadline-ms":
+                try:
+                    budget_ms = float(value)
+                except ValueError:
+                    pass
+                break
+
+        if budget_ms is None:
+            return await self.app(scope, receive, send)
+
+        if budget_ms <= 0:
+            response = JSONResponse(
+                status_code=504,
+                content={"detail": DEADLINE_EXCEEDED_DETAIL},
+                headers={"X-Deadline-Exceeded": "true"}
+            )
+            return await response(scope, receive, send)
+
+        token = _deadline.set(time.monotonic() + budget_ms / 1000)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
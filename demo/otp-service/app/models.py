@@ -6,7 +6,8 @@ class OTP(Base):
     """OTP model for verification"""
     __tablename__ = "otp"
     
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # SQLite chỉ tự tăng với INTEGER PRIMARY KEY (fallback aiosqlite khi test)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     otp_code = Column(String(6), nullable=False, index=True)
     transaction_id = Column(BigInteger, unique=True, nullable=False, index=True)
     status = Column(
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 import httpx
 
@@ -15,6 +16,7 @@ from .config import (
     PAYMENT_SERVICE_URL, CUSTOMER_SERVICE_URL, STUDENT_SERVICE_URL
 )
 from .utils import generate_otp, send_otp_email
+from . import deadline
 
 router = APIRouter(prefix="/api/otp", tags=["OTP"])
 
@@ -31,7 +33,7 @@ def verify_api_key(x_api_key: str = Header(None, alias="X-API-Key")):
 async def issue_otp(
     request: IssueOTPRequest,
     x_customer_id: int = Header(..., alias="X-Customer-ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Issue OTP for payment (PUBLIC API - called by Frontend)
@@ -50,7 +52,7 @@ async def issue_otp(
         # Step 1.5: Cleanup old pending transactions for this customer+student (resend OTP scenario)
         print(f"[CLEANUP START] Attempting cleanup for customer {x_customer_id}, student {request.student_id}", flush=True)
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with httpx.AsyncClient(timeout=deadline.timeout(10.0)) as client:
                 cleanup_url = f"{PAYMENT_SERVICE_URL}/api/transactions/cleanup-pending"
                 cleanup_payload = {
                     "customer_id": x_customer_id,
@@ -61,7 +63,7 @@ async def issue_otp(
                 cleanup_response = await client.post(
                     cleanup_url,
                     json=cleanup_payload,
-                    headers={"X-API-Key": INTERNAL_API_KEY}
+                    headers=deadline.headers({"X-API-Key": INTERNAL_API_KEY})
                 )
                 
                 print(f"[CLEANUP] Response status: {cleanup_response.status_code}", flush=True)
@@ -76,11 +78,13 @@ async def issue_otp(
                         # Expire old OTPs for deleted transactions
                         if cleanup_data.get("transaction_ids"):
                             for old_trans_id in cleanup_data["transaction_ids"]:
-                                db.query(OTP).filter(
-                                    OTP.transaction_id == old_trans_id,
-                                    OTP.status == "active"
-                                ).update({"status": "expired"})
-                            db.commit()
+                                await db.execute(
+                                    update(OTP).where(
+                                        OTP.transaction_id == old_trans_id,
+                                        OTP.status == "active"
+                                    ).values(status="expired")
+                                )
+                            await db.commit()
                             print(f"[CLEANUP] Expired OTPs for transactions: {cleanup_data['transaction_ids']}", flush=True)
                     else:
                         print(f"[CLEANUP] No old transactions to delete", flush=True)
@@ -92,14 +96,14 @@ async def issue_otp(
             print(f"[CLEANUP ERROR] Traceback: {traceback.format_exc()}", flush=True)
         
         # Step 2: Create NEW transaction via Payment Service
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=deadline.timeout(30.0)) as client:
             transaction_response = await client.post(
                 f"{PAYMENT_SERVICE_URL}/api/transactions/create",
                 json={
                     "customer_id": x_customer_id,
                     "student_id": request.student_id
                 },
-                headers={"X-API-Key": INTERNAL_API_KEY}
+                headers=deadline.headers({"X-API-Key": INTERNAL_API_KEY})
             )
             
             if transaction_response.status_code != 200:
@@ -122,14 +126,15 @@ async def issue_otp(
             status="active"
         )
         db.add(otp)
-        db.commit()
-        db.refresh(otp)
+        await db.commit()
+        await db.refresh(otp)
         
         # Step 5: Get customer email
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=deadline.timeout(30.0)) as client:
             customer_response = await client.get(
                 f"{CUSTOMER_SERVICE_URL}/api/customers/me",
-                headers={"X-Customer-ID": str(x_customer_id)}
+                # Chỉ cần email: balance trong profile cache của Customer Service là đủ
+                headers=deadline.headers({"X-Customer-ID": str(x_customer_id), "X-Balance-Max-Age": "3600"})
             )
             
             if customer_response.status_code != 200:
@@ -143,12 +148,12 @@ async def issue_otp(
             customer_name = customer_data.get("username", "Customer")
         
         # Step 6: Get tuition info
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=deadline.timeout(30.0)) as client:
             # Get payable tuition to get semester and academic_year
             tuition_response = await client.post(
                 f"{STUDENT_SERVICE_URL}/get-payable",
                 json={"student_id": request.student_id},
-                headers={"X-API-Key": INTERNAL_API_KEY}
+                headers=deadline.headers({"X-API-Key": INTERNAL_API_KEY})
             )
             
             if tuition_response.status_code == 200:
@@ -197,10 +202,12 @@ async def issue_otp(
         )
         
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        # Timeout do hết deadline -> 504 Deadline exceeded thay vì 500
+        deadline.check()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to issue OTP: {str(e)}"
@@ -209,7 +216,7 @@ async def issue_otp(
 @router.post("/verify", response_model=VerifyOTPResponse)
 async def verify_otp(
     request: VerifyOTPRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: bool = Depends(verify_api_key)
 ):
     """
@@ -223,10 +230,13 @@ async def verify_otp(
     """
     try:
         # Step 1: Find OTP
-        otp = db.query(OTP).filter(
-            OTP.otp_code == request.otp_code,
-            OTP.status == "active"
-        ).first()
+        result = await db.execute(
+            select(OTP).where(
+                OTP.otp_code == request.otp_code,
+                OTP.status == "active"
+            )
+        )
+        otp = result.scalars().first()
         
         if not otp:
             return VerifyOTPResponse(
@@ -239,7 +249,7 @@ async def verify_otp(
         if datetime.now() > expiry_time:
             # Mark as expired
             otp.status = "expired"
-            db.commit()
+            await db.commit()
             
             return VerifyOTPResponse(
                 valid=False,
@@ -248,7 +258,7 @@ async def verify_otp(
         
         # Step 3: OTP is valid - mark as used
         otp.status = "used"
-        db.commit()
+        await db.commit()
         
         return VerifyOTPResponse(
             valid=True,
@@ -256,7 +266,7 @@ async def verify_otp(
         )
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to verify OTP: {str(e)}"
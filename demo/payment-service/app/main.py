@@ -1,16 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import router
+from .deadline import DeadlineMiddleware
 from .config import SERVICE_NAME, SERVICE_PORT
-from .database import engine, Base
+from .database import engine, init_models
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create database tables
+    await init_models()
+    yield
+    await engine.dispose()
 
 app = FastAPI(
     title=SERVICE_NAME,
     description="Payment Service - Handle payment transactions with sequential payment logic",
-    version="2.1.0"
+    version="2.1.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -22,6 +29,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Deadline propagation: X-Deadline-Ms do API Gateway đặt
+app.add_middleware(DeadlineMiddleware)
+
 # Include routes
 app.include_router(router)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, String, DECIMAL, TIMESTAMP, Enum as SQLEnum, Index
+from sqlalchemy import Column, BigInteger, Integer, String, DECIMAL, TIMESTAMP, Enum as SQLEnum, Index
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -6,7 +6,8 @@ class Transaction(Base):
     """Transaction model for payment tracking"""
     __tablename__ = "transactions"
     
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # SQLite chỉ tự tăng với INTEGER PRIMARY KEY (fallback aiosqlite khi test)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     customer_id = Column(BigInteger, nullable=False, index=True)
     tuition_id = Column(BigInteger, nullable=False, index=True)
     amount = Column(DECIMAL(15, 2), nullable=False)
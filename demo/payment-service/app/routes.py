@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from decimal import Decimal
 from typing import Optional
 import httpx
@@ -18,6 +19,7 @@ from .config import (
     STUDENT_SERVICE_URL, OTP_SERVICE_URL, MAIL_SERVICE_URL
 )
 from .email_utils import send_invoice_email
+from . import deadline
 
 router = APIRouter(prefix="/api/transactions", tags=["Transactions"])
 
@@ -33,7 +35,7 @@ def verify_api_key(x_api_key: str = Header(None, alias="X-API-Key")):
 @router.post("/create", response_model=CreateTransactionResponse)
 async def create_transaction(
     request: CreateTransactionRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: bool = Depends(verify_api_key)
 ):
     """
@@ -50,8 +52,8 @@ async def create_transaction(
             tuition_response = await client.post(
                 f"{STUDENT_SERVICE_URL}/get-payable",
                 json={"student_id": request.student_id},
-                headers={"X-API-Key": INTERNAL_API_KEY},
-                timeout=10.0
+                headers=deadline.headers({"X-API-Key": INTERNAL_API_KEY}),
+                timeout=deadline.timeout(10.0)
             )
             
             if tuition_response.status_code != 200:
@@ -84,8 +86,8 @@ async def create_transaction(
         )
         
         db.add(transaction)
-        db.commit()
-        db.refresh(transaction)
+        await db.commit()
+        await db.refresh(transaction)
         
         # Step 3: Return transaction info
         return CreateTransactionResponse(
@@ -98,10 +100,11 @@ async def create_transaction(
         )
         
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        deadline.check()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to create transaction: {str(e)}"
@@ -111,7 +114,7 @@ async def create_transaction(
 async def confirm_payment(
     request: ConfirmPaymentRequest,
     x_customer_id: int = Header(..., alias="X-Customer-ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Confirm payment with OTP (PUBLIC API - called by Frontend)
@@ -131,11 +134,11 @@ async def confirm_payment(
     """
     try:
         # Step 2: Verify OTP
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=deadline.timeout(30.0)) as client:
             otp_response = await client.post(
                 f"{OTP_SERVICE_URL}/api/otp/verify",
                 json={"otp_code": request.otp_code},
-                headers={"X-API-Key": INTERNAL_API_KEY}
+                headers=deadline.headers({"X-API-Key": INTERNAL_API_KEY})
             )
             
             if otp_response.status_code != 200:
@@ -156,11 +159,14 @@ async def confirm_payment(
         
         # Step 3: Get transaction info WITH EXCLUSIVE LOCK
         # This prevents race conditions - only 1 request can process this transaction at a time
-        transaction = db.query(Transaction).filter(
-            Transaction.id == transaction_id,
-            Transaction.status == "pending",
-            Transaction.customer_id == x_customer_id
-        ).with_for_update().first()
+        result = await db.execute(
+            select(Transaction).where(
+                Transaction.id == transaction_id,
+                Transaction.status == "pending",
+                Transaction.customer_id == x_customer_id
+            ).with_for_update()
+        )
+        transaction = result.scalars().first()
         
         if not transaction:
             raise HTTPException(
@@ -169,11 +175,11 @@ async def confirm_payment(
             )
         
         # Step 4: Verify student_id matches (double-check)
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=deadline.timeout(30.0)) as client:
             tuition_check = await client.post(
                 f"{STUDENT_SERVICE_URL}/get-payable",
                 json={"student_id": request.student_id},
-                headers={"X-API-Key": INTERNAL_API_KEY}
+                headers=deadline.headers({"X-API-Key": INTERNAL_API_KEY})
             )
             
             if tuition_check.status_code == 200:
@@ -186,10 +192,11 @@ async def confirm_payment(
                         )
         
         # Step 5: Get customer balance
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=deadline.timeout(30.0)) as client:
             customer_response = await client.get(
                 f"{CUSTOMER_SERVICE_URL}/api/customers/me",
-                headers={"X-Customer-ID": str(x_customer_id)}
+                # Balance phải đọc mới từ DB (không lấy từ profile cache)
+                headers=deadline.headers({"X-Customer-ID": str(x_customer_id), "X-Balance-Max-Age": "0"})
             )
             
             if customer_response.status_code != 200:
@@ -208,6 +215,10 @@ async def confirm_payment(
                 detail=f"Số dư không đủ. Số dư hiện tại: {current_balance:,.0f}đ, Cần: {float(transaction.amount):,.0f}đ"
             )
         
+        # Caller đã bỏ cuộc thì dừng tại đây, trước khi trừ tiền.
+        # Từ Step 7 trở đi (trừ tiền, mark paid) phải chạy hết nên không áp deadline.
+        deadline.check()
+        
         # Step 7: Deduct balance from customer
         async with httpx.AsyncClient(timeout=30.0) as client:
             deduct_response = await client.post(
@@ -255,8 +266,8 @@ async def confirm_payment(
         
         # Step 9: Update transaction status
         transaction.status = "completed"
-        db.commit()
-        db.refresh(transaction)
+        await db.commit()
+        await db.refresh(transaction)
         
         # Step 10: Send invoice email (fire-and-forget, don't wait)
         try:
@@ -291,10 +302,12 @@ async def confirm_payment(
         )
         
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        # Timeout do hết deadline -> 504 Deadline exceeded thay vì 500
+        deadline.check()
         raise HTTPException(
             status_code=500,
             detail=f"Payment confirmation failed: {str(e)}"
@@ -303,7 +316,7 @@ async def confirm_payment(
 @router.post("/cancel")
 async def cancel_transaction(
     transaction_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: bool = Depends(verify_api_key)
 ):
     """
@@ -316,23 +329,26 @@ async def cancel_transaction(
     4. Return success
     """
     try:
-        transaction = db.query(Transaction).filter(
-            Transaction.id == transaction_id,
-            Transaction.status == "pending"
-        ).first()
+        result = await db.execute(
+            select(Transaction).where(
+                Transaction.id == transaction_id,
+                Transaction.status == "pending"
+            )
+        )
+        transaction = result.scalars().first()
         
         if transaction:
             # Delete transaction instead of marking as cancelled
-            db.delete(transaction)
-            db.commit()
+            await db.delete(transaction)
+            await db.commit()
             
             # Try to expire OTP in OTP Service
             try:
-                async with httpx.AsyncClient(timeout=5.0) as client:
+                async with httpx.AsyncClient(timeout=deadline.timeout(5.0)) as client:
                     await client.post(
                         f"{OTP_SERVICE_URL}/api/otp/expire-by-transaction",
                         params={"transaction_id": transaction_id},
-                        headers={"X-API-Key": INTERNAL_API_KEY}
+                        headers=deadline.headers({"X-API-Key": INTERNAL_API_KEY})
                     )
             except Exception as e:
                 print(f"Warning: Failed to expire OTP for transaction {transaction_id}: {str(e)}")
@@ -343,7 +359,8 @@ async def cancel_transaction(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        deadline.check()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to delete transaction: {str(e)}"
@@ -352,7 +369,7 @@ async def cancel_transaction(
 @router.post("/cleanup-pending")
 async def cleanup_pending_transactions(
     request: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: bool = Depends(verify_api_key)
 ):
     """
@@ -379,11 +396,11 @@ async def cleanup_pending_transactions(
             raise HTTPException(status_code=400, detail="Missing customer_id or student_id")
         
         # Get payable tuition to find tuition_id
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with httpx.AsyncClient(timeout=deadline.timeout(10.0)) as client:
             tuition_response = await client.post(
                 f"{STUDENT_SERVICE_URL}/get-payable",
                 json={"student_id": student_id},
-                headers={"X-API-Key": INTERNAL_API_KEY}
+                headers=deadline.headers({"X-API-Key": INTERNAL_API_KEY})
             )
             
             if tuition_response.status_code != 200:
@@ -406,19 +423,22 @@ async def cleanup_pending_transactions(
             tuition_id = tuition_data["tuition"]["id"]
         
         # Find and delete old pending transactions for same customer + tuition
-        old_transactions = db.query(Transaction).filter(
-            Transaction.customer_id == customer_id,
-            Transaction.tuition_id == tuition_id,
-            Transaction.status == "pending"
-        ).all()
+        result = await db.execute(
+            select(Transaction).where(
+                Transaction.customer_id == customer_id,
+                Transaction.tuition_id == tuition_id,
+                Transaction.status == "pending"
+            )
+        )
+        old_transactions = result.scalars().all()
         
         deleted_ids = [trans.id for trans in old_transactions]
         
         for trans in old_transactions:
-            db.delete(trans)
+            await db.delete(trans)
         
         if old_transactions:
-            db.commit()
+            await db.commit()
             print(f"[CLEANUP] Deleted {len(old_transactions)} old pending transactions (IDs: {deleted_ids}) for customer {customer_id}, student {student_id}")
         
         return {
@@ -431,7 +451,8 @@ async def cleanup_pending_transactions(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        deadline.check()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to cleanup pending transactions: {str(e)}"
@@ -440,7 +461,7 @@ async def cleanup_pending_transactions(
 @router.get("/history", response_model=TransactionHistoryResponse)
 async def get_transaction_history(
     x_customer_id: int = Header(..., alias="X-Customer-ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get transaction history for current customer (PUBLIC API)
@@ -451,9 +472,12 @@ async def get_transaction_history(
     3. Return transaction list
     """
     try:
-        transactions = db.query(Transaction).filter(
-            Transaction.customer_id == x_customer_id
-        ).order_by(Transaction.created_at.desc()).all()
+        result = await db.execute(
+            select(Transaction).where(
+                Transaction.customer_id == x_customer_id
+            ).order_by(Transaction.created_at.desc())
+        )
+        transactions = result.scalars().all()
         
         return TransactionHistoryResponse(
             transactions=[
@@ -1,16 +1,31 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 from .config import DATABASE_URL
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def async_database_url(url: str) -> str:
+    """
+    URL với driver async: mysql+pymysql -> mysql+aiomysql, sqlite -> sqlite+aiosqlite (test).
+    URL đã chỉ định driver async thì giữ nguyên.
+    """
+    scheme, sep, rest = url.partition("://")
+    if scheme in ("mysql", "mysql+pymysql", "mysql+mysqldb"):
+        scheme = "mysql+aiomysql"
+    elif scheme == "sqlite":
+        scheme = "sqlite+aiosqlite"
+    return f"{scheme}{sep}{rest}"
+
+engine = create_async_engine(async_database_url(DATABASE_URL), pool_pre_ping=True)
+
+# expire_on_commit=False: đọc attribute sau commit không phát sinh lazy load (không hỗ trợ trong async)
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def get_db():
+async def get_db():
     """Dependency to get database session"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def init_models():
+    """Tạo bảng nếu chưa có (gọi lúc startup)"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
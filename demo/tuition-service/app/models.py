@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, String, Integer, Numeric, Enum, TIMESTAMP, func
+from sqlalchemy import Column, BigInteger, String, Integer, Numeric, Enum, TIMESTAMP, Index, func
 from .database import Base
 import enum
 
@@ -11,7 +11,8 @@ class Tuition(Base):
     """Tuition model - merged students and tuitions into single table"""
     __tablename__ = "tuitions"
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # SQLite chỉ tự tăng với INTEGER PRIMARY KEY (fallback aiosqlite khi test)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     student_id = Column(String(20), nullable=False, index=True)
     student_name = Column(String(100), nullable=False)
     student_email = Column(String(100), nullable=False, index=True)
@@ -26,6 +27,11 @@ class Tuition(Base):
         onupdate=func.current_timestamp()
     )
 
+    __table_args__ = (
+        # get-payable: học phí chưa đóng cũ nhất của sinh viên = phần tử đầu tiên của index
+        Index('idx_student_status_year_semester', 'student_id', 'status', 'academic_year', 'semester'),
+    )
+
     def to_dict(self, include_can_pay=False):
         """Convert to dictionary for API response"""
         data = {
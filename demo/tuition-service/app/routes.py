@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from . import models, schemas
 from .database import get_db
 from .config import INTERNAL_API_KEY
+from .search_cache import etag_matches, search_cache
 
 router = APIRouter()
 
@@ -16,28 +18,21 @@ def verify_api_key(x_api_key: Optional[str] = Header(None)):
         )
     return True
 
-@router.post("/search", response_model=schemas.SearchResponse)
-def search_student(
-    request: schemas.SearchRequest,
-    db: Session = Depends(get_db)
-):
-    """
-    Search student and return all tuitions with canPay flag.
-    Only the oldest unpaid tuition will have canPay = true.
-    """
+async def _load_search_payload(db: AsyncSession, student_id: str) -> Optional[bytes]:
+    """Serialized SearchResponse of a student (None if the student has no tuitions)"""
     # Query all tuitions for this student, ordered by academic_year and semester
-    tuitions = db.query(models.Tuition).filter(
-        models.Tuition.student_id == request.student_id
-    ).order_by(
-        models.Tuition.academic_year.asc(),
-        models.Tuition.semester.asc()
-    ).all()
+    result = await db.execute(
+        select(models.Tuition).where(
+            models.Tuition.student_id == student_id
+        ).order_by(
+            models.Tuition.academic_year.asc(),
+            models.Tuition.semester.asc()
+        )
+    )
+    tuitions = result.scalars().all()
 
     if not tuitions:
-        raise HTTPException(
-            status_code=404,
-            detail=f"Student with ID {request.student_id} not found"
-        )
+        return None
 
     # Get student info from first tuition record
     first_tuition = tuitions[0]
@@ -62,36 +57,91 @@ def search_student(
     return schemas.SearchResponse(
         student=student_info,
         all_tuitions=tuition_responses
+    ).model_dump_json().encode()
+
+async def _search_response(db: AsyncSession, student_id: str, if_none_match: Optional[str]) -> Response:
+    """Search result from the per-student cache, 304 when the client's ETag still matches"""
+    cached = await search_cache.get_or_load(student_id, lambda: _load_search_payload(db, student_id))
+
+    if cached is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Student with ID {student_id} not found"
+        )
+
+    payload, etag = cached
+    # no-cache: client phải revalidate (If-None-Match) mỗi lần, dữ liệu đổi khi có thanh toán
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        search_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+@router.post("/search", response_model=schemas.SearchResponse)
+async def search_student(
+    request: schemas.SearchRequest,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Search student and return all tuitions with canPay flag.
+    Only the oldest unpaid tuition will have canPay = true.
+    Response carries a strong ETag; If-None-Match with the same ETag returns 304.
+    """
+    return await _search_response(db, request.student_id, if_none_match)
+
+@router.get("/search", response_model=schemas.SearchResponse)
+async def search_student_get(
+    student_id: str,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """Same as POST /search (GET /search?student_id=...), usable with HTTP conditional GET"""
+    return await _search_response(db, student_id, if_none_match)
+
+async def find_payable_tuition(db: AsyncSession, student_id: str) -> Optional[models.Tuition]:
+    """
+    Oldest unpaid tuition of a student (None if there is none).
+    WHERE student_id = ? AND status = 'unpaid' ORDER BY academic_year, semester LIMIT 1
+    is resolved by walking idx_student_status_year_semester, reading a single row.
+    """
+    result = await db.execute(
+        select(models.Tuition).where(
+            models.Tuition.student_id == student_id,
+            models.Tuition.status == models.TuitionStatus.UNPAID.value
+        ).order_by(
+            models.Tuition.academic_year.asc(),
+            models.Tuition.semester.asc()
+        ).limit(1)
     )
+    return result.scalars().first()
 
 @router.post("/get-payable", response_model=schemas.GetPayableResponse)
-def get_payable_tuition(
+async def get_payable_tuition(
     request: schemas.GetPayableRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: bool = Depends(verify_api_key)
 ):
     """
     INTERNAL API: Get the payable tuition (oldest unpaid) for a student.
     Used by Payment Service to get tuition info without student details.
+    Called on every OTP issue / transaction create / payment confirm, so it is a single
+    LIMIT 1 query on idx_student_status_year_semester.
     """
-    # Query all tuitions for this student, ordered by academic_year and semester
-    tuitions = db.query(models.Tuition).filter(
-        models.Tuition.student_id == request.student_id
-    ).order_by(
-        models.Tuition.academic_year.asc(),
-        models.Tuition.semester.asc()
-    ).all()
-
-    if not tuitions:
-        raise HTTPException(
-            status_code=404,
-            detail=f"Student with ID {request.student_id} not found"
+    payable_tuition = await find_payable_tuition(db, request.student_id)
+
+    if payable_tuition is None:
+        # Chỉ khi không có học phí cần đóng mới phân biệt "không tồn tại" và "đã đóng hết"
+        result = await db.execute(
+            select(models.Tuition.id).where(
+                models.Tuition.student_id == request.student_id
+            ).limit(1)
         )
-
-    # Find first unpaid tuition
-    unpaid_tuitions = [t for t in tuitions if t.status == models.TuitionStatus.UNPAID]
-    
-    if not unpaid_tuitions:
+        if result.scalar() is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Student with ID {request.student_id} not found"
+            )
         return schemas.GetPayableResponse(
             success=True,
             tuition=None,
@@ -99,7 +149,6 @@ def get_payable_tuition(
         )
 
     # Return only the tuition info (no student info)
-    payable_tuition = unpaid_tuitions[0]
     tuition_response = schemas.TuitionResponse(**payable_tuition.to_dict())
 
     return schemas.GetPayableResponse(
@@ -108,10 +157,10 @@ def get_payable_tuition(
     )
 
 @router.post("/{tuition_id}/mark-paid", response_model=schemas.MarkPaidResponse)
-def mark_tuition_paid(
+async def mark_tuition_paid(
     tuition_id: int,
     request: schemas.MarkPaidRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: bool = Depends(verify_api_key)
 ):
     """
@@ -121,9 +170,12 @@ def mark_tuition_paid(
     # Start transaction
     try:
         # Get tuition with row lock
-        tuition = db.query(models.Tuition).filter(
-            models.Tuition.id == tuition_id
-        ).with_for_update().first()
+        result = await db.execute(
+            select(models.Tuition).where(
+                models.Tuition.id == tuition_id
+            ).with_for_update()
+        )
+        tuition = result.scalars().first()
 
         if not tuition:
             raise HTTPException(
@@ -142,8 +194,9 @@ def mark_tuition_paid(
         tuition.fee = 0
         tuition.status = models.TuitionStatus.PAID
 
-        db.commit()
-        db.refresh(tuition)
+        await db.commit()
+        await db.refresh(tuition)
+        search_cache.invalidate(tuition.student_id)
 
         return schemas.MarkPaidResponse(
             success=True,
@@ -151,8 +204,30 @@ def mark_tuition_paid(
         )
 
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/cache/invalidate")
+async def invalidate_search_cache(
+    request: schemas.InvalidateCacheRequest,
+    _: bool = Depends(verify_api_key)
+):
+    """
+    INTERNAL API: Drop cached search results.
+    Call after bulk imports / direct changes in MySQL: student_ids for the affected students,
+    or no body field to drop everything.
+    """
+    if request.student_ids is None:
+        search_cache.invalidate_all()
+    else:
+        for student_id in request.student_ids:
+            search_cache.invalidate(student_id)
+    return {"success": True, "invalidated": "all" if request.student_ids is None else len(request.student_ids)}
+
+@router.get("/cache/stats")
+async def search_cache_stats(_: bool = Depends(verify_api_key)):
+    """INTERNAL API: Hit ratio / 304 count of the search cache"""
+    return search_cache.stats()
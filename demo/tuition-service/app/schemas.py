@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from decimal import Decimal
 
 class SearchRequest(BaseModel):
@@ -46,6 +46,10 @@ class MarkPaidResponse(BaseModel):
     success: bool
     tuition: TuitionResponse
 
+class InvalidateCacheRequest(BaseModel):
+    """Request body for POST /cache/invalidate (internal API)"""
+    student_ids: Optional[List[str]] = Field(None, description="Students to invalidate; omit to invalidate all")
+
 class ErrorResponse(BaseModel):
     """Error response"""
     detail: str
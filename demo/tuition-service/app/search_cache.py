@@ -0,0 +1,109 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL
+
+
+def make_etag(payload: bytes) -> str:
+    """Strong ETag theo nội dung: cùng dữ liệu -> cùng ETag, kể cả sau restart / giữa các instance"""
+    return '"%s"' % hashlib.sha256(payload).hexdigest()[:32]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+class SearchCache:
+    """
+    Cache response của /search theo student_id: JSON đã serialize (gồm canPay) + ETag.
+
+    - mark-paid và import hàng loạt (POST /cache/invalidate) xoá entry của sinh viên.
+      Mỗi sinh viên có version: query đang chạy từ trước khi invalidate không được ghi vào cache
+    - LRU tối đa max_entries sinh viên, entry hết hạn sau ttl giây
+      (phòng khi dữ liệu bị sửa trực tiếp trong MySQL mà không gọi invalidate)
+    Không thread-safe: chỉ dùng từ handler async (event loop), không từ handler def (threadpool).
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # student_id -> (expires_at, payload, etag)
+        self._entries: "OrderedDict[str, Tuple[float, bytes, str]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _get(self, student_id: str) -> Optional[Tuple[bytes, str]]:
+        entry = self._entries.get(student_id)
+        if entry is None:
+            return None
+        expires_at, payload, etag = entry
+        if expires_at <= time.monotonic():
+            del self._entries[student_id]
+            return None
+        self._entries.move_to_end(student_id)
+        return payload, etag
+
+    def _version(self, student_id: str) -> Tuple[int, int]:
+        return self._epoch, self._versions.get(student_id, 0)
+
+    async def get_or_load(
+        self, student_id: str, load: Callable[[], Awaitable[Optional[bytes]]]
+    ) -> Optional[Tuple[bytes, str]]:
+        """(payload, etag) của sinh viên; None nếu không tìm thấy (không cache)"""
+        cached = self._get(student_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        version = self._version(student_id)
+        payload = await load()
+        if payload is None:
+            return None
+        etag = make_etag(payload)
+        if self.ttl > 0 and self._version(student_id) == version:
+            self._entries[student_id] = (time.monotonic() + self.ttl, payload, etag)
+            self._entries.move_to_end(student_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return payload, etag
+
+    def invalidate(self, student_id: str):
+        self._versions[student_id] = self._versions.get(student_id, 0) + 1
+        self._entries.pop(student_id, None)
+        self.invalidations += 1
+
+    def invalidate_all(self):
+        self._epoch += 1
+        self._versions.clear()
+        self._entries.clear()
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+
+search_cache = SearchCache(max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL)
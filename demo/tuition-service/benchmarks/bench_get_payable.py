@@ -0,0 +1,118 @@
+"""
+Benchmark query học phí cần đóng (get-payable) với sinh viên có lịch sử học phí dài.
+
+So sánh cách cũ (load toàn bộ học phí của sinh viên theo thứ tự rồi lọc unpaid trong Python)
+với find_payable_tuition (một query LIMIT 1 trên idx_student_status_year_semester).
+Mỗi sinh viên có BENCH_HISTORY học kỳ, phần lớn đã đóng, vài học kỳ cuối chưa đóng.
+
+Mặc định chạy trên SQLite tạm; đặt DATABASE_URL để đo trên MySQL thật. Khi đó bảng
+tuitions phải trống (benchmark dừng nếu đã có dữ liệu) và dữ liệu mẫu được xoá khi chạy xong.
+
+Chạy từ thư mục tuition-service:
+    python benchmarks/bench_get_payable.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DATABASE_URL = f"sqlite:///{tempfile.gettempdir()}/bench_get_payable.db"
+os.environ.setdefault("DATABASE_URL", BENCH_DATABASE_URL)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, func, insert, select  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import SessionLocal, engine, init_models  # noqa: E402
+from app.routes import find_payable_tuition  # noqa: E402
+
+STUDENTS = int(os.getenv("BENCH_STUDENTS", "1000"))
+HISTORY = int(os.getenv("BENCH_HISTORY", "100"))  # số học kỳ mỗi sinh viên
+UNPAID = int(os.getenv("BENCH_UNPAID", "3"))  # số học kỳ cuối chưa đóng
+LOOKUPS = int(os.getenv("BENCH_LOOKUPS", "2000"))
+
+
+async def legacy_payable(db, student_id: str):
+    """Logic cũ của get_payable_tuition"""
+    result = await db.execute(
+        select(models.Tuition).where(
+            models.Tuition.student_id == student_id
+        ).order_by(
+            models.Tuition.academic_year.asc(),
+            models.Tuition.semester.asc()
+        )
+    )
+    tuitions = result.scalars().all()
+    unpaid_tuitions = [t for t in tuitions if t.status == models.TuitionStatus.UNPAID]
+    return unpaid_tuitions[0] if unpaid_tuitions else None
+
+
+BENCH_STUDENT_NAME = "Bench Student"
+
+
+async def seed():
+    await init_models()
+    async with SessionLocal() as db:
+        if os.environ["DATABASE_URL"] == BENCH_DATABASE_URL:
+            # DB tạm của benchmark: xoá dữ liệu của lần chạy trước
+            await db.execute(delete(models.Tuition))
+        elif await db.scalar(select(func.count()).select_from(models.Tuition)):
+            raise SystemExit("Bảng tuitions đã có dữ liệu - chỉ chạy benchmark trên database trống")
+        rows = []
+        for student in range(STUDENTS):
+            student_id = f"5{student:07d}"
+            for term in range(HISTORY):
+                year = 1990 + term // 3
+                rows.append({
+                    "student_id": student_id,
+                    "student_name": BENCH_STUDENT_NAME,
+                    "student_email": f"{student_id}@student.tdtu.edu.vn",
+                    "semester": term % 3 + 1,
+                    "academic_year": f"{year}-{year + 1}",
+                    "fee": 0 if term < HISTORY - UNPAID else 5000000,
+                    "status": "paid" if term < HISTORY - UNPAID else "unpaid",
+                })
+        for start in range(0, len(rows), 5000):
+            await db.execute(insert(models.Tuition), rows[start:start + 5000])
+        await db.commit()
+
+
+async def measure(fn) -> float:
+    async with SessionLocal() as db:
+        started = time.perf_counter()
+        for i in range(LOOKUPS):
+            student_id = f"5{(i * 7919) % STUDENTS:07d}"
+            tuition = await fn(db, student_id)
+            assert tuition is not None and tuition.status == "unpaid"
+            db.expunge_all()
+        return LOOKUPS / (time.perf_counter() - started)
+
+
+async def cleanup():
+    async with SessionLocal() as db:
+        await db.execute(delete(models.Tuition).where(models.Tuition.student_name == BENCH_STUDENT_NAME))
+        await db.commit()
+
+
+async def main():
+    print(f"students={STUDENTS} history={HISTORY} unpaid={UNPAID} lookups={LOOKUPS}")
+    await seed()
+    try:
+        async with SessionLocal() as db:
+            for i in range(0, STUDENTS, max(1, STUDENTS // 50)):
+                student_id = f"5{i:07d}"
+                assert (await legacy_payable(db, student_id)).id == (await find_payable_tuition(db, student_id)).id
+
+        legacy_ops = await measure(legacy_payable)
+        fast_ops = await measure(find_payable_tuition)
+        print(f"legacy (load all + filter) : {legacy_ops:8.0f} lookups/s")
+        print(f"LIMIT 1 + composite index  : {fast_ops:8.0f} lookups/s ({fast_ops / legacy_ops:.2f}x)")
+    finally:
+        await cleanup()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
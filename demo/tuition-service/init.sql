@@ -16,7 +16,9 @@ CREATE TABLE IF NOT EXISTS tuitions (
     INDEX idx_student_id (student_id),
     INDEX idx_student_email (student_email),
     INDEX idx_status (status),
-    INDEX idx_student_year_semester (student_id, academic_year, semester)
+    INDEX idx_student_year_semester (student_id, academic_year, semester),
+    -- get-payable: WHERE student_id = ? AND status = 'unpaid' ORDER BY academic_year, semester LIMIT 1
+    INDEX idx_student_status_year_semester (student_id, status, academic_year, semester)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Seed data
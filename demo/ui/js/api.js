@@ -66,8 +66,12 @@ export const login = (username, password) => simpleCall('/api/auth/login', 'POST
 export const logout = () => simpleCall('/api/auth/logout', 'POST');
 export const getMe = () => simpleCall('/api/auth/me');
 
+// Page bootstrap (gateway gọi song song các backend, trả về { data, errors })
+export const getPaymentPage = (code = '') => simpleCall(`/api/bff/payment-page${code ? `?student_code=${encodeURIComponent(code)}` : ''}`);
+
 // Student
-export const searchStudent = (code) => simpleCall('/api/students/search', 'POST', { student_code: code });
+// GET: browser tự gửi If-None-Match (ETag của Tuition Service), kết quả không đổi -> 304
+export const searchStudent = (code) => simpleCall(`/api/students/search?student_code=${encodeURIComponent(code)}`);
 
 // Payment
 export const createPayment = (code) => simpleCall('/api/transactions', 'POST', { student_code: code });
@@ -184,7 +184,8 @@ if (backLink) {
     } catch (err) {
       console.warn('Failed to cancel transaction on back:', err.message || err);
     }
-    window.location.href = '/payment.html';
+    // Trang thanh toán tải lại học phí của sinh viên cùng lúc với thông tin user
+    window.location.href = `/payment.html?student_code=${encodeURIComponent(context.student_code)}`;
   });
 }
 
@@ -1,5 +1,5 @@
 // ui/js/payment.js
-import { searchStudent, getMe, createPaymentInit } from './api.js';
+import { searchStudent, getPaymentPage, createPaymentInit } from './api.js';
 
 const searchForm = document.getElementById('search-form');
 const studentInfo = document.getElementById('student-info');
@@ -12,10 +12,23 @@ const codeInput = document.getElementById('student_code');
 let currentStudent = null;
 let currentUser = null;
 
-// Load user info and balance
-async function loadUserInfo() {
+// student_code trên URL (vd quay lại từ trang OTP): học phí được lấy song song
+// với thông tin user trong cùng một request BFF
+const initialCode = (new URLSearchParams(window.location.search).get('student_code') || '').trim();
+
+function partError(part) {
+  return new Error(`${part.status} ${typeof part.detail === 'string' ? part.detail : JSON.stringify(part.detail)}`);
+}
+
+// Load user info and balance (+ học phí của initialCode)
+async function loadPage() {
+  let page;
   try {
-    const user = await getMe();
+    page = await getPaymentPage(initialCode);
+    if (page.errors.me) {
+      throw partError(page.errors.me);
+    }
+    const user = page.data.me;
     currentUser = user;
     document.body.dataset.balance = user.balance;
     
@@ -31,9 +44,19 @@ async function loadUserInfo() {
       alert('Vui lòng đăng nhập lại');
       window.location.href = 'index.html';
     }
+    return;
+  }
+
+  if (initialCode) {
+    codeInput.value = initialCode;
+    if (page.errors.student) {
+      showSearchError(initialCode, partError(page.errors.student));
+    } else {
+      renderStudent(initialCode, page.data.student);
+    }
   }
 }
-loadUserInfo();
+loadPage();
 
 // Tự động search khi nhập đủ 8 ký tự
 codeInput.addEventListener('input', async (e) => {
@@ -66,7 +89,14 @@ searchForm.addEventListener('submit', async (e) => {
 
 async function performSearch(code) {
   try {
-    const res = await searchStudent(code);
+    renderStudent(code, await searchStudent(code));
+  } catch (err) {
+    showSearchError(code, err);
+  }
+}
+
+function renderStudent(code, res) {
+  try {
       const tuitionList = res.tuitions || res.all_tuitions || [];
       const studentObj = res.student || {};
       const studentCode = studentObj.student_code || studentObj.student_id || '';
@@ -213,6 +243,11 @@ async function performSearch(code) {
     paymentForm.classList.remove('d-none');
     paymentForm.dataset.total = totalPayable;
   } catch (err) {
+    showSearchError(code, err);
+  }
+}
+
+function showSearchError(code, err) {
     // Ẩn tất cả thông tin khi có lỗi
     studentInfo.classList.add('d-none');
     tuitionsTable.classList.add('d-none');
@@ -224,8 +259,7 @@ async function performSearch(code) {
     } else {
       showAlert(`<i class="fas fa-exclamation-triangle me-2"></i>${err.message}`, 'danger');
     }
-  }
-};
+}
 
 paymentForm.addEventListener('submit', async (e) => {
   e.preventDefault();